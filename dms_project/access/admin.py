@@ -1,3 +1,10 @@
+# access/admin.py
 from django.contrib import admin
+from .models import DocumentGrant
 
-# Register your models here.
+@admin.register(DocumentGrant)
+class DocumentGrantAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'department', 'role', 'document', 'owner', 'owner_department', 'permission']
+    list_filter = ['permission', 'role']
+    search_fields = ['department', 'owner_department', 'user__username', 'owner__username']
+    raw_id_fields = ['user', 'document', 'owner', 'granted_by']
@@ -0,0 +1,16 @@
+# access/backends.py
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class ProfileBackend(ModelBackend):
+    """ModelBackend that loads the request's user together with its profile.
+
+    AuthenticationMiddleware fetches the user once per request through
+    get_user(); joining the profile there gives the access checks the role
+    (access/permissions.py) without a query of their own.
+    """
+
+    def get_user(self, user_id):
+        user = get_user_model()._default_manager.select_related('profile').filter(pk=user_id).first()
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -0,0 +1,25 @@
+# access/middleware.py
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth.middleware import get_user
+from django.utils.functional import SimpleLazyObject
+
+from .permissions import attach_access
+
+
+class PermissionMiddleware:
+    """Give request.user a lazily resolved `access` (access/permissions.py).
+
+    Goes after AuthenticationMiddleware; the user is still loaded only when
+    something reads it. Async-capable: nothing here touches the database.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.user = SimpleLazyObject(lambda: attach_access(request, get_user(request)))
+        return self.get_response(request)
@@ -20,16 +20,76 @@ class UserProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # User list filtered by role
+            models.Index(fields=['role'], name='profile_role_idx'),
+            # Department grants: the members of a department (access/policy.py)
+            models.Index(fields=['department'], name='profile_department_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.user.username} - {self.role}"
 
+class DocumentGrant(models.Model):
+    """One entry of the document ACL read by access/policy.py.
+
+    Who: a user, every member of a department, or everyone with a role.
+    What: one document, all documents of an owner, or all documents
+    uploaded by members of a department. Grants only add to the defaults:
+    uploaders have full access to their own documents, staff to all.
+    """
+    PERMISSION_CHOICES = [
+        ('view', 'View and download'),
+        ('manage', 'View, download and delete'),
+    ]
+    
+    # Grantee: exactly one of these
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='document_grants')
+    department = models.CharField(max_length=100, blank=True)
+    role = models.CharField(max_length=20, choices=UserProfile.ROLE_CHOICES, blank=True)
+    # Granted documents: exactly one of these
+    document = models.ForeignKey('documents.Document', on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='grants')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    owner_department = models.CharField(max_length=100, blank=True)
+    
+    permission = models.CharField(max_length=10, choices=PERMISSION_CHOICES, default='view')
+    granted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            # A user's grants are read by grantee (user_id has the FK index)
+            models.Index(fields=['department'], name='grant_department_idx'),
+            models.Index(fields=['role'], name='grant_role_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                    models.Q(user__isnull=False, department='', role='')
+                    | models.Q(user__isnull=True, role='') & ~models.Q(department='')
+                    | models.Q(user__isnull=True, department='') & ~models.Q(role='')
+                ),
+                name='grant_one_grantee',
+            ),
+            models.CheckConstraint(
+                check=(
+                    models.Q(document__isnull=False, owner__isnull=True, owner_department='')
+                    | models.Q(document__isnull=True, owner__isnull=False, owner_department='')
+                    | models.Q(document__isnull=True, owner__isnull=True) & ~models.Q(owner_department='')
+                ),
+                name='grant_one_target',
+            ),
+        ]
+    
+    def __str__(self):
+        grantee = self.user or self.department or self.get_role_display()
+        target = self.document or self.owner or self.owner_department
+        return f"{grantee} - {self.permission} - {target}"
+
 # Auto-create profile when user is created
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
-
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
\ No newline at end of file
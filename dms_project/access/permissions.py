@@ -0,0 +1,71 @@
+# access/permissions.py
+"""Role resolution for the access checks, without a profile query per request.
+
+A user's role lives on UserProfile. The authentication backend
+(access/backends.py) loads the request's user with its profile in the same
+query, and PermissionMiddleware gives request.user an `access` attribute
+reading the role from there. The role is the row as of this request: a
+changed role applies on the user's next request, on every worker, with no
+copy to invalidate.
+
+is_staff and is_superuser are read from the same User row.
+"""
+from django.utils.functional import cached_property
+
+from .models import UserProfile
+
+ROLE_LABELS = dict(UserProfile.ROLE_CHOICES)
+
+
+class Access:
+    """What a user may do: the profile role combined with the User's flags.
+
+    `role` is a callable or a value; it is only called when the flags do
+    not settle a check, so staff and superusers usually need no role at all.
+    """
+
+    def __init__(self, user, role):
+        self.user = user
+        self._role = role
+
+    @cached_property
+    def role(self):
+        return self._role() if callable(self._role) else self._role
+
+    @property
+    def is_admin(self):
+        return self.user.is_superuser or self.role == 'admin'
+
+    @property
+    def is_manager(self):
+        return self.user.is_staff or self.role in ('admin', 'manager')
+
+    @property
+    def is_reviewer(self):
+        return self.user.is_staff or self.role in ('admin', 'manager', 'reviewer')
+
+    @property
+    def role_display(self):
+        return ROLE_LABELS.get(self.role, self.role)
+
+
+def attach_access(request, user):
+    """Give an authenticated request user an `access` resolved from its profile"""
+    if user.is_authenticated and 'access' not in user.__dict__:
+        user.access = Access(user, lambda: _profile_role(user))
+    return user
+
+
+def access_for(user):
+    """The Access of a user: the request's, or one resolved from the profile"""
+    access = getattr(user, 'access', None)
+    if access is None:
+        access = user.access = Access(user, lambda: _profile_role(user))
+    return access
+
+
+def _profile_role(user):
+    try:
+        return user.profile.role
+    except UserProfile.DoesNotExist:
+        return 'user'
@@ -0,0 +1,138 @@
+# access/policy.py
+"""Row-level document access, compiled into one queryset filter.
+
+A user may see a document when they uploaded it, when they are staff
+(is_staff or is_superuser), or when a DocumentGrant reaches them. A grant
+names a user, a department or a role; users inherit the grants of the
+department and the role on their UserProfile. It covers one document, the
+documents of an owner, or the documents uploaded by members of a
+department.
+
+`document_filter` reads the grants that apply to a user (one indexed query,
+kept in the user cache) and turns them into a single Q on Document: the
+uploader, the granted ids, the granted owners and a subquery on the
+department members. Views fetch through the filtered queryset, so the
+database decides; a document the user may not see is never loaded.
+
+Cached values are keyed by the user's generation (dms_project/cache.py).
+Grant and profile changes bump the generation of every user they reach
+(access/signals.py). Pages of users who see other users' documents
+(`sees_others_documents`: grantees and staff) are also keyed by the shared
+generation, which every document write bumps, so another user's write shows
+up in them at once.
+"""
+from asgiref.sync import sync_to_async
+from django.db.models import Q, Subquery
+from django.http import Http404
+
+from dms_project.cache import cached
+from documents.models import Document
+
+from .models import DocumentGrant, UserProfile
+
+VIEW = 'view'
+MANAGE = 'manage'
+# Permission -> the grant permissions that confer it
+CONFERRED_BY = {VIEW: (VIEW, MANAGE), MANAGE: (MANAGE,)}
+
+
+def grantee_filter(user_id):
+    """Q over DocumentGrant: grants made to the user, their department or their role"""
+    profile = UserProfile.objects.filter(user_id=user_id)
+    return (
+        Q(user_id=user_id)
+        | Q(department=Subquery(profile.values('department')[:1])) & ~Q(department='')
+        | Q(role=Subquery(profile.values('role')[:1])) & ~Q(role='')
+    )
+
+
+def compile_grants(user_id):
+    """{permission: (document ids, owner ids, owner departments)} from the ACL"""
+    rows = (
+        DocumentGrant.objects.filter(grantee_filter(user_id))
+        .values_list('permission', 'document_id', 'owner_id', 'owner_department')
+    )
+    found = {permission: (set(), set(), set()) for permission in CONFERRED_BY}
+    for permission, document_id, owner_id, owner_department in rows:
+        for wanted, conferring in CONFERRED_BY.items():
+            if permission in conferring:
+                documents, owners, departments = found[wanted]
+                if document_id is not None:
+                    documents.add(document_id)
+                elif owner_id is not None:
+                    owners.add(owner_id)
+                else:
+                    departments.add(owner_department)
+    return {permission: tuple(sorted(values) for values in sets) for permission, sets in found.items()}
+
+
+def grants_for(user_id):
+    """compile_grants(), cached until the user's generation moves on"""
+    return cached(user_id, 'access:grants', [], lambda: compile_grants(user_id))
+
+
+def sees_everything(user):
+    return user.is_staff or user.is_superuser
+
+
+def document_filter(user, permission=VIEW, prefix=''):
+    """Q limiting a queryset to the documents `user` holds `permission` on.
+
+    `prefix` is the path to the document, e.g. 'document__' for a
+    DocumentPreview queryset. Staff get an empty Q.
+    """
+    if sees_everything(user):
+        return Q()
+    documents, owners, departments = grants_for(user.pk)[permission]
+    q = Q(**{f'{prefix}uploader_id': user.pk})
+    if documents:
+        q |= Q(**{f'{prefix}pk__in': documents})
+    if owners:
+        q |= Q(**{f'{prefix}uploader_id__in': owners})
+    if departments:
+        members = UserProfile.objects.filter(department__in=departments).values('user_id')
+        q |= Q(**{f'{prefix}uploader_id__in': members})
+    return q
+
+
+def visible_documents(user, permission=VIEW, queryset=None):
+    """Documents (of `queryset`, default all) that `user` holds `permission` on"""
+    if queryset is None:
+        queryset = Document.objects.all()
+    return queryset.filter(document_filter(user, permission))
+
+
+def only_own_documents(user):
+    """True when the user sees exactly their own documents: no grants, not staff"""
+    return not sees_everything(user) and not any(grants_for(user.pk)[VIEW])
+
+
+def sees_others_documents(user):
+    """True when pages listing the user's visible documents show other users' too"""
+    return not only_own_documents(user)
+
+
+def get_permitted(user, doc_id, queryset=None, permission=VIEW):
+    """The document if `user` holds `permission` on it, else None.
+
+    Raises Http404 when there is no such document. A permitted document is
+    one query; only a refusal pays a second one to tell the two apart.
+    """
+    try:
+        return visible_documents(user, permission, queryset).get(id=doc_id)
+    except Document.DoesNotExist:
+        if Document.objects.filter(id=doc_id).exists():
+            return None
+        raise Http404('No Document matches the given query.')
+
+
+async def aget_permitted(user, doc_id, queryset=None, permission=VIEW):
+    """get_permitted for async views"""
+    # The grants come from the cache backend, which blocks
+    documents = await sync_to_async(visible_documents)(user, permission, queryset)
+    try:
+        return await documents.aget(id=doc_id)
+    except Document.DoesNotExist:
+        if await Document.objects.filter(id=doc_id).aexists():
+            return None
+        raise Http404('No Document matches the given query.')
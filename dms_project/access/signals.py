@@ -0,0 +1,48 @@
+# access/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from dms_project.cache import bump_generation, bump_shared_generation
+from documents.signals import bulk_deleting
+
+from .models import DocumentGrant, UserProfile
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_role(sender, instance, **kwargs):
+    # The department and role decide which grants apply (access/policy.py),
+    # and the department whose grants reach this user's documents
+    bump_generation(instance.user_id)
+    bump_shared_generation()
+
+
+def grantees(grant):
+    """Ids of the users a grant reaches"""
+    if grant.user_id is not None:
+        return [grant.user_id]
+    profiles = UserProfile.objects.all()
+    if grant.department:
+        profiles = profiles.filter(department=grant.department)
+    else:
+        profiles = profiles.filter(role=grant.role)
+    return profiles.values_list('user_id', flat=True)
+
+
+@receiver(pre_save, sender=DocumentGrant)
+def invalidate_previous_grantees(sender, instance, **kwargs):
+    # An edited grant may now reach other users; the old ones lose it
+    previous = DocumentGrant.objects.filter(pk=instance.pk).first() if instance.pk else None
+    if previous is not None:
+        invalidate_grantees(sender, previous)
+
+
+@receiver(post_save, sender=DocumentGrant)
+@receiver(post_delete, sender=DocumentGrant)
+def invalidate_grantees(sender, instance, **kwargs):
+    if bulk_deleting.get():
+        return  # grants of bulk-deleted documents: the shared generation covers them
+    # Cached grants and pages of every grantee, so a revoke applies at once
+    for user_id in grantees(instance):
+        bump_generation(user_id)
+
@@ -1,3 +1,175 @@
-from django.test import TestCase
+# access/tests.py
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from accounts.stats import global_stats
+from dms_project.testing import QueryPlanTestCase
+from documents.models import Document
+from .models import DocumentGrant, UserProfile
+from .policy import MANAGE, visible_documents
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+# User listings page through auth_user by date_joined, which contrib.auth
+# does not index; the table is small and these pages are admin-only.
+USER_LISTING_SCANS = {'auth_user'}
+
+
+class AccessViewQueryTests(QueryPlanTestCase):
+    """Query budgets and plans for the access views"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', password='pw-12345!')
+        self.member = User.objects.create_user('member', password='pw-12345!')
+        global_stats()  # seed the dashboard counters outside the measured requests
+        self.client.login(username='admin', password='pw-12345!')
+
+    def add_users(self, count=3):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(f'user{i}')
+            user.profile.role = 'reviewer'
+            user.profile.save()
+
+    def test_admin_dashboard(self):
+        self.assertEfficientView('/access/admin-dashboard/', 5, grow=self.add_users,
+                                 allow_scans=USER_LISTING_SCANS)
+
+    def test_user_list(self):
+        self.assertEfficientView('/access/users/', 3, grow=self.add_users, allow_scans=USER_LISTING_SCANS)
+        self.assertEfficientView('/access/users/', 3, data={'role': 'reviewer'}, grow=self.add_users,
+                                 allow_scans=USER_LISTING_SCANS)
+
+    def test_edit_user(self):
+        url = f'/access/users/{self.member.pk}/edit/'
+        self.assertEfficientView(url, 4)
+        self.assertEfficientView(url, 10, method='post', status=302, data={
+            'email': 'member@example.com', 'role': 'manager', 'is_active': 'on',
+        })
+
+    # role_list and the user_permissions form render templates that are not
+    # in the tree yet; only the permissions update is covered here.
+    def test_user_permissions(self):
+        url = f'/access/users/{self.member.pk}/permissions/'
+        self.assertEfficientView(url, 6, method='post', status=302, data={'is_staff': 'on'})
+
+    def test_create_user(self):
+        self.assertEfficientView('/access/users/create/', 2)
+
+    def test_my_profile(self):
+        self.assertEfficientView('/access/profile/', 3)
+        self.assertEfficientView('/access/profile/', 4, method='post', status=302, data={'department': 'Finance'})
+
+
+class PermissionResolverTests(TestCase):
+    """Roles come with the request's user, loaded together with its profile"""
+
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', password='pw-12345!')
+        self.manager.profile.role = 'manager'
+        self.manager.profile.save()
+        self.client.login(username='manager', password='pw-12345!')
+
+    def test_role_loaded_with_user(self):
+        # session and user only: the profile is joined to the user
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get('/access/users/create/').status_code, 200)
+
+    def test_demotion_needs_no_invalidation(self):
+        # An update() sends no signal and touches no cache, as when another
+        # worker's cache never hears of the change
+        UserProfile.objects.filter(user=self.manager).update(role='user')
+        self.assertEqual(self.client.get('/access/users/create/').status_code, 302)
+
+    def test_role_change_invalidates_sessions(self):
+        profile = UserProfile.objects.get(user=self.manager)
+        profile.role = 'user'
+        profile.save()
+        self.assertEqual(self.client.get('/access/users/create/').status_code, 302)
+        profile.role = 'manager'
+        profile.save()
+        self.assertEqual(self.client.get('/access/users/create/').status_code, 200)
+
+    def test_user_save_leaves_profile_alone(self):
+        self.manager.refresh_from_db()
+        with self.assertNumQueries(1):
+            self.manager.save(update_fields=['last_login'])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DocumentPolicyTests(QueryPlanTestCase):
+    """Grants widen what a user sees, in SQL"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.owner = self.make_user('owner', department='Finance')
+        self.reader = self.make_user('reader', department='Audit')
+        self.document = self.add_document(self.owner, 'ledger')
+        self.other = self.add_document(self.owner, 'payroll')
+
+    def make_user(self, username, department='', role='user'):
+        user = User.objects.create_user(username, password='pw-12345!')
+        UserProfile.objects.filter(user=user).update(department=department, role=role)
+        return user
+
+    def add_document(self, uploader, title):
+        return Document.objects.create(title=title, uploader=uploader,
+                                       file=SimpleUploadedFile(f'{title}.txt', title.encode()))
+
+    def visible(self, user, permission='view'):
+        return set(visible_documents(user, permission).values_list('title', flat=True))
+
+    def test_grants(self):
+        self.assertEqual(self.visible(self.reader), set())
+        self.assertEqual(self.visible(self.owner), {'ledger', 'payroll'})
+
+        grant = DocumentGrant.objects.create(user=self.reader, document=self.document)
+        self.assertEqual(self.visible(self.reader), {'ledger'})
+        self.assertEqual(self.visible(self.reader, MANAGE), set())
+        grant.delete()
+        self.assertEqual(self.visible(self.reader), set())
+
+        # Department to department: Audit members see documents of Finance members
+        DocumentGrant.objects.create(department='Audit', owner_department='Finance', permission='manage')
+        self.assertEqual(self.visible(self.reader, MANAGE), {'ledger', 'payroll'})
+        profile = UserProfile.objects.get(user=self.reader)
+        profile.department = 'Sales'
+        profile.save()  # as edit_user does: the cached grants are dropped
+        self.assertEqual(self.visible(self.reader), set())
+
+        # A role grant on one owner's documents
+        DocumentGrant.objects.create(role='user', owner=self.owner)
+        self.assertEqual(self.visible(self.reader), {'ledger', 'payroll'})
+        self.assertEqual(self.visible(self.make_user('boss', role='manager')), set())
+
+    def test_views(self):
+        self.client.login(username='reader', password='pw-12345!')
+        url = f'/documents/{self.document.pk}/'
+        self.assertRedirects(self.client.get(url), '/documents/my-documents/', fetch_redirect_response=False)
+
+        DocumentGrant.objects.create(department='Audit', document=self.document)
+        self.assertEfficientView(url, 6)
+        self.assertEqual(self.client.get(f'/documents/{self.other.pk}/').status_code, 302)
+        # View does not include delete
+        self.client.post(f'/documents/{self.document.pk}/delete/')
+        self.assertTrue(Document.objects.filter(pk=self.document.pk).exists())
+
+        response = self.assertEfficientView('/search/', 7)
+        self.assertEqual([document.title for document in response.context['documents']], ['ledger'])
+        self.assertEqual(response.context['categories'], [('other', 1)])
+
+        # The page is cached for the reader; the owner's writes expire it too
+        self.assertContains(self.client.get('/search/'), 'ledger')
+        self.document.title = 'general ledger'
+        self.document.save()
+        self.assertContains(self.client.get('/search/'), 'general ledger')
+        self.document.delete()
+        self.assertNotContains(self.client.get('/search/'), 'ledger')
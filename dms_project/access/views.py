@@ -1,49 +1,53 @@
 # access/views.py
+import datetime
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.db.models import Count, Q
+from django.utils import timezone
 from .models import UserProfile
-from documents.models import Document
+from .permissions import access_for
+from accounts.stats import GLOBAL, daily_counts, global_stats, local_day
 
-# Helper functions for role checking
+# Days of uploads charted on the admin dashboard
+UPLOAD_HISTORY_DAYS = 14
+
+# Helper functions for role checking; the role comes with the request's
+# user, loaded together with its profile (access/permissions.py)
 def is_admin(user):
-    return user.is_authenticated and (user.is_superuser or (hasattr(user, 'profile') and user.profile.role == 'admin'))
+    return user.is_authenticated and access_for(user).is_admin
 
 def is_manager(user):
-    return user.is_authenticated and (user.is_staff or (hasattr(user, 'profile') and user.profile.role in ['admin', 'manager']))
+    return user.is_authenticated and access_for(user).is_manager
 
 def is_reviewer(user):
-    return user.is_authenticated and (user.is_staff or (hasattr(user, 'profile') and user.profile.role in ['admin', 'manager', 'reviewer']))
+    return user.is_authenticated and access_for(user).is_reviewer
 
 @login_required
 @user_passes_test(is_admin)
 def admin_dashboard(request):
     """Admin dashboard with system overview""" 
     
-    # Statistics
-    total_users = User.objects.count()
-    total_documents = Document.objects.count()
-    pending_reviews = Document.objects.filter(status='pending').count()
+    # Statistics (cached counters, see accounts/stats.py)
+    stats = global_stats()
+    doc_stats = stats['documents']
     
     # Recent users
     recent_users = User.objects.select_related('profile').order_by('-date_joined')[:5]
     
-    # Document statistics by status
-    doc_stats = {
-        'pending': Document.objects.filter(status='pending').count(),
-        'under_review': Document.objects.filter(status='under_review').count(),
-        'approved': Document.objects.filter(status='approved').count(),
-        'rejected': Document.objects.filter(status='rejected').count(),
-    }
+    # Uploads per day over the last two weeks, from the per-day counters
+    today = local_day(timezone.now())
+    uploads = daily_counts(GLOBAL, 'documents', today - datetime.timedelta(days=UPLOAD_HISTORY_DAYS - 1), today)
+    busiest = max(count for _, count in uploads) or 1
     
     context = {
-        'total_users': total_users,
-        'total_documents': total_documents,
-        'pending_reviews': pending_reviews,
+        'total_users': stats['users'],
+        'total_documents': doc_stats['total'],
+        'pending_reviews': doc_stats['pending'],
         'recent_users': recent_users,
         'doc_stats': doc_stats,
+        'uploads_per_day': [(day, count, count * 100 // busiest) for day, count in uploads],
     }
     return render(request, 'access/admin_dashboard.html', context)
 
@@ -161,13 +165,13 @@ def user_permissions(request, user_id):
 def role_list(request):
     """View and manage roles"""
     # Count users per role
+    counts = global_stats()['roles']
     role_stats = []
     for role_code, role_name in UserProfile.ROLE_CHOICES:
-        count = UserProfile.objects.filter(role=role_code).count()
         role_stats.append({
             'code': role_code,
             'name': role_name,
-            'count': count,
+            'count': counts[role_code],
         })
     
     context = {
@@ -0,0 +1,12 @@
+# accounts/management/commands/reconcile_stats.py
+from django.core.management.base import BaseCommand
+
+from accounts.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recompute cached dashboard counters and fix any drift"
+
+    def handle(self, *args, **options):
+        fixed = reconcile()
+        self.stdout.write(self.style.SUCCESS(f"Corrected {fixed} counters."))
@@ -1,3 +1,47 @@
+# accounts/models.py
 from django.db import models
 
-# Create your models here.
+
+class StatCounter(models.Model):
+    """Cached dashboard counter, kept current by signal handlers (accounts/stats.py).
+
+    `scope` is 'global' or 'user:<id>'; `name` is e.g. 'documents',
+    'status:pending', 'role:reviewer' or 'reviews:approved'. A scope with no
+    rows has not been seeded yet and is computed on first read.
+    """
+    scope = models.CharField(max_length=50)
+    name = models.CharField(max_length=50)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'name'], name='stat_counter_scope_name_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.name} = {self.value}"
+
+
+class DailyCounter(models.Model):
+    """StatCounter split by day: documents uploaded, reviews by status.
+
+    One row per (scope, name, day) with a non-zero count, `day` being the
+    local date (TIME_ZONE) of the upload or review. Date histograms and
+    "today" figures read a few of these rows instead of counting the source
+    tables by DATE(...), which no index serves. Kept current by the signal
+    handlers in accounts/signals.py; `reconcile_stats` rebuilds it.
+    """
+    scope = models.CharField(max_length=50)
+    name = models.CharField(max_length=50)
+    day = models.DateField()
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index for a scope's days, in order
+            models.UniqueConstraint(fields=['scope', 'name', 'day'], name='daily_counter_scope_name_day_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.name} {self.day} = {self.value}"
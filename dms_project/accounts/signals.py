@@ -0,0 +1,200 @@
+# accounts/signals.py
+"""Keep StatCounter rows current as documents, reviews and profiles change.
+
+post_init remembers the value a counted field had when the row was loaded,
+so post_save can move the count from the old bucket to the new one without
+re-reading the row. Instances loaded with the field deferred are not
+tracked; `manage.py reconcile_stats` corrects anything missed that way.
+"""
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from access.models import UserProfile
+from documents.models import Document
+from documents.signals import bulk_deleting, documents_bulk_created, documents_bulk_deleting, documents_bulk_updating
+from review.models import Review
+from review.signals import reviews_bulk_created
+from .stats import (
+    GLOBAL, bump, bump_daily, bump_daily_documents, bump_daily_reviews, daily_document_counts,
+    daily_review_counts, local_day, user_scope,
+)
+
+
+UNKNOWN = object()
+
+
+def _remember(instance, field):
+    # __dict__ rather than getattr: reading a deferred field would cost a query
+    instance._stats_original = instance.__dict__.get(field, UNKNOWN)
+
+
+def _original(instance, field):
+    original = getattr(instance, '_stats_original', UNKNOWN)
+    return getattr(instance, field) if original is UNKNOWN else original
+
+
+def _moved(instance, field, created):
+    """(old, new) bucket values for a save, or None when nothing moved"""
+    new = getattr(instance, field)
+    old = None if created else getattr(instance, '_stats_original', UNKNOWN)
+    instance._stats_original = new
+    if old is UNKNOWN or old == new:
+        return None
+    return old, new
+
+
+def _shift(scopes, prefix, old, new):
+    for scope in scopes:
+        if old is not None:
+            bump(scope, f'{prefix}:{old}', -1)
+        if new is not None:
+            bump(scope, f'{prefix}:{new}', 1)
+
+
+def _shift_daily_review(review, old, new):
+    day = local_day(review.created_at)
+    if old is not None:
+        bump_daily((GLOBAL,), f'reviews:{old}', day, -1)
+    if new is not None:
+        bump_daily((GLOBAL,), f'reviews:{new}', day, 1)
+
+
+@receiver(post_init, sender=Document)
+def remember_document_status(sender, instance, **kwargs):
+    _remember(instance, 'status')
+
+
+@receiver(post_save, sender=Document)
+def count_document(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    scopes = (GLOBAL, user_scope(instance.uploader_id))
+    if created:
+        for scope in scopes:
+            bump(scope, 'documents', 1)
+        bump_daily(scopes, 'documents', local_day(instance.uploaded_at), 1)
+    moved = _moved(instance, 'status', created)
+    if moved:
+        _shift(scopes, 'status', *moved)
+
+
+@receiver(post_delete, sender=Document)
+def uncount_document(sender, instance, **kwargs):
+    if bulk_deleting.get():
+        return
+    scopes = (GLOBAL, user_scope(instance.uploader_id))
+    for scope in scopes:
+        bump(scope, 'documents', -1)
+    bump_daily(scopes, 'documents', local_day(instance.uploaded_at), -1)
+    _shift(scopes, 'status', _original(instance, 'status'), None)
+
+
+def _bump_grouped(counts, sign):
+    """Apply {(uploader_id, status): documents} to the document counters"""
+    totals = Counter()
+    for (uploader_id, status), count in counts.items():
+        for scope in (GLOBAL, user_scope(uploader_id)):
+            totals[scope, 'documents'] += count
+            totals[scope, f'status:{status}'] += count
+    for (scope, name), count in totals.items():
+        bump(scope, name, sign * count)
+
+
+def _status_counts(queryset):
+    rows = queryset.order_by().values_list('uploader_id', 'status').annotate(count=Count('id'))
+    return {(uploader_id, status): count for uploader_id, status, count in rows}
+
+
+@receiver(documents_bulk_created)
+def count_created_documents(sender, documents, **kwargs):
+    _bump_grouped(Counter((document.uploader_id, document.status) for document in documents), 1)
+    bump_daily_documents(Counter(
+        (document.uploader_id, local_day(document.uploaded_at)) for document in documents
+    ))
+
+
+@receiver(documents_bulk_deleting)
+def uncount_deleted_documents(sender, queryset, **kwargs):
+    _bump_grouped(_status_counts(queryset), -1)
+    bump_daily_documents(daily_document_counts(queryset), -1)
+    reviews = daily_review_counts(Review.objects.filter(document__in=queryset))
+    by_status = Counter()
+    for (status, _), count in reviews.items():
+        by_status[status] += count
+    for status, count in by_status.items():
+        bump(GLOBAL, f'reviews:{status}', -count)
+    bump_daily_reviews(reviews, -1)
+
+
+@receiver(documents_bulk_updating)
+def move_updated_documents(sender, queryset, changes, **kwargs):
+    if 'status' not in changes:
+        return
+    totals = Counter()
+    for (uploader_id, status), count in _status_counts(queryset).items():
+        for scope in (GLOBAL, user_scope(uploader_id)):
+            totals[scope, f'status:{status}'] -= count
+            totals[scope, f'status:{changes["status"]}'] += count
+    for (scope, name), count in totals.items():
+        bump(scope, name, count)
+
+
+@receiver(reviews_bulk_created)
+def count_created_reviews(sender, reviews, **kwargs):
+    for status, count in Counter(review.status for review in reviews).items():
+        bump(GLOBAL, f'reviews:{status}', count)
+    bump_daily_reviews(Counter((review.status, local_day(review.created_at)) for review in reviews))
+
+
+@receiver(post_init, sender=Review)
+def remember_review_status(sender, instance, **kwargs):
+    _remember(instance, 'status')
+
+
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created, raw=False, **kwargs):
+    moved = None if raw else _moved(instance, 'status', created)
+    if moved:
+        _shift((GLOBAL,), 'reviews', *moved)
+        _shift_daily_review(instance, *moved)
+
+
+@receiver(post_delete, sender=Review)
+def uncount_review(sender, instance, **kwargs):
+    if bulk_deleting.get():
+        return
+    _shift((GLOBAL,), 'reviews', _original(instance, 'status'), None)
+    _shift_daily_review(instance, _original(instance, 'status'), None)
+
+
+
+@receiver(post_init, sender=UserProfile)
+def remember_profile_role(sender, instance, **kwargs):
+    _remember(instance, 'role')
+
+
+@receiver(post_save, sender=UserProfile)
+def count_profile(sender, instance, created, raw=False, **kwargs):
+    moved = None if raw else _moved(instance, 'role', created)
+    if moved:
+        _shift((GLOBAL,), 'role', *moved)
+
+
+@receiver(post_delete, sender=UserProfile)
+def uncount_profile(sender, instance, **kwargs):
+    _shift((GLOBAL,), 'role', _original(instance, 'role'), None)
+
+
+@receiver(post_save, sender=User)
+def count_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump(GLOBAL, 'users', 1)
+
+
+@receiver(post_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    bump(GLOBAL, 'users', -1)
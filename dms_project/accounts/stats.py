@@ -0,0 +1,247 @@
+# accounts/stats.py
+"""Dashboard statistics backed by the StatCounter table.
+
+Counts are computed once per scope with a conditional aggregation (one
+query per table instead of one COUNT per status or role), stored as
+StatCounter rows, and from then on adjusted in place by the signal
+handlers in accounts/signals.py. `reconcile` recomputes everything and
+fixes any drift, e.g. after writes that bypassed signals.
+
+DailyCounter holds the same document and review counts per local day, for
+date histograms and "today" figures.
+"""
+import datetime
+from collections import Counter, defaultdict
+
+from django.contrib.auth.models import User
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from access.models import UserProfile
+from dms_project.cache import cached
+from documents.models import Document
+from review.models import Review
+from .models import DailyCounter, StatCounter
+
+GLOBAL = 'global'
+
+DOCUMENT_STATUSES = [code for code, _ in Document.STATUS_CHOICES]
+ROLES = [code for code, _ in UserProfile.ROLE_CHOICES]
+REVIEW_STATUSES = [code for code, _ in Review.REVIEW_STATUS]
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def document_aggregates():
+    aggregates = {'documents': Count('id')}
+    for status in DOCUMENT_STATUSES:
+        aggregates[f'status:{status}'] = Count('id', filter=Q(status=status))
+    return aggregates
+
+
+def compute_scope(scope):
+    """Count everything a scope tracks, straight from the source tables"""
+    if scope != GLOBAL:
+        user_id = int(scope.split(':', 1)[1])
+        return Document.objects.filter(uploader_id=user_id).aggregate(**document_aggregates())
+
+    values = Document.objects.aggregate(**document_aggregates())
+    values.update(UserProfile.objects.aggregate(**{
+        f'role:{role}': Count('id', filter=Q(role=role)) for role in ROLES
+    }))
+    values.update(Review.objects.aggregate(**{
+        f'reviews:{status}': Count('id', filter=Q(status=status)) for status in REVIEW_STATUSES
+    }))
+    values['users'] = User.objects.count()
+    return values
+
+
+def get_counters(scope):
+    """Counter values for a scope, seeding the table on first use"""
+    counters = dict(StatCounter.objects.filter(scope=scope).values_list('name', 'value'))
+    if not counters:
+        counters = compute_scope(scope)
+        StatCounter.objects.bulk_create(
+            [StatCounter(scope=scope, name=name, value=value) for name, value in counters.items()],
+            ignore_conflicts=True,
+        )
+    return counters
+
+
+def bump(scope, name, delta):
+    """Adjust a counter in place; unseeded scopes are left for the first read"""
+    if delta:
+        StatCounter.objects.filter(scope=scope, name=name).update(value=F('value') + delta)
+
+
+def _document_counts(counters):
+    counts = {status: counters.get(f'status:{status}', 0) for status in DOCUMENT_STATUSES}
+    counts['total'] = counters.get('documents', 0)
+    return counts
+
+
+def document_counts(user):
+    """{'total': n, '<status>': n, ...} for one user's documents, cached per user"""
+    return cached(user.pk, 'stats:documents', [], lambda: _document_counts(get_counters(user_scope(user.pk))))
+
+
+def global_stats():
+    """System-wide document, user and role counts, read in one query"""
+    counters = get_counters(GLOBAL)
+    return {
+        'documents': _document_counts(counters),
+        'users': counters.get('users', 0),
+        'roles': {role: counters.get(f'role:{role}', 0) for role in ROLES},
+        'reviews': {status: counters.get(f'reviews:{status}', 0) for status in REVIEW_STATUSES},
+    }
+
+
+# --- Per-day counters --------------------------------------------------------
+
+def local_day(value):
+    """The day (in TIME_ZONE) a datetime is counted under in DailyCounter"""
+    if timezone.is_aware(value):
+        value = timezone.localtime(value, timezone.get_default_timezone())
+    return value.date()
+
+
+def bump_daily(scopes, name, day, delta):
+    """Adjust one day's counter in each scope with a single UPDATE.
+
+    Rows are created on the first increment of the day: as zeros, ignoring
+    any a concurrent request created first, then incremented like the rest.
+    """
+    if not delta:
+        return
+    rows = DailyCounter.objects.filter(scope__in=scopes, name=name, day=day)
+    updated = rows.update(value=F('value') + delta)
+    if updated == len(scopes) or delta < 0:
+        return
+    missing = set(scopes) - set(rows.values_list('scope', flat=True)) if updated else set(scopes)
+    DailyCounter.objects.bulk_create(
+        [DailyCounter(scope=scope, name=name, day=day) for scope in missing], ignore_conflicts=True,
+    )
+    rows.filter(scope__in=missing).update(value=F('value') + delta)
+
+
+def daily_counts(scope, name, first, last):
+    """[(day, count)] for each day first..last, days without a row as 0"""
+    stored = dict(
+        DailyCounter.objects.filter(scope=scope, name=name, day__gte=first, day__lte=last)
+        .values_list('day', 'value')
+    )
+    days = (first + datetime.timedelta(days=n) for n in range((last - first).days + 1))
+    return [(day, stored.get(day, 0)) for day in days]
+
+
+def today_count(scope, name):
+    """Today's value of a per-day counter"""
+    today = local_day(timezone.now())
+    values = DailyCounter.objects.filter(scope=scope, name=name, day=today).values_list('value', flat=True)
+    return next(iter(values), 0)
+
+
+def daily_document_counts(queryset):
+    """Counter {(uploader_id, day): documents} with one GROUP BY"""
+    rows = (
+        queryset.order_by()
+        .values_list('uploader_id', TruncDate('uploaded_at', tzinfo=timezone.get_default_timezone()))
+        .annotate(count=Count('id'))
+    )
+    return Counter({(uploader_id, day): count for uploader_id, day, count in rows})
+
+
+def daily_review_counts(queryset):
+    """Counter {(status, day): reviews} with one GROUP BY"""
+    rows = (
+        queryset.order_by()
+        .values_list('status', TruncDate('created_at', tzinfo=timezone.get_default_timezone()))
+        .annotate(count=Count('id'))
+    )
+    return Counter({(status, day): count for status, day, count in rows})
+
+
+def bump_daily_documents(counts, sign=1):
+    """Apply a {(uploader_id, day): documents} Counter to the global and user counters"""
+    totals = Counter()
+    for (uploader_id, day), count in counts.items():
+        totals[GLOBAL, day] += count
+        totals[user_scope(uploader_id), day] += count
+    # Scopes moving by the same amount on the same day share an UPDATE
+    scopes = defaultdict(list)
+    for (scope, day), count in totals.items():
+        scopes[day, count].append(scope)
+    for (day, count), group in scopes.items():
+        bump_daily(group, 'documents', day, sign * count)
+
+
+def bump_daily_reviews(counts, sign=1):
+    """Apply a {(status, day): reviews} Counter to the global counters"""
+    for (status, day), count in counts.items():
+        bump_daily((GLOBAL,), f'reviews:{status}', day, sign * count)
+
+
+def compute_daily():
+    """{(scope, name, day): value} for every non-zero day, from the source tables"""
+    expected = Counter()
+    for (uploader_id, day), count in daily_document_counts(Document.objects.all()).items():
+        expected[GLOBAL, 'documents', day] += count
+        expected[user_scope(uploader_id), 'documents', day] += count
+    for (status, day), count in daily_review_counts(Review.objects.all()).items():
+        expected[GLOBAL, f'reviews:{status}', day] += count
+    return expected
+
+
+def reconcile_daily():
+    """Make DailyCounter match the source tables; returns the rows corrected"""
+    expected = compute_daily()
+    fixed = 0
+    for pk, scope, name, day, value in DailyCounter.objects.values_list('pk', 'scope', 'name', 'day', 'value'):
+        wanted = expected.pop((scope, name, day), 0)
+        if wanted == value:
+            continue
+        if wanted:
+            DailyCounter.objects.filter(pk=pk).update(value=wanted)
+        else:
+            DailyCounter.objects.filter(pk=pk).delete()
+        fixed += 1
+    DailyCounter.objects.bulk_create(
+        [DailyCounter(scope=scope, name=name, day=day, value=value) for (scope, name, day), value in expected.items()],
+        ignore_conflicts=True,
+    )
+    return fixed + len(expected)
+
+
+def reconcile():
+    """Recompute every seeded scope and the per-day counters; returns the number corrected"""
+    expected = {GLOBAL: compute_scope(GLOBAL)}
+
+    user_scopes = set(
+        StatCounter.objects.filter(scope__startswith='user:').values_list('scope', flat=True).distinct()
+    )
+    if user_scopes:
+        empty = {name: 0 for name in document_aggregates()}
+        for scope in user_scopes:
+            expected[scope] = dict(empty)
+        # One grouped pass over documents for every seeded user
+        per_user = (
+            Document.objects.filter(uploader_id__in=[int(s.split(':', 1)[1]) for s in user_scopes])
+            .order_by()
+            .values('uploader_id')
+            .annotate(**document_aggregates())
+        )
+        for row in per_user:
+            expected[user_scope(row.pop('uploader_id'))] = row
+
+    fixed = 0
+    for scope, values in expected.items():
+        stored = dict(StatCounter.objects.filter(scope=scope).values_list('name', 'value'))
+        for name, value in values.items():
+            if stored.get(name) == value:
+                continue
+            StatCounter.objects.update_or_create(scope=scope, name=name, defaults={'value': value})
+            fixed += 1
+    return fixed + reconcile_daily()
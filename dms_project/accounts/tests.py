@@ -1,3 +1,143 @@
-from django.test import TestCase
+# accounts/tests.py
+import datetime
+import shutil
+import tempfile
+import zoneinfo
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from documents.bulk import delete_documents, update_documents
+from documents.models import Document
+from dms_project.dates import date_range, date_range_filter
+from review.models import Review
+from .models import DailyCounter
+from .stats import GLOBAL, daily_counts, get_counters, local_day, reconcile, reconcile_daily, today_count, user_scope
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class DateRangeTests(TestCase):
+
+    @override_settings(TIME_ZONE='Europe/Berlin')
+    def test_half_open_local_days(self):
+        start, end = date_range(datetime.date(2024, 3, 30), datetime.date(2024, 3, 31))
+        berlin = zoneinfo.ZoneInfo('Europe/Berlin')
+        self.assertEqual(start, datetime.datetime(2024, 3, 30, tzinfo=berlin))
+        self.assertEqual(end, datetime.datetime(2024, 4, 1, tzinfo=berlin))
+        utc = datetime.timezone.utc
+        self.assertEqual(end.astimezone(utc) - start.astimezone(utc), datetime.timedelta(hours=47))  # DST began
+        self.assertEqual(date_range_filter('uploaded_at', last=datetime.date(2024, 3, 31)),
+                         {'uploaded_at__lt': end})
+        self.assertEqual(date_range_filter('uploaded_at'), {})
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class StatCounterTests(TestCase):
+    """StatCounter rows kept in step with the documents by the signal handlers"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.scope = user_scope(self.owner.pk)
+        self.today = local_day(timezone.now())
+        # Seed both scopes first: from then on only the handlers move them
+        get_counters(GLOBAL)
+        get_counters(self.scope)
+
+    def add_document(self, title='doc'):
+        return Document.objects.create(
+            title=title, uploader=self.owner, file=SimpleUploadedFile(f'{title}.txt', title.encode()),
+        )
+
+    def assertCounts(self, documents, **statuses):
+        for scope in (GLOBAL, self.scope):
+            counters = get_counters(scope)
+            self.assertEqual(counters['documents'], documents, scope)
+            for status in ('pending', 'under_review', 'approved', 'rejected', 'resubmitted'):
+                self.assertEqual(counters[f'status:{status}'], statuses.get(status, 0), (scope, status))
+            self.assertEqual(today_count(scope, 'documents'), documents, scope)
+
+    def test_create_status_change_and_delete(self):
+        first = self.add_document('first')
+        second = self.add_document('second')
+        self.assertCounts(2, pending=2)
+
+        first.status = 'approved'
+        first.save()
+        self.assertCounts(2, pending=1, approved=1)
+
+        second.delete()
+        self.assertCounts(1, approved=1)
+        self.assertEqual(reconcile(), 0)
+
+    def test_bulk_status_change_and_delete(self):
+        for title in ('a', 'b', 'c'):
+            self.add_document(title)
+        update_documents(Document.objects.filter(title__in=['a', 'b']), status='rejected')
+        self.assertCounts(3, pending=1, rejected=2)
+
+        delete_documents(Document.objects.filter(title__in=['b', 'c']))
+        self.assertCounts(1, rejected=1)
+        self.assertEqual(reconcile(), 0)
+
+    def test_reconcile_fixes_drift(self):
+        self.add_document()
+        # A write that bypassed the signals
+        Document.objects.update(status='approved')
+        self.assertEqual(reconcile(), 4)  # pending and approved, in both scopes
+        self.assertCounts(1, approved=1)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DailyCounterTests(TestCase):
+    """Per-day counters kept by the signal handlers"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.reviewer = User.objects.create_user('reviewer', is_staff=True)
+        self.today = local_day(timezone.now())
+
+    def add_document(self, title='doc'):
+        return Document.objects.create(
+            title=title, uploader=self.owner, file=SimpleUploadedFile(f'{title}.txt', title.encode()),
+        )
+
+    def test_uploads_per_user_per_day(self):
+        first = self.add_document()
+        self.add_document()
+        for scope in (GLOBAL, user_scope(self.owner.pk)):
+            self.assertEqual(daily_counts(scope, 'documents', self.today, self.today), [(self.today, 2)])
+        first.delete()
+        self.assertEqual(today_count(user_scope(self.owner.pk), 'documents'), 1)
+
+        yesterday = self.today - datetime.timedelta(days=1)
+        self.assertEqual(daily_counts(GLOBAL, 'documents', yesterday, self.today), [(yesterday, 0), (self.today, 1)])
+
+    def test_reviews_today(self):
+        document = self.add_document()
+        review = Review.objects.create(document=document, reviewer=self.reviewer, status='approved')
+        self.assertEqual(today_count(GLOBAL, 'reviews:approved'), 1)
+        review.status = 'rejected'
+        review.save()
+        self.assertEqual(today_count(GLOBAL, 'reviews:approved'), 0)
+        self.assertEqual(today_count(GLOBAL, 'reviews:rejected'), 1)
+
+    def test_reconcile(self):
+        self.add_document()
+        self.assertEqual(reconcile_daily(), 0)
+        DailyCounter.objects.filter(scope=GLOBAL).update(value=7)
+        DailyCounter.objects.create(scope=GLOBAL, name='documents', day=datetime.date(2000, 1, 1), value=3)
+        DailyCounter.objects.filter(scope=user_scope(self.owner.pk)).delete()
+        self.assertEqual(reconcile_daily(), 3)
+        self.assertEqual(
+            sorted(DailyCounter.objects.values_list('scope', 'day', 'value')),
+            [(GLOBAL, self.today, 1), (user_scope(self.owner.pk), self.today, 1)],
+        )
@@ -5,7 +5,7 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
-from documents.models import Document
+from .stats import document_counts
 # R-1.1 User Registration (Only Normal Users)
 def register_view(request):
     if request.method == 'POST':
@@ -84,14 +84,14 @@ def logout_view(request):
 # User Dashboard
 @login_required
 def dashboard_view(request):
-    # Get document counts for the current user
-    user_documents = Document.objects.filter(uploader=request.user)
+    # Get document counts for the current user (cached counters)
+    counts = document_counts(request.user)
     
     context = {
-        'approved_count': user_documents.filter(status='approved').count(),
-        'pending_count': user_documents.filter(status='pending').count(),
-        'rejected_count': user_documents.filter(status='rejected').count(),
-        'under_review_count': user_documents.filter(status='under_review').count(),
+        'approved_count': counts['approved'],
+        'pending_count': counts['pending'],
+        'rejected_count': counts['rejected'],
+        'under_review_count': counts['under_review'],
     }
     return render(request, 'accounts/dashboard.html', context)
 
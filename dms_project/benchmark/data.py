@@ -0,0 +1,273 @@
+# benchmark/data.py
+"""Synthetic data for the benchmark scenarios.
+
+`generate` creates N users with M documents each and R reviewers who
+decide K documents each, going through the same code paths as production
+(bulk ingestion, the job queue, review decisions) so that counters, facets,
+the search index and the review queue are all in place. Files are real
+PDF, DOCX, XLSX, TXT, JPG and PNG files of roughly the requested size,
+filled with words from a fixed vocabulary that the search scenario queries.
+Everything is drawn from a seeded random generator: the same parameters
+give the same data.
+"""
+import io
+import random
+import zipfile
+from dataclasses import dataclass, field
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+
+from documents.bulk import Source, ingest
+from documents.models import Document
+from jobs.queue import claim
+from jobs.worker import execute
+from review.decisions import decide
+from review.models import ReviewQueueEntry
+from search.backends import get_search_backend
+
+try:
+    from PIL import Image
+except ImportError:  # optional dependency, images are replaced by text files without it
+    Image = None
+
+PASSWORD = 'bench-pw-12345!'
+
+WORDS = (
+    'account agreement annual approval asset audit balance board budget campaign capital '
+    'claim client compliance contract cost customer deadline delivery department design '
+    'division employee estimate expense finance forecast growth guideline headcount hiring '
+    'incident income inventory invoice journal launch ledger license logistics maintenance '
+    'margin market meeting memo migration milestone minutes onboarding operations order '
+    'outline partner payroll performance pipeline plan policy portfolio pricing procedure '
+    'procurement product profit project proposal purchase quarter receipt recruitment '
+    'regional release report request revenue review risk roadmap salary schedule security '
+    'service shipment specification sprint strategy summary supplier survey target tax '
+    'template tender timeline training travel vendor warehouse workflow'
+).split()
+
+# (file type, weight): roughly what an office uploads
+FILE_MIX = [('pdf', 30), ('docx', 25), ('xlsx', 15), ('txt', 15), ('jpg', 10), ('png', 5)]
+
+CATEGORIES = [value for value, _ in Document.CATEGORY_CHOICES]
+
+
+@dataclass
+class Dataset:
+    """Ids of what `generate` created, for the scenarios to pick from"""
+    users: list = field(default_factory=list)
+    reviewers: list = field(default_factory=list)
+    documents: dict = field(default_factory=dict)  # user id -> [document id]
+    parameters: dict = field(default_factory=dict)
+
+    def as_dict(self):
+        return {
+            **self.parameters,
+            'documents_total': sum(len(ids) for ids in self.documents.values()),
+            'open_for_review': ReviewQueueEntry.objects.count(),
+        }
+
+
+def words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def lines(rng, size, width=12):
+    """Lines of vocabulary words adding up to about `size` characters"""
+    result, total = [], 0
+    while total < size:
+        line = words(rng, width).capitalize() + '.'
+        result.append(line)
+        total += len(line) + 1
+    return result
+
+
+def make_txt(rng, size):
+    return '\n'.join(lines(rng, size)).encode()
+
+
+def _zip(parts):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in parts.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def _escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def make_docx(rng, size):
+    # Text compresses about 3:1; aim at the requested size on disk
+    paragraphs = ''.join(
+        f'<w:p><w:r><w:t>{_escape(line)}</w:t></w:r></w:p>' for line in lines(rng, size * 3)
+    )
+    return _zip({
+        '[Content_Types].xml': (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" ContentType="application/'
+            'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>'
+        ),
+        'word/document.xml': (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{paragraphs}</w:body></w:document>'
+        ),
+    })
+
+
+def make_xlsx(rng, size):
+    rows = ''.join(
+        f'<row r="{i}"><c r="A{i}" t="inlineStr"><is><t>{_escape(words(rng, 3))}</t></is></c>'
+        f'<c r="B{i}"><v>{rng.randint(1, 100000)}</v></c></row>'
+        for i in range(1, max(size * 3 // 60, 1) + 1)
+    )
+    return _zip({
+        '[Content_Types].xml': (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="xml" ContentType="application/xml"/></Types>'
+        ),
+        'xl/worksheets/sheet1.xml': (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f'<sheetData>{rows}</sheetData></worksheet>'
+        ),
+    })
+
+
+def make_pdf(rng, size):
+    """A one-page PDF with real text objects (what pypdf extracts)"""
+    text = lines(rng, size, width=8)
+    stream = 'BT /F1 10 Tf 40 800 Td 12 TL\n' + '\n'.join(
+        '(' + line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ") '" for line in text
+    ) + '\nET'
+    objects = [
+        '<< /Type /Catalog /Pages 2 0 R >>',
+        '<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+        '/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>',
+        f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream',
+        '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1'))
+    xref = out.tell()
+    out.write(f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode())
+    for offset in offsets:
+        out.write(f'{offset:010d} 00000 n \n'.encode())
+    out.write(f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode())
+    return out.getvalue()
+
+
+def make_image(rng, size, file_type):
+    # Noise barely compresses: about 3 bytes a pixel for PNG, less for JPEG
+    side = max(int((size / 3) ** 0.5), 8)
+    image = Image.frombytes('RGB', (side, side), rng.randbytes(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG' if file_type == 'jpg' else 'PNG')
+    return buffer.getvalue()
+
+
+def make_file(rng, file_type, size):
+    """(content, file type) of a file of about `size` bytes; text stands in for images without Pillow"""
+    if file_type in ('jpg', 'png'):
+        if Image is not None:
+            return make_image(rng, size, file_type), file_type
+        file_type = 'txt'
+    return {'txt': make_txt, 'docx': make_docx, 'xlsx': make_xlsx, 'pdf': make_pdf}[file_type](rng, size), file_type
+
+
+def random_files(rng, count, size):
+    """[(name, content)] of `count` files drawn from FILE_MIX"""
+    types, weights = zip(*FILE_MIX)
+    files = []
+    for _ in range(count):
+        file_type = rng.choices(types, weights)[0]
+        content, file_type = make_file(rng, file_type, int(size * rng.uniform(0.5, 1.5)))
+        files.append((f'{words(rng, 3).replace(" ", "-")}.{file_type}', content))
+    return files
+
+
+def _source(name, content):
+    return Source(name, len(content), lambda: io.BytesIO(content))
+
+
+def run_jobs():
+    """Run every due background job (text extraction, previews) in-process"""
+    ran = 0
+    while True:
+        ids = claim(100)
+        if not ids:
+            return ran
+        for job_id in ids:
+            execute(job_id)
+        ran += len(ids)
+
+
+def _create_user(username, password_hash, **fields):
+    # save() rather than bulk_create: the profile and counters follow the signals
+    user = User(username=username, password=password_hash, **fields)
+    user.save()
+    return user
+
+
+def generate(users=10, documents=20, reviewers=2, reviews=5, file_size=32 * 1024, seed=0, stdout=None):
+    """Create the benchmark data set in the current database; returns a Dataset"""
+    rng = random.Random(seed)
+    dataset = Dataset(parameters={
+        'users': users, 'documents_per_user': documents, 'reviewers': reviewers,
+        'reviews_per_reviewer': reviews, 'file_size': file_size, 'seed': seed,
+    })
+    # One hash for everyone: hashing is deliberately slow, logging in is measured
+    password_hash = make_password(PASSWORD)
+
+    for i in range(users):
+        user = _create_user(f'bench-user-{i}', password_hash, email=f'user{i}@example.com')
+        dataset.users.append(user.pk)
+        ids = dataset.documents[user.pk] = []
+        remaining = documents
+        while remaining:
+            # Documents arrive in small uploads sharing their metadata
+            count = min(remaining, rng.randint(1, 10))
+            remaining -= count
+            reports = ingest(
+                user, [_source(name, content) for name, content in random_files(rng, count, file_size)],
+                category=rng.choice(CATEGORIES), tags=rng.sample(WORDS, rng.randint(0, 3)),
+                author=words(rng, 2).title(), description=words(rng, 12),
+            )
+            ids.extend(report['id'] for report in reports if report['ok'])
+        if stdout:
+            stdout.write(f"  user {user.username}: {len(ids)} documents")
+
+    for i in range(reviewers):
+        reviewer = _create_user(f'bench-reviewer-{i}', password_hash, is_staff=True)
+        dataset.reviewers.append(reviewer.pk)
+
+    ran = run_jobs()
+    if stdout:
+        stdout.write(f"  ran {ran} background jobs")
+    if connection.vendor == 'mysql':
+        get_search_backend().rebuild(stdout=stdout)
+
+    for reviewer in User.objects.filter(pk__in=dataset.reviewers).order_by('pk'):
+        open_documents = list(
+            Document.objects.filter(status__in=ReviewQueueEntry.OPEN_STATUSES)
+            .exclude(uploader=reviewer)
+            .order_by('pk')
+            .values_list('pk', 'version')
+        )
+        decisions = {'approved': {}, 'rejected': {}}
+        for pk, version in rng.sample(open_documents, min(reviews, len(open_documents))):
+            decisions['approved' if rng.random() < 0.7 else 'rejected'][pk] = version
+        for status, versions in decisions.items():
+            decide(reviewer, versions, status, words(rng, 8))
+    return dataset
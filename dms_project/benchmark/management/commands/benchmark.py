@@ -0,0 +1,102 @@
+# benchmark/management/commands/benchmark.py
+import json
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from benchmark.data import generate
+from benchmark.runner import compare, run
+from benchmark.scenarios import SCENARIOS
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic data set in a throwaway database, run the user-flow scenarios "
+        "in-process and save p50/p95/p99 latency, query counts and throughput as JSON. "
+        "Use --settings=benchmark.settings_sqlite for SQLite; the default settings use MySQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help="Users uploading documents")
+        parser.add_argument('--documents', type=int, default=20, help="Documents per user")
+        parser.add_argument('--reviewers', type=int, default=2)
+        parser.add_argument('--reviews', type=int, default=5, help="Documents each reviewer decides up front")
+        parser.add_argument('--file-size', type=int, default=32 * 1024, help="Average file size in bytes")
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help=f"Comma-separated, from: {', '.join(SCENARIOS)}")
+        parser.add_argument('--iterations', type=int, default=50, help="Timed runs of each scenario")
+        parser.add_argument('--warmup', type=int, default=2, help="Untimed runs of each scenario first")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default=None,
+                            help="JSON file to write (default: benchmark-<commit>-<database>.json)")
+        parser.add_argument('--compare', default=None, metavar='JSON',
+                            help="Earlier results to print the p95 change against")
+        parser.add_argument('--noinput', action='store_false', dest='interactive',
+                            help="Delete a leftover benchmark database without asking")
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as fileobj:
+                baseline = json.load(fileobj)
+
+        # The test database machinery gives a fresh, migrated database that
+        # is dropped afterwards; files go to a temporary MEDIA_ROOT.
+        old_name = connection.settings_dict['NAME']
+        media_root = tempfile.mkdtemp(prefix='dms-benchmark-')
+        connection.creation.create_test_db(verbosity=0, autoclobber=not options['interactive'], serialize=False)
+        try:
+            with override_settings(MEDIA_ROOT=media_root, DEBUG=False, ALLOWED_HOSTS=['testserver']):
+                started = time.perf_counter()
+                self.stdout.write("Generating data...")
+                dataset = generate(
+                    users=options['users'], documents=options['documents'], reviewers=options['reviewers'],
+                    reviews=options['reviews'], file_size=options['file_size'], seed=options['seed'],
+                    stdout=self.stdout if options['verbosity'] > 1 else None,
+                )
+                self.stdout.write(f"  done in {time.perf_counter() - started:.1f}s")
+                results = run(dataset, scenarios, options['iterations'], options['warmup'], options['seed'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        self.report(results)
+        output = options['output'] or 'benchmark-{}-{}.json'.format(
+            (results['meta']['commit'] or 'nocommit')[:10], results['meta']['database']['vendor'],
+        )
+        with open(output, 'w') as fileobj:
+            json.dump(results, fileobj, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+        if baseline:
+            self.report_comparison(compare(baseline, results))
+
+    def report(self, results):
+        for name, scenario in results['scenarios'].items():
+            self.stdout.write(
+                f"\n{name}: {scenario['iterations']} runs in {scenario['seconds']}s, "
+                f"{scenario['iterations_per_second']} runs/s, {scenario['requests_per_second']} requests/s, "
+                f"{scenario['failed_iterations']} failed"
+            )
+            for failure in scenario['failures']:
+                self.stdout.write(self.style.ERROR(f"  {failure}"))
+            self.stdout.write(f"  {'step':<18} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8}")
+            for step, summary in scenario['steps'].items():
+                latency = summary['latency_ms']
+                self.stdout.write(
+                    f"  {step:<18} {latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f}"
+                    f" {summary['queries']['max']:>8}"
+                )
+
+    def report_comparison(self, rows):
+        self.stdout.write("\np95 against the baseline (ms):")
+        for name, step, old, new, change in rows:
+            change = 'n/a' if change is None else f'{change:+.1f}%'
+            self.stdout.write(f"  {name:<12} {step:<18} {old:>9.1f} -> {new:>9.1f}  {change}")
@@ -0,0 +1,182 @@
+# benchmark/runner.py
+"""Running scenarios in-process and summarizing them as JSON-ready dicts.
+
+Requests go through django.test.Client, so the whole middleware and view
+stack runs but no network or server does; what is measured is the time
+this process spends on a request and the queries it sends. Results carry
+enough context (commit, database, data set) to compare runs across commits
+with `compare`.
+"""
+import datetime
+import platform
+import random
+import statistics
+import subprocess
+import time
+import traceback
+from collections import defaultdict
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from dms_project.cache import get_cache
+
+from .data import PASSWORD
+from .scenarios import SCENARIOS
+
+# Transaction bookkeeping, not work the view asked for (as in dms_project/testing.py)
+UNCOUNTED = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class StepFailed(Exception):
+    """A request answered with an unexpected status"""
+
+
+class Session:
+    """One browser: a test client whose requests are timed as named steps"""
+
+    def __init__(self, samples):
+        self.client = Client()
+        self.samples = samples
+
+    def request(self, step, method, path, data=None, status=200, **extra):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(path, data or {}, **extra)
+            if response.streaming:
+                # A download is only done once its last byte is out
+                for _ in response.streaming_content:
+                    pass
+            elapsed = time.perf_counter() - started
+        queries = sum(1 for query in ctx.captured_queries if not query['sql'].startswith(UNCOUNTED))
+        self.samples[step].append((elapsed, queries, response.status_code == status))
+        if response.status_code != status:
+            raise StepFailed(f'{step}: {method.upper()} {path} answered {response.status_code}, expected {status}')
+        return response
+
+    def get(self, step, path, data=None, status=200, **extra):
+        return self.request(step, 'get', path, data, status, **extra)
+
+    def post(self, step, path, data=None, status=200, **extra):
+        return self.request(step, 'post', path, data, status, **extra)
+
+    def login(self, user_id):
+        """Log in through the login form (a timed step); returns the user"""
+        user = User.objects.get(pk=user_id)
+        self.post('login', reverse('accounts:login'), {'username': user.username, 'password': PASSWORD}, status=302)
+        return user
+
+
+def percentile(values, fraction):
+    """Linear-interpolated percentile of a non-empty list"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize_step(samples):
+    latencies = [elapsed * 1000 for elapsed, _, _ in samples]
+    queries = [count for _, count, _ in samples]
+    return {
+        'count': len(samples),
+        'errors': sum(1 for _, _, ok in samples if not ok),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+            'p99': round(percentile(latencies, 0.99), 3),
+            'mean': round(statistics.fmean(latencies), 3),
+            'max': round(max(latencies), 3),
+        },
+        'queries': {
+            'mean': round(statistics.fmean(queries), 2),
+            'max': max(queries),
+        },
+    }
+
+
+def run_scenario(name, dataset, iterations, warmup=1, seed=0):
+    """Run one scenario `iterations` times after `warmup` untimed runs"""
+    scenario = SCENARIOS[name]
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        try:
+            scenario(Session(defaultdict(list)), dataset, rng)
+        except StepFailed:
+            pass
+
+    samples = defaultdict(list)
+    failures = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        try:
+            scenario(Session(samples), dataset, rng)
+        except Exception as exc:
+            failures.append(str(exc) if isinstance(exc, StepFailed) else traceback.format_exc(limit=3))
+    elapsed = time.perf_counter() - started
+
+    requests = sum(len(values) for values in samples.values())
+    return {
+        'iterations': iterations,
+        'failed_iterations': len(failures),
+        'failures': failures[:5],
+        'seconds': round(elapsed, 3),
+        'iterations_per_second': round(iterations / elapsed, 2) if elapsed else None,
+        'requests_per_second': round(requests / elapsed, 2) if elapsed else None,
+        'steps': {step: summarize_step(values) for step, values in samples.items()},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def database_info():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT sqlite_version()' if connection.vendor == 'sqlite' else 'SELECT VERSION()')
+        version = cursor.fetchone()[0]
+    return {'vendor': connection.vendor, 'version': version}
+
+
+def run(dataset, scenarios, iterations, warmup=1, seed=0):
+    """Run the named scenarios; returns the results document"""
+    get_cache().clear()
+    return {
+        'meta': {
+            'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'database': database_info(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'iterations': iterations,
+            'warmup': warmup,
+            'seed': seed,
+        },
+        'dataset': dataset.as_dict(),
+        'scenarios': {name: run_scenario(name, dataset, iterations, warmup, seed) for name in scenarios},
+    }
+
+
+def compare(before, after, metric='p95'):
+    """[(scenario, step, before ms, after ms, change %)] for steps in both results"""
+    rows = []
+    for name, scenario in after['scenarios'].items():
+        old_steps = before.get('scenarios', {}).get(name, {}).get('steps', {})
+        for step, summary in scenario['steps'].items():
+            if step not in old_steps:
+                continue
+            old = old_steps[step]['latency_ms'][metric]
+            new = summary['latency_ms'][metric]
+            rows.append((name, step, old, new, round((new - old) / old * 100, 1) if old else None))
+    return rows
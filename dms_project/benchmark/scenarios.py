@@ -0,0 +1,71 @@
+# benchmark/scenarios.py
+"""Scripted user flows, each a function of (session, dataset, rng).
+
+A scenario drives one fresh browser session through the views with the
+Session of benchmark/runner.py, which times every request as a named step.
+Scenarios pick their users and documents from the Dataset with `rng`, so a
+run is repeatable; lookups a real browser would get from the previous page
+are done with the ORM and are not timed.
+"""
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from documents.models import Document
+from review.queue import next_for_reviewer
+
+from .data import WORDS, random_files, words
+
+
+def browse(session, dataset, rng):
+    """login → dashboard → search → detail → download"""
+    user_id = rng.choice(dataset.users)
+    session.login(user_id)
+    session.get('dashboard', reverse('accounts:dashboard'))
+    session.get('search', reverse('search:search'), {'q': rng.choice(WORDS)})
+    session.get('search_filtered', reverse('search:search'), {'category': 'report', 'sort': 'title'})
+    document_id = rng.choice(dataset.documents[user_id])
+    session.get('detail', reverse('documents:detail', args=[document_id]))
+    session.get('download', reverse('documents:download', args=[document_id]))
+
+
+def review(session, dataset, rng):
+    """reviewer login → review queue → review form → decision"""
+    reviewer_id = rng.choice(dataset.reviewers)
+    reviewer = session.login(reviewer_id)
+    session.get('review_dashboard', reverse('review:dashboard'))
+    waiting = next_for_reviewer(reviewer, limit=20)
+    if not waiting:
+        return
+    document = rng.choice(waiting)
+    url = reverse('review:review_document', args=[document.pk])
+    session.get('review_form', url)
+    version = Document.objects.values_list('version', flat=True).get(pk=document.pk)
+    session.post('review_submit', url, {
+        'status': 'approved' if rng.random() < 0.7 else 'rejected',
+        'comments': words(rng, 8),
+        'version': version,
+    }, status=302)
+
+
+def bulk_upload(session, dataset, rng, files=10):
+    """login → bulk upload of `files` files"""
+    user_id = rng.choice(dataset.users)
+    session.login(user_id)
+    session.get('bulk_upload_form', reverse('documents:bulk_upload'))
+    uploads = [
+        SimpleUploadedFile(name, content)
+        for name, content in random_files(rng, files, dataset.parameters['file_size'])
+    ]
+    # Asking for JSON: 201 when files were stored, 400 when none was
+    session.post('bulk_upload', reverse('documents:bulk_upload'), {
+        'files': uploads,
+        'category': 'report',
+        'selected_tags': ['draft'],
+    }, status=201, HTTP_ACCEPT='application/json')
+
+
+SCENARIOS = {
+    'browse': browse,
+    'review': review,
+    'bulk_upload': bulk_upload,
+}
@@ -0,0 +1,15 @@
+# benchmark/settings_sqlite.py
+"""The project settings on SQLite, for `manage.py benchmark --settings=benchmark.settings_sqlite`.
+
+The benchmark builds its own throwaway database either way; this only
+picks the engine (the default settings use the local MySQL).
+"""
+from dms_project.settings import *  # noqa: F401,F403
+from dms_project.settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'benchmark.sqlite3',
+    }
+}
@@ -0,0 +1,71 @@
+# benchmark/tests.py
+import io
+import json
+import random
+import shutil
+import tempfile
+import zipfile
+
+from django.test import TestCase, override_settings
+
+from documents.models import Document
+
+from .data import generate, make_file
+from .runner import compare, percentile, run
+from .scenarios import SCENARIOS
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+# Logging in is timed, not tested: a fast hasher keeps the suite quick
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT, ALLOWED_HOSTS=['testserver'],
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class BenchmarkTests(TestCase):
+    """A tiny benchmark end to end: the scenarios must run without failures"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_generate_and_run(self):
+        dataset = generate(users=2, documents=3, reviewers=1, reviews=1, file_size=2048, seed=1)
+        self.assertEqual(Document.objects.count(), 6)
+        self.assertEqual(sorted(len(ids) for ids in dataset.documents.values()), [3, 3])
+
+        results = run(dataset, list(SCENARIOS), iterations=2, warmup=0, seed=1)
+        json.dumps(results)  # saved as JSON
+        self.assertEqual(results['dataset']['documents_total'], 6)
+        for name, scenario in results['scenarios'].items():
+            self.assertEqual(scenario['failed_iterations'], 0, (name, scenario['failures']))
+        self.assertEqual(
+            list(results['scenarios']['browse']['steps']),
+            ['login', 'dashboard', 'search', 'search_filtered', 'detail', 'download'],
+        )
+        download = results['scenarios']['browse']['steps']['download']
+        self.assertEqual(download['count'], 2)
+        self.assertGreater(download['queries']['max'], 0)
+        self.assertEqual(results['scenarios']['bulk_upload']['steps']['bulk_upload']['errors'], 0)
+
+    def test_files_are_real(self):
+        rng = random.Random(0)
+        content, _ = make_file(rng, 'pdf', 2000)
+        self.assertTrue(content.startswith(b'%PDF-') and content.rstrip().endswith(b'%%EOF'))
+        content, _ = make_file(rng, 'docx', 2000)
+        self.assertIn('word/document.xml', zipfile.ZipFile(io.BytesIO(content)).namelist())
+
+
+class ResultsTests(TestCase):
+
+    def test_percentile(self):
+        self.assertEqual(percentile([3, 1, 2], 0.5), 2)
+        self.assertEqual(percentile([1, 2], 0.5), 1.5)
+        self.assertEqual(percentile([5], 0.99), 5)
+
+    def test_compare(self):
+        def results(p95):
+            return {'scenarios': {'browse': {'steps': {'detail': {'latency_ms': {'p95': p95}}}}}}
+        self.assertEqual(compare(results(10.0), results(12.0)), [('browse', 'detail', 10.0, 12.0, 20.0)])
+        self.assertEqual(compare({'scenarios': {}}, results(12.0)), [])
@@ -2,6 +2,8 @@
 ASGI config for dms_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Unless DJANGO_SETTINGS_MODULE says otherwise it runs with the ASGI profile,
+dms_project/settings_asgi.py (async download, upload and search views).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -11,6 +13,6 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dms_project.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dms_project.settings_asgi')
 
 application = get_asgi_application()
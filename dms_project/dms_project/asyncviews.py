@@ -0,0 +1,40 @@
+# dms_project/asyncviews.py
+"""Helpers for the async views of the ASGI profile (settings_asgi.py).
+
+Anything that may touch the database from an async view has to go through
+sync_to_async: loading the session and user, template rendering (context
+processors and templates follow relations), form saving. Django 4.2's
+login_required only wraps sync views, hence `alogin_required`.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import render, resolve_url
+
+arender = sync_to_async(render)
+
+
+async def aget_user(request):
+    """request.user, loaded (with the session) outside the event loop"""
+    def load():
+        user = request.user
+        user.is_authenticated  # evaluates the lazy object: session and user queries
+        return user
+    return await sync_to_async(load)()
+
+
+def alogin_required(view=None, login_url=None):
+    """login_required for async views"""
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            user = await aget_user(request)
+            if user.is_authenticated:
+                return await view(request, *args, **kwargs)
+            return redirect_to_login(request.get_full_path(), resolve_url(login_url or settings.LOGIN_URL))
+        return wrapper
+    if view is not None:
+        return decorator(view)
+    return decorator
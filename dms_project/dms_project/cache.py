@@ -0,0 +1,146 @@
+# dms_project/cache.py
+"""Per-user result cache invalidated by a generation counter.
+
+Every cached value for a user is stored under a key that embeds the user's
+current generation. Writes to the user's documents or reviews call
+`bump_generation` (see the signal handlers in documents/ and review/), so the
+old entries simply stop being read and age out of the cache; nothing has to
+find and delete them. Only the generation key itself never expires.
+
+Values that also show other users' documents (staff, shared documents; see
+access/policy.py) are stored with `shared=True`: their key embeds the
+shared generation as well, which every document write bumps through
+`bump_shared_generation`, however many users can see the document.
+
+The backend is the CACHES alias named by USER_CACHE_ALIAS: local memory in
+development and tests, a file or Redis cache in production (settings.py).
+"""
+import functools
+import hashlib
+import json
+import time
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.http import HttpResponse
+
+
+SHARED_SCOPE = 'shared'
+
+
+def get_cache():
+    return caches[getattr(settings, 'USER_CACHE_ALIAS', 'default')]
+
+
+def _generation_key(user_id):
+    return f'user-gen:{user_id}'
+
+
+def generation(user_id):
+    """The user's current generation, starting one if there is none"""
+    cache = get_cache()
+    key = _generation_key(user_id)
+    value = cache.get(key)
+    if value is None:
+        # Seeded from the clock rather than 0: if the key is ever evicted,
+        # entries written under the old generations must not become live again.
+        cache.add(key, time.time_ns() // 1000, timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def bump_generation(user_id):
+    """Make every cached value of a user unreachable"""
+    if user_id is None:
+        return
+    cache = get_cache()
+    try:
+        cache.incr(_generation_key(user_id))
+    except ValueError:
+        generation(user_id)
+
+
+def bump_shared_generation():
+    """Make every cached value stored with shared=True unreachable"""
+    bump_generation(SHARED_SCOPE)
+
+
+def user_key(user_id, namespace, *parts, shared=False):
+    """Cache key for (namespace, parts) in the user's current generation"""
+    digest = hashlib.md5(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    scope = f'{generation(user_id)}.{generation(SHARED_SCOPE)}' if shared else generation(user_id)
+    return f'{namespace}:{user_id}:{scope}:{digest}'
+
+
+def cached(user_id, namespace, parts, compute, timeout=None, shared=False):
+    """Return compute(), cached per user and parts until the generation moves on"""
+    cache = get_cache()
+    key = user_key(user_id, namespace, *parts, shared=shared)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout if timeout is not None else settings.USER_CACHE_TIMEOUT)
+    return value
+
+
+def cache_page_per_user(namespace, timeout=None, shared=None):
+    """Cache a view's rendered GET response per user and full path.
+
+    `shared(user)` tells whether the page shows that user other users'
+    documents, so it must also expire with the shared generation.
+
+    Responses that set cookies or carry flashed messages are never stored,
+    and a request with messages waiting is always rendered, so the messages
+    are shown once and only once. A page with a form embeds a token for the
+    browser's CSRF secret, so the secret is part of the key, and a page that
+    had to create a new secret is not stored. Async views get an async
+    wrapper.
+    """
+    def lookup(request):
+        """(key, secret, stored response or None), or None when not cacheable"""
+        if request.method != 'GET' or not request.user.is_authenticated or len(get_messages(request)):
+            return None
+        secret = request.META.get('CSRF_COOKIE')
+        key = user_key(request.user.pk, namespace, request.get_full_path(), secret,
+                       shared=shared is not None and shared(request.user))
+        stored = get_cache().get(key)
+        if stored is None:
+            return key, secret, None
+        content, content_type = stored
+        return key, secret, HttpResponse(content, content_type=content_type)
+
+    def store(request, key, secret, response):
+        if (response.status_code == 200 and not response.streaming and not response.cookies
+                and request.META.get('CSRF_COOKIE') == secret):
+            get_cache().set(key, (response.content, response['Content-Type']),
+                            timeout if timeout is not None else settings.USER_CACHE_TIMEOUT)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # The cache backends and the session block; keep them off the event loop
+                entry = await sync_to_async(lookup)(request)
+                if entry is None:
+                    return await view(request, *args, **kwargs)
+                key, secret, response = entry
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    await sync_to_async(store)(request, key, secret, response)
+                return response
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            entry = lookup(request)
+            if entry is None:
+                return view(request, *args, **kwargs)
+            key, secret, response = entry
+            if response is None:
+                response = view(request, *args, **kwargs)
+                store(request, key, secret, response)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,51 @@
+# dms_project/dates.py
+"""Calendar dates as half-open datetime ranges, for filters an index can serve.
+
+`uploaded_at__date__gte=d` compiles to DATE(CONVERT_TZ(uploaded_at, ...))
+on MySQL (and django_datetime_cast_date() on SQLite): a function of every
+row, so the database cannot range-scan an index on the column. The same
+filter written as `uploaded_at >= <local midnight of d>` can. Dates are
+read in the current timezone, the one the user sees; each bound is made
+aware on its own, so days across a DST change are 23 or 25 hours long.
+"""
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def parse_date(value):
+    """'2024-03-05' -> date(2024, 3, 5), or None"""
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def day_start(day):
+    """The first instant of a calendar day in the current timezone"""
+    start = datetime.datetime.combine(day, datetime.time.min)
+    if settings.USE_TZ:
+        start = timezone.make_aware(start, timezone.get_current_timezone())
+    return start
+
+
+def date_range(first=None, last=None):
+    """[start, end) datetimes covering the days first..last, both included.
+
+    Either bound may be None for an open end.
+    """
+    start = day_start(first) if first else None
+    end = day_start(last + datetime.timedelta(days=1)) if last else None
+    return start, end
+
+
+def date_range_filter(field, first=None, last=None):
+    """filter() keyword arguments for `field` within the days first..last"""
+    start, end = date_range(first, last)
+    lookups = {}
+    if start is not None:
+        lookups[f'{field}__gte'] = start
+    if end is not None:
+        lookups[f'{field}__lt'] = end
+    return lookups
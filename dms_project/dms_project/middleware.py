@@ -0,0 +1,81 @@
+# dms_project/middleware.py
+import logging
+import re
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger('dms_project.queries')
+
+# Literals stripped so that the same query for different rows compares equal
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+# Transaction bookkeeping, not work the view asked for
+UNCOUNTED = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class QueryBudgetMiddleware:
+    """Development guard: log any view that runs more queries than its budget.
+
+    Budgets are per URL name in QUERY_BUDGETS ('review:dashboard': 8) with
+    QUERY_BUDGET_DEFAULT for everything else. The log line names the query
+    repeated most often, which is usually the N+1 culprit. Only active when
+    DEBUG is on; the per-view budgets asserted in the test suites are the
+    hard limit.
+
+    Async-capable, so that it does not force the async views of the ASGI
+    profile back into a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.default_budget = getattr(settings, 'QUERY_BUDGET_DEFAULT', 20)
+        self.budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get_response(request)
+        self.check(request, ctx.captured_queries)
+        return response
+
+    async def __acall__(self, request):
+        # Connections are per thread: capture in the thread that runs the
+        # request's ORM calls (sync_to_async is thread-sensitive by default)
+        ctx = CaptureQueriesContext(connection)
+        await sync_to_async(ctx.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            captured_queries = await sync_to_async(self._leave)(ctx)
+        self.check(request, captured_queries)
+        return response
+
+    @staticmethod
+    def _leave(ctx):
+        ctx.__exit__(None, None, None)
+        return ctx.captured_queries
+
+    def check(self, request, captured_queries):
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        budget = self.budgets.get(view_name, self.default_budget)
+        queries = [q['sql'] for q in captured_queries if not q['sql'].startswith(UNCOUNTED)]
+        count = len(queries)
+        if count > budget:
+            shapes = Counter(LITERALS.sub('?', sql) for sql in queries)
+            sql, repeats = shapes.most_common(1)[0]
+            logger.warning(
+                '%s %s ran %d queries (budget %d); most repeated (%dx): %s',
+                request.method, view_name, count, budget, repeats, sql[:300],
+            )
@@ -44,22 +44,30 @@ INSTALLED_APPS = [
     'search',
     'review',
     'access',
+    'jobs',
+    'benchmark',
+    'metrics',
 ]
 
 MIDDLEWARE = [
+    'metrics.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'access.middleware.PermissionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'dms_project.middleware.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'dms_project.urls'
 
 TEMPLATES = [
-    { 'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    {   # The Django backend, timing renders for the request metrics
+        'BACKEND': 'metrics.instrumentation.DjangoTemplates',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],  
         'APP_DIRS': True,
         'OPTIONS': {
@@ -94,6 +102,99 @@ DATABASES = {
     }
 }
 
+# Cache backend, chosen by DMS_CACHE_URL: unset for local memory (tests,
+# runserver), file:///var/tmp/dms_cache for a cache shared by the processes
+# of one host, redis://host:6379/0 for a shared Redis (needs the redis
+# package). Per-user pages and counts are cached through dms_project/cache.py
+# for USER_CACHE_TIMEOUT seconds at most; writes expire them early.
+CACHE_URL = os.environ.get('DMS_CACHE_URL', '')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+        'KEY_PREFIX': 'dms',
+    }}
+elif CACHE_URL.startswith('file://'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_URL[len('file://'):],
+        'KEY_PREFIX': 'dms',
+    }}
+else:
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dms',
+    }}
+USER_CACHE_ALIAS = 'default'
+USER_CACHE_TIMEOUT = 300
+
+# Full-text search backend for R-3.1 (see search/backends.py). None picks one
+# from the database vendor: MySQL FULLTEXT, or the portable inverted index.
+# `migrate` creates the FULLTEXT indexes; `manage.py rebuild_search_index`
+# rebuilds either index after a restore or a change of backend.
+SEARCH_BACKEND = None
+
+# Seconds a user's facet counts (search/facets.py) stay cached. Writes to the
+# user's documents expire them early; this only bounds staleness after bulk
+# updates that bypass the model signals.
+SEARCH_FACET_CACHE_TIMEOUT = 300
+
+# Text extraction from uploaded files (search/extraction.py), run as
+# background jobs. MAX_TEXT_CHARS bounds memory per job.
+CONTENT_EXTRACTION = {
+    'CHUNK_SIZE': 64 * 1024,
+    'MAX_TEXT_CHARS': 1_000_000,
+}
+
+# Document previews (documents/previews.py), rendered by background jobs.
+# SIZE bounds the thumbnail in pixels, SNIPPET_CHARS the text shown for
+# TXT/DOCX/XLSX (and PDFs without poppler).
+DOCUMENT_PREVIEWS = {
+    'SIZE': (320, 320),
+    'SNIPPET_CHARS': 1500,
+}
+# Version history of replaced files (documents/versions.py). Versions of
+# TEXT_FORMATS files are stored as deltas against the version before when the
+# delta is at most MAX_DELTA_RATIO of the file, and at most MAX_CHAIN deltas
+# from a full copy (the cost of rebuilding one). Rebuilt files spill from
+# memory to disk past SPOOL_SIZE bytes.
+DOCUMENT_VERSIONS = {
+    'TEXT_FORMATS': ('txt',),
+    'MAX_DELTA_RATIO': 0.5,
+    'MAX_CHAIN': 10,
+    'SPOOL_SIZE': 1024 * 1024,
+}
+# Preview URLs change with their content, so browsers may keep them a year
+PREVIEW_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Background jobs (jobs app), run by `manage.py run_workers`. POOL is
+# 'process' for CPU-bound work like previews, or 'thread'. Failed jobs are
+# retried MAX_ATTEMPTS times, waiting BACKOFF_BASE * 2**n seconds (capped at
+# BACKOFF_MAX); a job running longer than LEASE seconds is taken to belong
+# to a dead worker and is run again.
+JOBS = {
+    'POOL': 'process',
+    'WORKERS': 4,
+    'POLL_INTERVAL': 2,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 10,
+    'BACKOFF_MAX': 60 * 60,
+    'LEASE': 10 * 60,
+    'KEEP_DONE_DAYS': 7,
+}
+
+# Request metrics (metrics app), kept in memory by each server process:
+# every request is counted per URL name, SAMPLE_RATE of them are measured
+# (time, queries, template time, response size) into histograms, and the
+# last BUFFER measured ones are kept. Staff see them at /metrics/; a
+# Prometheus scraper reads /metrics/prometheus/ with the header
+# "Authorization: Bearer <TOKEN>" (no token: staff sessions only).
+METRICS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.1,
+    'BUFFER': 1000,
+    'TOKEN': os.environ.get('DMS_METRICS_TOKEN', ''),
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -138,6 +239,94 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Where document files, blobs and previews live (dms_project/storage), chosen
+# by DMS_STORAGE: unset for MEDIA_ROOT on local disk, 's3' for an
+# S3-compatible object store shared by all web nodes, 'tiered' for the object
+# store with recently used files kept on the node's local disk (HOT_STORAGE).
+# `manage.py object_store` runs a local stand-in for development.
+STORAGE_BACKEND = os.environ.get('DMS_STORAGE', '')
+STORAGES = {
+    'default': {'BACKEND': {
+        's3': 'dms_project.storage.s3.S3Storage',
+        'tiered': 'dms_project.storage.tiered.TieredStorage',
+    }.get(STORAGE_BACKEND, 'django.core.files.storage.FileSystemStorage')},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+# Connections are pooled per process (POOL_SIZE kept alive); files above
+# MULTIPART_THRESHOLD are uploaded in PART_SIZE parts; presigned download
+# URLs (DOWNLOAD_OFFLOAD = 'presigned') are valid for URL_EXPIRES seconds.
+OBJECT_STORAGE = {
+    'ENDPOINT_URL': os.environ.get('DMS_S3_ENDPOINT_URL', 'http://127.0.0.1:9000'),
+    'BUCKET': os.environ.get('DMS_S3_BUCKET', 'dms'),
+    'REGION': os.environ.get('DMS_S3_REGION', 'us-east-1'),
+    'ACCESS_KEY': os.environ.get('DMS_S3_ACCESS_KEY', 'dms'),
+    'SECRET_KEY': os.environ.get('DMS_S3_SECRET_KEY', 'dms-development-secret'),
+    'POOL_SIZE': 10,
+    'TIMEOUT': 30,
+    'MULTIPART_THRESHOLD': 16 * 1024 * 1024,
+    'PART_SIZE': 8 * 1024 * 1024,
+    'URL_EXPIRES': 300,
+}
+# The local tier of 'tiered': trimmed to MAX_BYTES by `manage.py evict_hot_files`
+HOT_STORAGE = {
+    'LOCATION': os.environ.get('DMS_HOT_STORAGE', str(MEDIA_ROOT / 'hot')),
+    'MAX_BYTES': 20 * 1024 ** 3,
+}
+
+# File downloads (documents/downloads.py). DOWNLOAD_OFFLOAD hands the file I/O
+# to the web server: None (Django streams it), 'x-sendfile' (Apache/lighttpd)
+# or 'x-accel-redirect' (nginx, with an internal location at the prefix below),
+# or 'presigned' (a redirect to the object store; streamed on local disk).
+DOWNLOAD_OFFLOAD = None
+DOWNLOAD_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Async download, upload and search views (documents/urls.py, search/urls.py).
+# Only worth it under an ASGI server: settings_asgi.py turns it on.
+ASYNC_VIEWS = False
+
+# Uploads (documents/validators.py, documents/uploads.py). Single-request form
+# uploads stay small; larger files go through the chunked upload API.
+DOCUMENT_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024
+CHUNKED_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Bulk upload and `manage.py import_documents` (documents/bulk.py): files are
+# written to the blob store by WORKERS threads and inserted BATCH_SIZE rows
+# per transaction. One bulk upload request may carry up to this many files.
+BULK_UPLOAD = {
+    'WORKERS': 4,
+    'BATCH_SIZE': 100,
+}
+DATA_UPLOAD_MAX_NUMBER_FILES = 500
+
+# Query budget guard (dms_project/middleware.py, DEBUG only): views running
+# more queries than this are logged to the 'dms_project.queries' logger.
+# Cold-cache counts; the view test suites (dms_project/testing.py) fail
+# when a view goes over its entry here, so keep the two in step.
+QUERY_BUDGET_DEFAULT = 20
+QUERY_BUDGETS = {
+    'documents:my_documents': 3,
+    # Views fetching a document read the user's grants (access/policy.py)
+    'documents:detail': 6,
+    'documents:upload': 23,
+    'documents:delete': 25,
+    # Set-based: constant whatever the number of files or selected documents
+    'documents:bulk_upload': 26,
+    'documents:bulk_action': 34,
+    'search:search': 7,
+    'review:dashboard': 7,
+    'review:review_document': 23,
+    'review:batch_review': 24,
+    'review:resubmit': 23,
+    'review:history': 5,
+    'access:user_list': 3,
+}
+
+# Users are loaded with their profile in one query, so access checks read the
+# role without another (access/backends.py, access/permissions.py)
+AUTHENTICATION_BACKENDS = ['access.backends.ProfileBackend']
+
 LOGIN_URL = '/accounts/login/'  
 LOGIN_REDIRECT_URL = '/accounts/dashboard'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
@@ -0,0 +1,24 @@
+# dms_project/settings_asgi.py
+"""ASGI deployment profile (dms_project/asgi.py loads it by default).
+
+    uvicorn dms_project.asgi:application --workers 2 --host 0.0.0.0 --port 8000
+
+Downloads, form uploads and search are served by their async views
+(ASYNC_VIEWS), so a slow client holds a coroutine instead of a thread and
+one process can keep many more downloads going. Everything else runs as
+usual in Django's thread pool.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+ASYNC_VIEWS = True
+
+# Every chunk of an async download is one trip to the thread pool; larger
+# chunks trade a little memory per download for fewer trips.
+DOWNLOAD_CHUNK_SIZE = 128 * 1024
+
+# Persistent connections belong to threads, and under ASGI every request
+# gets its own: they would pile up unused. Use a pooler (ProxySQL, RDS
+# Proxy) in front of MySQL if connection setup shows in the latency.
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = 0
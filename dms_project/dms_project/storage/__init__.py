@@ -0,0 +1,48 @@
+# dms_project/storage/__init__.py
+"""Where files live: STORAGES['default'] in settings.
+
+* django.core.files.storage.FileSystemStorage: MEDIA_ROOT on local disk.
+* dms_project.storage.s3.S3Storage: an S3-compatible object store shared
+  by every web node.
+* dms_project.storage.tiered.TieredStorage: the object store, with recently
+  used files kept on the node's local disk.
+
+Code that stores or reads document files goes through the storage API.
+Local paths are an optimization, not an assumption: `local_path` only
+answers for plain local disk, where a finished file can simply be renamed
+into place, and `local_copy` hands out a path for tools that need one
+(preview rendering), downloading the file first when it is remote.
+"""
+import contextlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def local_path(storage, name):
+    """The path of `name` when the storage is plain local disk, else None"""
+    if isinstance(storage, FileSystemStorage):
+        return storage.path(name)
+    return None
+
+
+@contextlib.contextmanager
+def local_copy(storage, name):
+    """A local path holding the file's content for the duration of the block"""
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        path = None
+    if path is not None:
+        yield path
+        return
+    suffix = os.path.splitext(name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as copy:
+        with storage.open(name, 'rb') as source:
+            shutil.copyfileobj(source, copy, COPY_CHUNK_SIZE)
+        copy.flush()
+        yield copy.name
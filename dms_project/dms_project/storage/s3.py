@@ -0,0 +1,491 @@
+# dms_project/storage/s3.py
+"""Storage on any S3-compatible object store (AWS S3, MinIO, Ceph, or
+dms_project/storage/server.py in tests), with the standard library only.
+
+Requests are signed with AWS Signature V4 and sent over keep-alive
+connections from a per-storage pool, so a busy worker reuses a handful of
+TCP (and TLS) connections instead of opening one per file operation. Files
+larger than MULTIPART_THRESHOLD are uploaded as a multipart upload, one
+PART_SIZE part in memory at a time. Reads are ranged GETs that stream from
+the socket; `url()` returns a presigned GET URL that lets the browser
+download straight from the store.
+
+Configuration comes from OBJECT_STORAGE in settings, overridable per
+storage with OPTIONS in STORAGES.
+"""
+import datetime
+import hashlib
+import hmac
+import http.client
+import io
+import queue
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import Storage
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from django.utils.http import content_disposition_header
+
+DEFAULTS = {
+    'ENDPOINT_URL': 'http://127.0.0.1:9000',
+    'BUCKET': 'dms',
+    'REGION': 'us-east-1',
+    'ACCESS_KEY': '',
+    'SECRET_KEY': '',
+    'POOL_SIZE': 10,
+    'TIMEOUT': 30,
+    'MULTIPART_THRESHOLD': 16 * 1024 * 1024,
+    'PART_SIZE': 8 * 1024 * 1024,
+    'URL_EXPIRES': 300,
+}
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+# Connections dropped by the server while idle in the pool show up as these
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+def object_storage_setting(name):
+    return getattr(settings, 'OBJECT_STORAGE', {}).get(name, DEFAULTS[name])
+
+
+class S3Error(Exception):
+    """An error response from the object store"""
+
+    def __init__(self, status, code='', message=''):
+        super().__init__(f'{status} {code}: {message}'.strip(': '))
+        self.status = status
+        self.code = code
+
+
+# --- Signature V4 --------------------------------------------------------------
+
+def _quote(value, safe='-_.~'):
+    return quote(value, safe=safe)
+
+
+def canonical_query(params):
+    return '&'.join(f'{_quote(k)}={_quote(v)}' for k, v in sorted((str(k), str(v)) for k, v in params.items()))
+
+
+def _signing_key(secret_key, day, region):
+    key = f'AWS4{secret_key}'.encode()
+    for part in (day, region, 's3', 'aws4_request'):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    return key
+
+
+def signature(secret_key, region, method, path, params, headers, signed_headers, payload_hash, amz_date):
+    """Hex SigV4 signature of a request; `headers` maps lower-case names to values"""
+    canonical_request = '\n'.join([
+        method,
+        _quote(path, safe='/-_.~'),
+        canonical_query(params),
+        ''.join(f'{name}:{str(headers[name]).strip()}\n' for name in signed_headers),
+        ';'.join(signed_headers),
+        payload_hash,
+    ])
+    scope = f'{amz_date[:8]}/{region}/s3/aws4_request'
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256', amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest(),
+    ])
+    key = _signing_key(secret_key, amz_date[:8], region)
+    return hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+
+def _amz_date(now=None):
+    return (now or datetime.datetime.now(datetime.timezone.utc)).strftime('%Y%m%dT%H%M%SZ')
+
+
+# --- Connections ---------------------------------------------------------------
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to one endpoint, shared between threads.
+
+    Idle connections wait in a LIFO queue, so the warmest one is reused
+    first; at most `maxsize` are kept, any extra are closed when released.
+    """
+
+    def __init__(self, endpoint_url, maxsize=10, timeout=30):
+        parts = urlsplit(endpoint_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.netloc = parts.netloc
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self.created = 0
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        self.created += 1
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def acquire(self):
+        """(connection, reused)"""
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def release(self, connection):
+        if self._idle.qsize() < self.maxsize:
+            self._idle.put(connection)
+        else:
+            connection.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class PooledResponse(io.RawIOBase):
+    """A response body read from the socket; the connection goes back to the
+    pool once the body is read to the end, and is closed if abandoned"""
+
+    def __init__(self, pool, connection, response):
+        self._pool = pool
+        self._connection = connection
+        self.response = response
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._connection is None:
+            return 0
+        count = self.response.readinto(buffer)
+        if count == 0 or self.response.isclosed():
+            self._finish(reuse=True)
+        return count
+
+    def _finish(self, reuse):
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        if reuse and self.response.isclosed() and not self.response.will_close:
+            self._pool.release(connection)
+        else:
+            connection.close()
+
+    def close(self):
+        self._finish(reuse=False)
+        super().close()
+
+
+# --- Client --------------------------------------------------------------------
+
+class S3Client:
+    """The handful of S3 calls the storage needs, on pooled connections"""
+
+    def __init__(self, endpoint_url, bucket, region, access_key, secret_key, pool_size=10, timeout=30):
+        self.endpoint_url = endpoint_url.rstrip('/')
+        self.bucket = bucket
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.pool = ConnectionPool(self.endpoint_url, pool_size, timeout)
+
+    def object_path(self, key=''):
+        return f'/{self.bucket}/{key}' if key else f'/{self.bucket}'
+
+    def _headers(self, method, path, params, headers):
+        amz_date = _amz_date()
+        headers = {name.lower(): value for name, value in headers.items()}
+        headers.update({'host': self.pool.netloc, 'x-amz-date': amz_date, 'x-amz-content-sha256': UNSIGNED_PAYLOAD})
+        signed = sorted(headers)
+        sig = signature(self.secret_key, self.region, method, path, params, headers, signed,
+                        UNSIGNED_PAYLOAD, amz_date)
+        headers['authorization'] = (
+            f'AWS4-HMAC-SHA256 Credential={self.access_key}/{amz_date[:8]}/{self.region}/s3/aws4_request, '
+            f'SignedHeaders={";".join(signed)}, Signature={sig}'
+        )
+        return headers
+
+    def request(self, method, key='', params=None, headers=None, body=None, stream=False, ok=(200,)):
+        """Send a signed request; returns (response, body bytes), or (response,
+        PooledResponse) with stream=True. Raises S3Error unless the status is in `ok`."""
+        params = params or {}
+        path = self.object_path(key)
+        url = _quote(path, safe='/-_.~') + (f'?{canonical_query(params)}' if params else '')
+        if body is None and method in ('PUT', 'POST'):
+            body = b''
+        start = body.tell() if hasattr(body, 'tell') else None
+        replayable = body is None or isinstance(body, bytes) or start is not None
+        for attempt in (1, 2):
+            connection, reused = self.pool.acquire()
+            try:
+                connection.request(method, url, body=body, headers=self._headers(method, path, params, headers or {}))
+                response = connection.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                connection.close()
+                # Only a kept-alive connection may have gone stale; retry once on a new one
+                if not (reused and replayable) or attempt == 2:
+                    raise
+                if start is not None:
+                    body.seek(start)
+                continue
+            except BaseException:
+                connection.close()
+                raise
+            break
+        if response.status not in ok:
+            data = response.read()
+            self._done(connection, response)
+            raise S3Error(response.status, *_error_details(data))
+        if stream:
+            return response, PooledResponse(self.pool, connection, response)
+        data = response.read()
+        self._done(connection, response)
+        return response, data
+
+    def _done(self, connection, response):
+        if response.will_close:
+            connection.close()
+        else:
+            self.pool.release(connection)
+
+    def presigned_url(self, method, key, expires, params=None):
+        """A URL anyone can use for `method` on `key` until it expires"""
+        amz_date = _amz_date()
+        path = self.object_path(key)
+        query = dict(params or {})
+        query.update({
+            'X-Amz-Algorithm': 'AWS4-HMAC-SHA256',
+            'X-Amz-Credential': f'{self.access_key}/{amz_date[:8]}/{self.region}/s3/aws4_request',
+            'X-Amz-Date': amz_date,
+            'X-Amz-Expires': str(int(expires)),
+            'X-Amz-SignedHeaders': 'host',
+        })
+        sig = signature(self.secret_key, self.region, method, path, query, {'host': self.pool.netloc},
+                        ['host'], UNSIGNED_PAYLOAD, amz_date)
+        query['X-Amz-Signature'] = sig
+        return f'{self.endpoint_url}{_quote(path, safe="/-_.~")}?{canonical_query(query)}'
+
+    # Multipart upload
+    def create_multipart_upload(self, key):
+        _, data = self.request('POST', key, {'uploads': ''})
+        return _find(ElementTree.fromstring(data), 'UploadId')
+
+    def upload_part(self, key, upload_id, number, data):
+        response, _ = self.request('PUT', key, {'partNumber': number, 'uploadId': upload_id}, body=data,
+                                   headers={'Content-Length': str(len(data))})
+        return response.getheader('ETag')
+
+    def complete_multipart_upload(self, key, upload_id, etags):
+        parts = ''.join(
+            f'<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>'
+            for number, etag in enumerate(etags, start=1)
+        )
+        body = f'<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>'.encode()
+        _, data = self.request('POST', key, {'uploadId': upload_id}, body=body)
+        root = ElementTree.fromstring(data)
+        if _local_name(root.tag) == 'Error':
+            # S3 may report a failed completion inside a 200 response
+            raise S3Error(200, _find(root, 'Code'), _find(root, 'Message'))
+
+    def abort_multipart_upload(self, key, upload_id):
+        self.request('DELETE', key, {'uploadId': upload_id}, ok=(200, 204, 404))
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _find(root, name):
+    for element in root.iter():
+        if _local_name(element.tag) == name:
+            return element.text or ''
+    return ''
+
+
+def _error_details(data):
+    try:
+        root = ElementTree.fromstring(data)
+    except ElementTree.ParseError:
+        return '', data[:200].decode(errors='replace')
+    return _find(root, 'Code'), _find(root, 'Message')
+
+
+# --- Files and storage ---------------------------------------------------------
+
+class ObjectReader(io.RawIOBase):
+    """Seekable reads of one object: a ranged GET from the current position,
+    read as a stream until the next seek"""
+
+    def __init__(self, client, key, size):
+        self._client = client
+        self._key = key
+        self._size = size
+        self._position = 0
+        self._body = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        position = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence] + offset
+        if position != self._position:
+            self._drop()
+            self._position = max(position, 0)
+        return self._position
+
+    def readinto(self, buffer):
+        if self._position >= self._size or not len(buffer):
+            return 0
+        if self._body is None:
+            _, self._body = self._client.request(
+                'GET', self._key, headers={'Range': f'bytes={self._position}-'}, stream=True, ok=(200, 206),
+            )
+        count = self._body.readinto(buffer)
+        self._position += count
+        return count
+
+    def _drop(self):
+        if self._body is not None:
+            self._body.close()
+            self._body = None
+
+    def close(self):
+        self._drop()
+        super().close()
+
+
+class S3File(File):
+    def __init__(self, reader, name, size):
+        super().__init__(io.BufferedReader(reader, buffer_size=64 * 1024), name)
+        self._size = size
+
+    @property
+    def size(self):
+        return self._size
+
+
+@deconstructible(path='dms_project.storage.s3.S3Storage')
+class S3Storage(Storage):
+    """Django storage on an S3-compatible bucket; names are object keys.
+
+    Saving a name that exists replaces the object (content-addressed blobs
+    and previews are the same bytes under the same name anyway).
+    """
+    # url() is a presigned link the browser can download from (documents/downloads.py)
+    presigned_urls = True
+
+    def __init__(self, **options):
+        self.options = {name: options.get(name.lower(), object_storage_setting(name)) for name in DEFAULTS}
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    o = self.options
+                    self._client = S3Client(o['ENDPOINT_URL'], o['BUCKET'], o['REGION'], o['ACCESS_KEY'],
+                                            o['SECRET_KEY'], o['POOL_SIZE'], o['TIMEOUT'])
+        return self._client
+
+    def _head(self, name):
+        """Response headers of the object, or None if there is none"""
+        try:
+            response, _ = self.client.request('HEAD', name)
+        except S3Error as exc:
+            if exc.status == 404:
+                return None
+            raise
+        return response
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode or '+' in mode:
+            raise ValueError('S3Storage files are read-only; save() a new version instead')
+        head = self._head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        size = int(head.getheader('Content-Length'))
+        return S3File(ObjectReader(self.client, name, size), name, size)
+
+    def _save(self, name, content):
+        size = content.size
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        if size > self.options['MULTIPART_THRESHOLD']:
+            self._save_multipart(name, content)
+        else:
+            # http.client streams a file body in blocks
+            self.client.request('PUT', name, body=content, headers={'Content-Length': str(size)})
+        return name
+
+    def _save_multipart(self, name, content):
+        upload_id = self.client.create_multipart_upload(name)
+        try:
+            etags = []
+            while True:
+                data = content.read(self.options['PART_SIZE'])
+                if not data:
+                    break
+                etags.append(self.client.upload_part(name, upload_id, len(etags) + 1, data))
+            self.client.complete_multipart_upload(name, upload_id, etags)
+        except BaseException:
+            self.client.abort_multipart_upload(name, upload_id)
+            raise
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def delete(self, name):
+        self.client.request('DELETE', name, ok=(200, 204, 404))
+
+    def exists(self, name):
+        return self._head(name) is not None
+
+    def size(self, name):
+        head = self._head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return int(head.getheader('Content-Length'))
+
+    def get_modified_time(self, name):
+        head = self._head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        modified = parsedate_to_datetime(head.getheader('Last-Modified'))
+        return modified if settings.USE_TZ else timezone.make_naive(modified)
+
+    def listdir(self, path):
+        prefix = f'{path.strip("/")}/' if path.strip('/') else ''
+        directories, files = [], []
+        params = {'list-type': '2', 'prefix': prefix, 'delimiter': '/'}
+        while True:
+            _, data = self.client.request('GET', params=params)
+            root = ElementTree.fromstring(data)
+            for element in root:
+                tag = _local_name(element.tag)
+                if tag == 'Contents':
+                    files.append(_find(element, 'Key')[len(prefix):])
+                elif tag == 'CommonPrefixes':
+                    directories.append(_find(element, 'Prefix')[len(prefix):].rstrip('/'))
+            token = _find(root, 'NextContinuationToken')
+            if _find(root, 'IsTruncated') != 'true' or not token:
+                return directories, files
+            params['continuation-token'] = token
+
+    def url(self, name, expire=None, filename=None):
+        """Presigned GET URL; with `filename` the browser saves it as an attachment"""
+        params = {}
+        if filename:
+            params['response-content-disposition'] = content_disposition_header(True, filename)
+        return self.client.presigned_url('GET', name, expire or self.options['URL_EXPIRES'], params)
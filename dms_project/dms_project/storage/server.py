@@ -0,0 +1,338 @@
+# dms_project/storage/server.py
+"""A local stand-in for an S3-compatible object store, for tests and development.
+
+Buckets are directories under `root` and objects are files. It speaks the
+subset of the S3 REST API that S3Storage uses (path-style addressing):
+PUT/GET/HEAD/DELETE on objects with byte ranges, ListObjectsV2 and
+multipart uploads. Every request must carry a valid Signature V4, in the
+Authorization header or as a presigned URL that has not expired, so
+signing bugs fail here as they would against the real thing. Connections
+are kept alive, and `connections` counts them, so pooling can be tested.
+
+    python manage.py object_store --root /tmp/objects --port 9000
+"""
+import datetime
+import hmac
+import os
+import re
+import shutil
+import threading
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from .s3 import signature
+
+COPY_CHUNK_SIZE = 64 * 1024
+AUTH_RE = re.compile(r'AWS4-HMAC-SHA256 Credential=([^/]+)/(\d{8})/([^/]+)/s3/aws4_request, '
+                     r'SignedHeaders=([^,]+), Signature=([0-9a-f]+)')
+RANGE_RE = re.compile(r'^bytes=(\d+)-(\d*)$')
+
+
+class ObjectStoreServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, root, access_key, secret_key, region='us-east-1'):
+        super().__init__(address, ObjectStoreHandler)
+        self.root = root
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.connections = 0
+        self._count_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._count_lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    @property
+    def endpoint_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+class ObjectStoreHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- plumbing ----------------------------------------------------------
+
+    def _send(self, status, body=b'', headers=None, content_type='application/xml'):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body or status not in (204, 304):
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _error(self, status, code, message=''):
+        body = (f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code>'
+                f'<Message>{escape(message)}</Message></Error>').encode()
+        # A request body we did not read would corrupt the next request on this connection
+        self._discard_body()
+        self._send(status, body)
+
+    def _discard_body(self):
+        remaining = int(self.headers.get('Content-Length') or 0) - getattr(self, '_body_read', 0)
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, COPY_CHUNK_SIZE))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+        self._body_read = int(self.headers.get('Content-Length') or 0)
+
+    def _body_to(self, target):
+        remaining = int(self.headers.get('Content-Length') or 0)
+        while remaining:
+            chunk = self.rfile.read(min(remaining, COPY_CHUNK_SIZE))
+            if not chunk:
+                raise ConnectionError('request body ended early')
+            target.write(chunk)
+            remaining -= len(chunk)
+        self._body_read = int(self.headers.get('Content-Length') or 0)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self._body_read = length
+        return self.rfile.read(length)
+
+    def _parse(self):
+        parts = urlsplit(self.path)
+        self.raw_path = parts.path
+        self.params = dict(parse_qsl(parts.query, keep_blank_values=True))
+        path = unquote(parts.path).lstrip('/')
+        self.bucket, _, self.key = path.partition('/')
+
+    def _authorized(self):
+        server = self.server
+        if 'X-Amz-Signature' in self.params:
+            params = dict(self.params)
+            given = params.pop('X-Amz-Signature')
+            amz_date = params.get('X-Amz-Date', '')
+            try:
+                signed_at = datetime.datetime.strptime(amz_date, '%Y%m%dT%H%M%SZ').replace(tzinfo=datetime.timezone.utc)
+                expires = int(params.get('X-Amz-Expires', '0'))
+            except ValueError:
+                return False
+            if datetime.datetime.now(datetime.timezone.utc) > signed_at + datetime.timedelta(seconds=expires):
+                return False
+            if not params.get('X-Amz-Credential', '').startswith(f'{server.access_key}/'):
+                return False
+            signed = params.get('X-Amz-SignedHeaders', 'host').split(';')
+            headers = {name: self.headers.get(name, '') for name in signed}
+            expected = signature(server.secret_key, server.region, self.command, unquote(self.raw_path),
+                                 params, headers, signed, 'UNSIGNED-PAYLOAD', amz_date)
+            return hmac.compare_digest(given, expected)
+
+        match = AUTH_RE.match(self.headers.get('Authorization', ''))
+        if not match or match.group(1) != server.access_key:
+            return False
+        signed = match.group(4).split(';')
+        headers = {name: self.headers.get(name, '') for name in signed}
+        expected = signature(server.secret_key, server.region, self.command, unquote(self.raw_path),
+                             self.params, headers, signed, self.headers.get('x-amz-content-sha256', ''),
+                             self.headers.get('x-amz-date', ''))
+        return hmac.compare_digest(match.group(5), expected)
+
+    def _object_path(self, bucket=None, key=None):
+        root = os.path.realpath(self.server.root)
+        path = os.path.realpath(os.path.join(root, bucket or self.bucket, key if key is not None else self.key))
+        if not path.startswith(root + os.sep):
+            raise PermissionError(path)
+        return path
+
+    def _uploads_path(self, upload_id=''):
+        if upload_id and not re.fullmatch(r'[0-9a-f]{32}', upload_id):
+            raise PermissionError(upload_id)
+        return os.path.join(self.server.root, '.uploads', upload_id)
+
+    def _dispatch(self):
+        self._body_read = 0
+        self._parse()
+        if not self._authorized():
+            return self._error(403, 'SignatureDoesNotMatch', 'The request signature does not match')
+        if not self.bucket:
+            return self._error(400, 'InvalidBucketName')
+        handler = getattr(self, f'_{self.command.lower()}_{"object" if self.key else "bucket"}', None)
+        if handler is None:
+            return self._error(405, 'MethodNotAllowed')
+        try:
+            handler()
+        except PermissionError:
+            self._error(403, 'AccessDenied')
+        except FileNotFoundError:
+            self._error(404, 'NoSuchKey' if self.key else 'NoSuchBucket')
+
+    do_GET = do_HEAD = do_PUT = do_POST = do_DELETE = _dispatch
+
+    # --- buckets -----------------------------------------------------------
+
+    def _put_bucket(self):
+        os.makedirs(self._object_path(key=''), exist_ok=True)
+        self._send(200)
+
+    def _get_bucket(self):
+        bucket_root = self._object_path(key='')
+        prefix = self.params.get('prefix', '')
+        delimiter = self.params.get('delimiter', '')
+        keys = []
+        for directory, _, names in os.walk(bucket_root):
+            for filename in names:
+                key = os.path.relpath(os.path.join(directory, filename), bucket_root).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    keys.append(key)
+        contents, prefixes = [], set()
+        for key in sorted(keys):
+            rest = key[len(prefix):]
+            if delimiter and delimiter in rest:
+                prefixes.add(prefix + rest.split(delimiter, 1)[0] + delimiter)
+            else:
+                size = os.path.getsize(os.path.join(bucket_root, key))
+                contents.append(f'<Contents><Key>{escape(key)}</Key><Size>{size}</Size></Contents>')
+        common = ''.join(f'<CommonPrefixes><Prefix>{escape(p)}</Prefix></CommonPrefixes>' for p in sorted(prefixes))
+        body = (f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult><Name>{escape(self.bucket)}</Name>'
+                f'<Prefix>{escape(prefix)}</Prefix><KeyCount>{len(contents)}</KeyCount>'
+                f'<IsTruncated>false</IsTruncated>{"".join(contents)}{common}</ListBucketResult>')
+        self._send(200, body.encode())
+
+    # --- objects -----------------------------------------------------------
+
+    def _write(self, path, fill):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{os.path.join(self.server.root, ".tmp")}/{uuid.uuid4().hex}'
+        os.makedirs(os.path.dirname(tmp), exist_ok=True)
+        try:
+            with open(tmp, 'wb') as target:
+                fill(target)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _put_object(self):
+        if 'uploadId' in self.params:
+            return self._upload_part()
+        path = self._object_path()
+        if not os.path.isdir(self._object_path(key='')):
+            raise FileNotFoundError
+        self._write(path, self._body_to)
+        self._send(200, headers={'ETag': f'"{uuid.uuid4().hex}"'})
+
+    def _object_headers(self, path):
+        stat = os.stat(path)
+        return stat.st_size, {
+            'Last-Modified': formatdate(stat.st_mtime, usegmt=True),
+            'ETag': f'"{int(stat.st_mtime_ns):x}-{stat.st_size:x}"',
+            'Accept-Ranges': 'bytes',
+        }
+
+    def _head_object(self):
+        path = self._object_path()
+        if not os.path.isfile(path):
+            raise FileNotFoundError
+        size, headers = self._object_headers(path)
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+
+    def _get_object(self):
+        path = self._object_path()
+        if not os.path.isfile(path):
+            raise FileNotFoundError
+        size, headers = self._object_headers(path)
+        start, end, status = 0, size - 1, 200
+        match = RANGE_RE.match(self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            if start >= size:
+                return self._error(416, 'InvalidRange')
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        disposition = self.params.get('response-content-disposition')
+        if disposition:
+            headers['Content-Disposition'] = disposition
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(max(end - start + 1, 0)))
+        self.end_headers()
+        with open(path, 'rb') as source:
+            source.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = source.read(min(remaining, COPY_CHUNK_SIZE))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def _delete_object(self):
+        if 'uploadId' in self.params:
+            shutil.rmtree(self._uploads_path(self.params['uploadId']), ignore_errors=True)
+            return self._send(204)
+        path = self._object_path()
+        if os.path.isfile(path):
+            os.remove(path)
+        self._send(204)
+
+    def _post_object(self):
+        if 'uploads' in self.params:
+            upload_id = uuid.uuid4().hex
+            os.makedirs(self._uploads_path(upload_id))
+            body = (f'<?xml version="1.0" encoding="UTF-8"?><InitiateMultipartUploadResult>'
+                    f'<Bucket>{escape(self.bucket)}</Bucket><Key>{escape(self.key)}</Key>'
+                    f'<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>')
+            return self._send(200, body.encode())
+        if 'uploadId' in self.params:
+            return self._complete_upload()
+        self._error(400, 'InvalidRequest')
+
+    def _upload_part(self):
+        directory = self._uploads_path(self.params['uploadId'])
+        if not os.path.isdir(directory):
+            return self._error(404, 'NoSuchUpload')
+        number = int(self.params['partNumber'])
+        self._write(os.path.join(directory, f'{number:05d}'), self._body_to)
+        self._send(200, headers={'ETag': f'"part-{number}"'})
+
+    def _complete_upload(self):
+        directory = self._uploads_path(self.params['uploadId'])
+        if not os.path.isdir(directory):
+            return self._error(404, 'NoSuchUpload')
+        root = ElementTree.fromstring(self._read_body())
+        numbers = [int(element.text) for element in root.iter() if element.tag.endswith('PartNumber')]
+
+        def fill(target):
+            for number in numbers:
+                with open(os.path.join(directory, f'{number:05d}'), 'rb') as part:
+                    shutil.copyfileobj(part, target, COPY_CHUNK_SIZE)
+
+        self._write(self._object_path(), fill)
+        shutil.rmtree(directory, ignore_errors=True)
+        body = (f'<?xml version="1.0" encoding="UTF-8"?><CompleteMultipartUploadResult>'
+                f'<Key>{escape(self.key)}</Key></CompleteMultipartUploadResult>')
+        self._send(200, body.encode())
+
+
+def start_server(root, access_key, secret_key, host='127.0.0.1', port=0, bucket=None):
+    """Run a server in a daemon thread; returns it (stop with .shutdown() and .server_close())"""
+    os.makedirs(root, exist_ok=True)
+    if bucket:
+        os.makedirs(os.path.join(root, bucket), exist_ok=True)
+    server = ObjectStoreServer((host, port), root, access_key, secret_key)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
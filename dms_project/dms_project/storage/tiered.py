@@ -0,0 +1,142 @@
+# dms_project/storage/tiered.py
+"""Object storage with a hot tier on the web node's local disk (SSD).
+
+The object store is the source of truth: every save goes there, so any
+node can serve any file. Each node also keeps the files it recently wrote
+or read under HOT_STORAGE['LOCATION']: reads are served from there when
+the file is hot, and otherwise fetch it once from the object store into
+the hot tier (promotion). `evict()`, run by `manage.py evict_hot_files`
+from cron, trims the hot tier to HOT_STORAGE['MAX_BYTES'], least recently
+used first. Losing the hot tier loses nothing.
+"""
+import os
+import shutil
+import uuid
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.utils.deconstruct import deconstructible
+
+from . import COPY_CHUNK_SIZE
+from .s3 import S3Storage
+
+DEFAULTS = {
+    'LOCATION': None,  # default: <MEDIA_ROOT>/hot
+    'MAX_BYTES': 20 * 1024 ** 3,
+}
+
+
+def hot_storage_setting(name):
+    return getattr(settings, 'HOT_STORAGE', {}).get(name, DEFAULTS[name])
+
+
+@deconstructible(path='dms_project.storage.tiered.TieredStorage')
+class TieredStorage(Storage):
+    """S3Storage behind a local FileSystemStorage cache; see the module docstring"""
+    presigned_urls = True
+
+    def __init__(self, location=None, max_bytes=None, **cold_options):
+        location = location or hot_storage_setting('LOCATION') or os.path.join(settings.MEDIA_ROOT, 'hot')
+        self.hot = FileSystemStorage(location=location)
+        self.cold = S3Storage(**cold_options)
+        self.max_bytes = max_bytes if max_bytes is not None else hot_storage_setting('MAX_BYTES')
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def promote(self, name):
+        """Make sure the file is in the hot tier; returns its local path"""
+        path = self.hot.path(name)
+        if os.path.exists(path):
+            self._touch(path)
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A unique temporary name, renamed into place: concurrent promotions are harmless
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            with self.cold.open(name, 'rb') as source, open(tmp, 'wb') as target:
+                shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return path
+
+    def _open(self, name, mode='rb'):
+        return File(open(self.promote(name), mode), name)
+
+    def _save(self, name, content):
+        name = self.cold.save(name, content)
+        # Just written, so likely read soon (previews, text extraction)
+        path = self.hot.path(name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+            with open(tmp, 'wb') as target:
+                for chunk in content.chunks():
+                    target.write(chunk)
+            os.replace(tmp, path)
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def path(self, name):
+        # For tools that need a local file: promoted first
+        return self.promote(name)
+
+    def delete(self, name):
+        self.cold.delete(name)
+        self.hot.delete(name)
+
+    def exists(self, name):
+        # Only the object store counts: a hot copy may outlive an object
+        # another node has deleted, and callers skip uploads on exists()
+        return self.cold.exists(name)
+
+    def size(self, name):
+        if self.hot.exists(name):
+            return self.hot.size(name)
+        return self.cold.size(name)
+
+    def get_modified_time(self, name):
+        # The object store's time: the same on every node
+        return self.cold.get_modified_time(name)
+
+    def listdir(self, path):
+        return self.cold.listdir(path)
+
+    def url(self, name, expire=None, filename=None):
+        return self.cold.url(name, expire=expire, filename=filename)
+
+    def evict(self, max_bytes=None):
+        """Delete hot copies, least recently used first, until the tier fits
+        in max_bytes; returns (files, bytes) removed"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        files = []
+        total = 0
+        for directory, _, names in os.walk(self.hot.location):
+            for filename in names:
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        removed = freed = 0
+        for _, size, path in sorted(files):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            removed += 1
+            freed += size
+        return removed, freed
@@ -0,0 +1,112 @@
+# dms_project/testing.py
+"""Query-count and query-plan assertions for the view test suites.
+
+`QueryPlanTestCase.assertEfficientView` requests a URL, then checks that:
+
+* no more than `max_queries` queries ran, nor more than the view's budget
+  in QUERY_BUDGETS (or QUERY_BUDGET_DEFAULT), which QueryBudgetMiddleware
+  warns about, so the two cannot drift apart;
+* the count does not grow when more rows are added (`grow`), which is how
+  an N+1 pattern shows up;
+* no SELECT plans a full table or full index scan. Plans come from
+  EXPLAIN QUERY PLAN on SQLite (`SCAN <table>`) and EXPLAIN on MySQL
+  (`type` ALL or index).
+
+Tables that legitimately need a scan can be listed in `allow_scans`.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .cache import get_cache
+
+# Transaction bookkeeping depends on nesting, not on the view; not counted
+UNCOUNTED = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+# "SCAN t", "SCAN t USING [COVERING] INDEX i": every row of t or of one of its indexes
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?(?: AS \w+)?(?: USING (?:COVERING )?INDEX \w+)?$')
+# MySQL access types that read a whole table or a whole index
+MYSQL_SCANS = {'ALL', 'index'}
+# "table" alias as written by the ORM, e.g. "search_searchterm" U0
+ALIAS = re.compile(r'"(\w+)" (?:AS )?"?(\w+)"?(?=[\s,)]|$)')
+
+
+def explain(sql):
+    """[(table, full_scan, detail), ...] for one captured SELECT.
+
+    Aliases are resolved to table names; scans of derived tables (subqueries
+    in FROM) are not reported since they are bounded by the inner query.
+    """
+    tables = set(connection.introspection.table_names())
+    aliases = {alias: table for table, alias in ALIAS.findall(sql) if table in tables}
+    plan = []
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            for row in cursor.fetchall():
+                detail = row[-1]
+                match = SQLITE_SCAN.match(detail)
+                table = aliases.get(match.group(1), match.group(1)) if match else None
+                plan.append((table, table in tables, detail))
+        elif connection.vendor == 'mysql':
+            cursor.execute(f'EXPLAIN {sql}')
+            columns = [col[0] for col in cursor.description]
+            for values in cursor.fetchall():
+                row = dict(zip(columns, values))
+                table = aliases.get(row['table'], row['table'])
+                plan.append((table, row['type'] in MYSQL_SCANS and table in tables, str(row)))
+    return plan
+
+
+class QueryPlanTestCase(TestCase):
+    """TestCase with query budget and full-scan assertions for views"""
+
+    def capture(self, url, method='get', data=None):
+        # Budgets are for the work a view does, not for a warm per-user cache
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data or {})
+        return response, [q for q in ctx.captured_queries if not q['sql'].startswith(UNCOUNTED)]
+
+    def assertNoFullScans(self, queries, allow_scans=()):
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            for table, full_scan, detail in explain(sql):
+                if full_scan and table not in allow_scans:
+                    self.fail(f'Full scan of {table} ({detail}) in:\n{sql}')
+
+    def assertWithinSettingsBudget(self, response, count):
+        match = response.resolver_match
+        if not match.url_name:
+            return  # a test-only URLconf route (the ASGI suites), named nowhere in settings
+        view_name = match.view_name
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(
+            view_name, getattr(settings, 'QUERY_BUDGET_DEFAULT', 20)
+        )
+        self.assertLessEqual(count, budget, f'{view_name} ran {count} queries, over its QUERY_BUDGETS entry')
+
+    def assertEfficientView(self, url, max_queries, method='get', data=None, grow=None,
+                            allow_scans=(), status=200):
+        """Request `url` and check its query budget and plans; returns the response"""
+        response, queries = self.capture(url, method, data)
+        self.assertEqual(response.status_code, status, url)
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f'{url} ran {len(queries)} queries:\n' + '\n'.join(q['sql'] for q in queries),
+        )
+        self.assertWithinSettingsBudget(response, len(queries))
+        self.assertNoFullScans(queries, allow_scans)
+
+        if grow is not None:
+            grow()
+            _, more = self.capture(url, method, data)
+            self.assertEqual(
+                len(more), len(queries),
+                f'{url} query count grew with the data (N+1?):\n' + '\n'.join(q['sql'] for q in more),
+            )
+        return response
@@ -21,6 +21,7 @@ urlpatterns = [
      path('search/', include('search.urls')),
      path('review/', include('review.urls')),
      path('access/', include('access.urls')),
+     path('metrics/', include('metrics.urls')),
 ]
 
 if settings.DEBUG:
@@ -6,4 +6,6 @@ from .models import Document
 class DocumentAdmin(admin.ModelAdmin):
     list_display = ['title', 'uploader', 'status', 'uploaded_at']
     list_filter = ['status', 'category']
-    search_fields = ['title', 'author', 'description']
\ No newline at end of file
+    search_fields = ['title', 'author', 'description']
+    # Tags are written through documents/tags.py so the per-user counts stay right
+    readonly_fields = ['tag_names']
\ No newline at end of file
@@ -0,0 +1,246 @@
+# documents/blobstore.py
+"""Content-addressed, reference-counted file storage.
+
+Every stored file lives once under blobs/<aa>/<bb>/<sha256>. Documents point
+at a Blob; storing a file whose hash is already known only bumps the
+blob's refcount, and releasing the last reference deletes the file.
+
+On local disk new files are written under a temporary name and renamed
+into place; on an object store (dms_project/storage) they are hashed first
+and uploaded only when the blob does not exist yet.
+"""
+import hashlib
+import os
+import uuid
+from collections import defaultdict
+
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F, ProtectedError
+
+from dms_project.storage import local_path
+from jobs.queue import enqueue, enqueue_many
+from .models import Blob
+from .previews import delete_previews
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def blob_name(sha256):
+    return f'blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+
+def hash_stream(fileobj):
+    """SHA-256 and size of a file object, read chunk by chunk from the start"""
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    while True:
+        chunk = fileobj.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+class BlobWriteError(Exception):
+    """The storage did not keep a blob file under its content-addressed name"""
+
+
+def _acquire(sha256, size, write):
+    """Take a reference on the blob for sha256, calling write(name) if its file is missing.
+
+    Runs under a lock on the Blob row, as collect_garbage does: the row and
+    its file are never seen half-collected, so exists() can be trusted.
+    """
+    name = blob_name(sha256)
+    while True:
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update().filter(sha256=sha256).first()
+            if blob is not None:
+                Blob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+                if not default_storage.exists(name):
+                    write(name)  # lost from the storage: the same content restores it
+                return blob, False
+        try:
+            with transaction.atomic():
+                blob = Blob.objects.create(sha256=sha256, file=name, size=size, refcount=1)
+                # Written while the new row is uncommitted: a failure takes the row with it
+                write(name)
+                return blob, True
+        except IntegrityError:
+            continue  # someone stored the same content concurrently: share theirs
+
+
+def _write_file(name, fileobj):
+    """Write a blob file whole: renamed into place on local disk, one upload elsewhere"""
+    target = local_path(default_storage, name)
+    if target is None:
+        saved = default_storage.save(name, File(fileobj, name))
+        if saved != name:
+            default_storage.delete(saved)
+            raise BlobWriteError(f"Blob {name} was stored as {saved}")
+        return
+    tmp = local_path(default_storage, f'blobs/tmp/{uuid.uuid4().hex}')
+    os.makedirs(os.path.dirname(tmp), exist_ok=True)
+    try:
+        with open(tmp, 'wb') as out:
+            for chunk in File(fileobj).chunks(HASH_CHUNK_SIZE):
+                out.write(chunk)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def store_upload(fieldfile):
+    """Store an uncommitted upload (a FieldFile wrapping an UploadedFile)"""
+    fileobj = fieldfile.file
+    sha256, size = hash_stream(fileobj)
+    blob, _ = _acquire(sha256, size, lambda name: _write_file(name, fileobj))
+    return blob
+
+
+def store_path(path):
+    """Store a file already on local disk, moving it into place if it is new.
+
+    The source file is consumed either way: moved when the content is new,
+    deleted when an identical blob exists.
+    """
+    with open(path, 'rb') as fileobj:
+        sha256, size = hash_stream(fileobj)
+
+    def write(name):
+        target = local_path(default_storage, name)
+        if target is None:
+            with open(path, 'rb') as fileobj:
+                _write_file(name, fileobj)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+
+    blob, _ = _acquire(sha256, size, write)
+    if os.path.exists(path):
+        os.remove(path)
+    return blob
+
+
+def write_blob(fileobj):
+    """Hash and store a file in one pass, without taking a reference.
+
+    The data goes to a temporary name and is renamed into place once its
+    hash is known, so concurrent writers of the same content are harmless:
+    the rename is atomic and the last one simply wins. Returns (sha256, size).
+    """
+    tmp = local_path(default_storage, f'blobs/tmp/{uuid.uuid4().hex}')
+    if tmp is None:
+        return _upload_blob(fileobj)
+    digest = hashlib.sha256()
+    size = 0
+    os.makedirs(os.path.dirname(tmp), exist_ok=True)
+    try:
+        fileobj.seek(0)
+        with open(tmp, 'wb') as out:
+            while True:
+                chunk = fileobj.read(HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+        sha256 = digest.hexdigest()
+        target = local_path(default_storage, blob_name(sha256))
+        if os.path.exists(target):
+            os.remove(tmp)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return sha256, size
+
+
+def _upload_blob(fileobj):
+    """write_blob for an object store, which has no rename: hash, then upload if new"""
+    sha256, size = hash_stream(fileobj)
+    name = blob_name(sha256)
+    if not default_storage.exists(name):
+        default_storage.save(name, File(fileobj, name))
+    return sha256, size
+
+
+def acquire_blobs(files, openers):
+    """Take references on blobs already written by write_blob, set-based.
+
+    `files` maps sha256 -> (size, references wanted); `openers` maps sha256
+    -> a callable returning a context manager over the content again. The
+    rows are locked as in _acquire, and a file collected since write_blob
+    saw it is written again from its opener. Runs one insert, one SELECT
+    and one UPDATE per distinct reference count, whatever the number of
+    files; returns {sha256: Blob}.
+    """
+    by_count = defaultdict(list)
+    for sha256, (_, count) in files.items():
+        by_count[count].append(sha256)
+    with transaction.atomic():
+        Blob.objects.bulk_create(
+            [Blob(sha256=sha256, file=blob_name(sha256), size=size, refcount=0)
+             for sha256, (size, _) in files.items()],
+            ignore_conflicts=True, batch_size=500,
+        )
+        blobs = {blob.sha256: blob for blob in Blob.objects.select_for_update().filter(sha256__in=list(files))}
+        for sha256, blob in blobs.items():
+            if not default_storage.exists(blob.file.name):
+                with openers[sha256]() as fileobj:
+                    _write_file(blob.file.name, fileobj)
+        for count, shas in by_count.items():
+            Blob.objects.filter(sha256__in=shas).update(refcount=F('refcount') + count)
+        for blob in blobs.values():
+            blob.refcount += files[blob.sha256][1]
+        return blobs
+
+
+def release_blob(blob_id):
+    """Drop one reference; collect the blob once nothing points at it"""
+    Blob.objects.filter(pk=blob_id, refcount__gt=0).update(refcount=F('refcount') - 1)
+    # The file is deleted by a background job, not while the request waits
+    enqueue('documents.collect_blob', blob_id)
+
+
+def release_blobs(counts):
+    """Drop references on many blobs: counts maps blob id -> references released"""
+    by_count = defaultdict(list)
+    for blob_id, count in counts.items():
+        by_count[count].append(blob_id)
+    for count, blob_ids in by_count.items():
+        Blob.objects.filter(pk__in=blob_ids, refcount__gte=count).update(refcount=F('refcount') - count)
+    if counts:
+        enqueue_many('documents.collect_blob', [[blob_id] for blob_id in counts])
+
+
+def collect_garbage(blobs=None):
+    """Delete unreferenced blobs and their files; returns (count, bytes freed)"""
+    blobs = Blob.objects.all() if blobs is None else blobs
+    count = freed = 0
+    for blob in blobs.filter(refcount=0).iterator():
+        try:
+            with transaction.atomic():
+                # Re-check under the row lock: a concurrent upload may have revived it.
+                # The file goes before the lock is released, so _acquire never
+                # trusts a file that is about to disappear.
+                if not Blob.objects.select_for_update().filter(pk=blob.pk, refcount=0).values_list('pk'):
+                    continue
+                Blob.objects.filter(pk=blob.pk).delete()
+                default_storage.delete(blob.file.name)
+        except ProtectedError:
+            continue  # refcount drifted; dedupe_media --reconcile fixes it
+        delete_previews(blob.file.name)
+        count += 1
+        freed += blob.size
+    return count, freed
@@ -0,0 +1,208 @@
+# documents/bulk.py
+"""Bulk ingestion and set-based bulk operations on documents.
+
+Ingestion validates, hashes and streams many files into the blob store on a
+thread pool (the work is I/O: reading uploads, writing media), then creates
+the Blob and Document rows of each batch with a handful of set-based
+statements. Re-tag and category changes work on a queryset with one
+statement per table rather than one save() per document; delete is one
+QuerySet.delete(), which cascades by model metadata.
+
+Per-row model signals are either not sent or skipped (bulk_deleting); the
+documents_bulk_* signals (documents/signals.py) let the other apps adjust
+counters, facets, the search index and the review queue in bulk instead.
+"""
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .blobstore import acquire_blobs, write_blob
+from .models import Document
+from .signals import bulk_deleting, documents_bulk_created, documents_bulk_deleting, documents_bulk_updating
+from .tags import normalize_tags, retag_documents, tag_new_documents
+from .validators import SNIFF_LENGTH, max_upload_size, validate_content, validate_extension, validate_size
+
+DEFAULTS = {
+    'WORKERS': 4,
+    'BATCH_SIZE': 100,
+}
+
+
+def bulk_setting(name):
+    return getattr(settings, 'BULK_UPLOAD', {}).get(name, DEFAULTS[name])
+
+
+class Source:
+    """One file to ingest: the name it was uploaded as, its size and an opener"""
+
+    def __init__(self, name, size, opener):
+        self.name = os.path.basename(name)
+        self.size = size
+        self.open = opener
+
+    @classmethod
+    def from_upload(cls, uploaded_file):
+        # The upload handler owns the file; ingestion must not close it
+        return cls(uploaded_file.name, uploaded_file.size, lambda: nullcontext(uploaded_file))
+
+    @classmethod
+    def from_path(cls, path):
+        return cls(path, os.path.getsize(path), lambda: open(path, 'rb'))
+
+
+def _store(source, limit):
+    """Validate one source and write it to the blob store: (ext, sha256, size)"""
+    if not source.size:
+        raise ValidationError("File is empty.")
+    validate_size(source.size, limit)
+    ext = validate_extension(source.name)
+    with source.open() as fileobj:
+        fileobj.seek(0)
+        validate_content(ext, fileobj.read(SNIFF_LENGTH))
+        sha256, size = write_blob(fileobj)
+    return ext, sha256, size
+
+
+def _store_all(sources, limit, workers):
+    """[(ext, sha256, size) or the exception raised] for each source, in order"""
+    def store(source):
+        try:
+            return _store(source, limit)
+        except (ValidationError, OSError) as exc:
+            return exc
+
+    if workers <= 1 or len(sources) <= 1:
+        return [store(source) for source in sources]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(store, sources))
+
+
+def _fill_pks(documents):
+    """Read back the ids bulk_create could not return (MySQL), by each row's bulk_token"""
+    if all(document.pk is not None for document in documents):
+        return
+    by_token = {document.bulk_token: document for document in documents}
+    for pk, token in Document.objects.filter(bulk_token__in=list(by_token)).values_list('pk', 'bulk_token'):
+        document = by_token[token]
+        document.pk = pk
+        document._state.adding = False
+        document._state.db = Document.objects.db
+
+
+def _create_batch(user, stored, metadata):
+    """Insert the documents of one batch; `stored` is [(source, ext, sha256, size)]"""
+    files = {}
+    for _, _, sha256, size in stored:
+        files[sha256] = (size, files.get(sha256, (size, 0))[1] + 1)
+
+    with transaction.atomic():
+        blobs = acquire_blobs(files, {sha256: source.open for source, _, sha256, _ in stored})
+        documents = []
+        for source, ext, sha256, _ in stored:
+            blob = blobs[sha256]
+            documents.append(Document(
+                title=os.path.splitext(source.name)[0][:200] or source.name[:200],
+                description=metadata['description'],
+                author=metadata['author'],
+                category=metadata['category'],
+                tag_names=','.join(metadata['tags']),
+                uploader=user,
+                blob=blob,
+                file=blob.file.name,
+                file_size=blob.size,
+                file_type=ext,
+                original_filename=source.name[:255],
+                bulk_token=uuid.uuid4(),
+            ))
+        Document.objects.bulk_create(documents)
+        _fill_pks(documents)
+        tag_new_documents(documents, metadata['tags'])
+        documents_bulk_created.send(sender=Document, documents=documents)
+    return documents
+
+
+def ingest(user, sources, category='other', tags=(), author='', description='',
+           limit=None, workers=None, batch_size=None):
+    """Create one document per source for `user`.
+
+    Returns one report per source, in order: {'name', 'ok', 'id'} for a
+    created document, {'name', 'ok', 'error'} for a rejected file. A
+    rejected file does not stop the others.
+    """
+    limit = limit or max_upload_size()
+    workers = workers or bulk_setting('WORKERS')
+    batch_size = batch_size or bulk_setting('BATCH_SIZE')
+    metadata = {
+        'category': category or '',
+        'tags': normalize_tags(tags),
+        'author': author,
+        'description': description,
+    }
+
+    reports = []
+    for start in range(0, len(sources), batch_size):
+        batch = sources[start:start + batch_size]
+        results = _store_all(batch, limit, workers)
+        stored = [
+            (source, *result) for source, result in zip(batch, results)
+            if not isinstance(result, Exception)
+        ]
+        created = iter(_create_batch(user, stored, metadata) if stored else [])
+        for source, result in zip(batch, results):
+            if isinstance(result, ValidationError):
+                reports.append({'name': source.name, 'ok': False, 'error': result.messages[0]})
+            elif isinstance(result, Exception):
+                reports.append({'name': source.name, 'ok': False, 'error': f"Could not read file: {result}"})
+            else:
+                reports.append({'name': source.name, 'ok': True, 'id': next(created).pk})
+    return reports
+
+
+# --- Set-based operations on existing documents ------------------------------
+
+def delete_documents(documents):
+    """Delete every document of a queryset and its dependent rows; returns the number deleted"""
+    with transaction.atomic():
+        ids = list(documents.order_by().select_for_update().values_list('pk', flat=True))
+        if not ids:
+            return 0
+        queryset = Document.objects.filter(pk__in=ids)
+        documents_bulk_deleting.send(sender=Document, queryset=queryset)
+        # The cascade follows each relation's on_delete; per-row receivers skip
+        # the work documents_bulk_deleting just did (documents/signals.py)
+        token = bulk_deleting.set(True)
+        try:
+            queryset.delete()
+        finally:
+            bulk_deleting.reset(token)
+    return len(ids)
+
+
+def update_documents(documents, **changes):
+    """queryset.update(**changes) that keeps counters, facets and caches in step"""
+    with transaction.atomic():
+        # Rows already holding the new values are left alone, not counted as moved
+        documents = documents.exclude(**changes) if len(changes) == 1 else documents
+        ids = list(documents.order_by().select_for_update().values_list('pk', flat=True))
+        if not ids:
+            return 0
+        queryset = Document.objects.filter(pk__in=ids)
+        documents_bulk_updating.send(sender=Document, queryset=queryset, changes=changes)
+        return queryset.update(updated_at=timezone.now(), version=F('version') + 1, **changes)
+
+
+def set_category(documents, category):
+    """Move every document of a queryset to `category`; returns the number changed"""
+    return update_documents(documents, category=category)
+
+
+def retag(documents, add=(), remove=()):
+    """Add and remove tags on every document of a queryset; returns the number changed"""
+    return len(retag_documents(documents, add=add, remove=remove))
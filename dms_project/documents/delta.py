@@ -0,0 +1,187 @@
+# documents/delta.py
+"""Binary deltas and diffs of line-oriented files, without reading them whole.
+
+Both work on a line index of each file: a short hash and the byte offset of
+every line, built in one sequential pass. difflib matches the hash lists;
+the lines themselves are read back by offset only where they are needed,
+so memory grows with the number of lines, not with their length.
+
+A delta rebuilds a target file from a base file:
+
+    MAGIC  varint(target size)  op*
+    op:    COPY   varint(base offset) varint(length)
+           INSERT varint(length) <bytes>
+"""
+import difflib
+import hashlib
+from array import array
+
+MAGIC = b'DMSD1'
+COPY = b'c'
+INSERT = b'i'
+CHUNK_SIZE = 64 * 1024
+
+
+class DeltaError(ValueError):
+    """A delta that does not decode"""
+
+
+def iter_lines(fileobj, chunk_size=CHUNK_SIZE):
+    """The lines of a binary file from the start, b'\\n' kept; a line longer
+    than chunk_size comes out in pieces"""
+    fileobj.seek(0)
+    pending = b''
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk
+        start = 0
+        while True:
+            end = pending.find(b'\n', start)
+            if end < 0:
+                break
+            yield pending[start:end + 1]
+            start = end + 1
+        pending = pending[start:]
+        if len(pending) >= chunk_size:
+            yield pending
+            pending = b''
+    if pending:
+        yield pending
+
+
+def line_index(fileobj):
+    """([line hash, ...], offsets) where offsets[i] is where line i starts and
+    offsets[-1] is the file size"""
+    hashes = []
+    offsets = array('Q', [0])
+    for line in iter_lines(fileobj):
+        hashes.append(hashlib.blake2b(line, digest_size=8).digest())
+        offsets.append(offsets[-1] + len(line))
+    return hashes, offsets
+
+
+def read_lines(fileobj, offsets, first, last):
+    """Lines first..last-1 of an indexed file"""
+    fileobj.seek(offsets[first])
+    for i in range(first, last):
+        yield fileobj.read(offsets[i + 1] - offsets[i])
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.write(bytes([value & 0x7f | 0x80]))
+        value >>= 7
+    out.write(bytes([value]))
+
+
+def _read_varint(stream):
+    value = shift = 0
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            raise DeltaError('truncated delta')
+        value |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+
+def encode(base, target, out, limit=None):
+    """Write the delta turning `base` into `target` to `out`.
+
+    Returns False, leaving `out` partly written, as soon as the delta
+    exceeds `limit` bytes: a full copy is the better deal then.
+    """
+    base_hashes, base_offsets = line_index(base)
+    target_hashes, target_offsets = line_index(target)
+    start = out.tell()
+    out.write(MAGIC)
+    _write_varint(out, target_offsets[-1])
+    matcher = difflib.SequenceMatcher(None, base_hashes, target_hashes)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            out.write(COPY)
+            _write_varint(out, base_offsets[i1])
+            _write_varint(out, base_offsets[i2] - base_offsets[i1])
+        elif j2 > j1:
+            length = target_offsets[j2] - target_offsets[j1]
+            out.write(INSERT)
+            _write_varint(out, length)
+            target.seek(target_offsets[j1])
+            _copy(target, out, length)
+        if limit is not None and out.tell() - start > limit:
+            return False
+    return True
+
+
+def _copy(source, out, length):
+    while length:
+        chunk = source.read(min(length, CHUNK_SIZE))
+        if not chunk:
+            raise DeltaError('source shorter than the delta says')
+        out.write(chunk)
+        length -= len(chunk)
+
+
+def apply(base, delta, out):
+    """Write the target rebuilt from `base` and the `delta` stream to `out`"""
+    if delta.read(len(MAGIC)) != MAGIC:
+        raise DeltaError('not a delta')
+    size = _read_varint(delta)
+    written = 0
+    while True:
+        op = delta.read(1)
+        if not op:
+            break
+        if op == COPY:
+            offset, length = _read_varint(delta), _read_varint(delta)
+            base.seek(offset)
+            _copy(base, out, length)
+        elif op == INSERT:
+            length = _read_varint(delta)
+            _copy(delta, out, length)
+        else:
+            raise DeltaError(f'unknown delta op {op!r}')
+        written += length
+    if written != size:
+        raise DeltaError(f'delta rebuilt {written} bytes, expected {size}')
+
+
+def _hunk_range(start, stop):
+    """Line range in a unified diff hunk header, as difflib writes it"""
+    length = stop - start
+    if length == 1:
+        return f'{start + 1}'
+    return f'{start + 1 if length else start},{length}'
+
+
+def _diff_line(prefix, line):
+    if not line.endswith(b'\n'):
+        line += b'\n\\ No newline at end of file\n'
+    return prefix + line
+
+
+def unified_diff(a, b, a_label, b_label, context=3):
+    """Unified diff of two binary files, as an iterator of byte strings"""
+    a_hashes, a_offsets = line_index(a)
+    b_hashes, b_offsets = line_index(b)
+    matcher = difflib.SequenceMatcher(None, a_hashes, b_hashes)
+    started = False
+    for group in matcher.get_grouped_opcodes(context):
+        if not started:
+            yield f'--- {a_label}\n+++ {b_label}\n'.encode()
+            started = True
+        first, last = group[0], group[-1]
+        yield (f'@@ -{_hunk_range(first[1], last[2])} '
+               f'+{_hunk_range(first[3], last[4])} @@\n').encode()
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in read_lines(a, a_offsets, i1, i2):
+                    yield _diff_line(b' ', line)
+                continue
+            for line in read_lines(a, a_offsets, i1, i2):
+                yield _diff_line(b'-', line)
+            for line in read_lines(b, b_offsets, j1, j2):
+                yield _diff_line(b'+', line)
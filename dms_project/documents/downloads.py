@@ -0,0 +1,288 @@
+# documents/downloads.py
+"""File download responses for R-3.2.1.
+
+Files are streamed in DOWNLOAD_CHUNK_SIZE blocks, so memory per download is
+constant. Conditional requests (ETag / Last-Modified) answer 304 without
+touching the file, and single byte ranges are served as 206 Partial Content
+so interrupted downloads resume where they stopped. With DOWNLOAD_OFFLOAD
+set, the response only carries an X-Sendfile / X-Accel-Redirect header and
+the web server does the file I/O (and range handling) itself; with
+'presigned' and an object store (dms_project/storage), it redirects to a
+short-lived signed URL and the browser downloads straight from the store.
+
+`aserve_file` is the same response for async views (the ASGI profile): the
+file is read chunk by chunk in the thread pool and handed to the server as
+an async iterator, so a slow client costs a coroutine rather than a worker
+thread. Sync iterators, FileResponse's included, would be read whole into
+memory by Django's ASGI handler before the first byte is sent.
+"""
+import asyncio
+import hashlib
+import mimetypes
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from dms_project.storage import local_path
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def download_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def file_etag(name, size, modified):
+    digest = hashlib.sha1(f'{name}:{size}:{modified}'.encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def parse_range(header, size):
+    """Return (start, end) inclusive for a single satisfiable byte range.
+
+    Returns None when the header should be ignored (absent, malformed or a
+    multi-range request, which we answer with the full file) and raises
+    ValueError when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if size == 0:
+        raise ValueError("no byte of an empty file can be served")
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def iter_file_range(fileobj, start, end, chunk_size):
+    """Yield bytes start..end (inclusive) of fileobj, chunk by chunk"""
+    try:
+        fileobj.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = fileobj.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+async def aiter_file_range(storage, name, start, end, chunk_size):
+    """Async iterator over bytes start..end (inclusive) of a stored file.
+
+    Opening, reading and closing block, so each runs in the event loop's
+    default executor. No database is involved, so none of it has to go
+    through sync_to_async, which costs more per chunk.
+    """
+    loop = asyncio.get_running_loop()
+    fileobj = await loop.run_in_executor(None, storage.open, name, 'rb')
+    try:
+        await loop.run_in_executor(None, fileobj.seek, start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await loop.run_in_executor(None, fileobj.read, min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await loop.run_in_executor(None, fileobj.close)
+
+
+def _offload_response(fieldfile, mode):
+    response = HttpResponse()
+    if mode == 'x-sendfile':
+        response['X-Sendfile'] = fieldfile.path
+    elif mode == 'x-accel-redirect':
+        prefix = download_setting('DOWNLOAD_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + fieldfile.name
+    else:
+        raise ValueError(f"Unknown DOWNLOAD_OFFLOAD mode {mode!r}")
+    # Let the web server fill in the type from the file it serves.
+    del response['Content-Type']
+    return response
+
+
+def _presigned_redirect(fieldfile, filename):
+    """A redirect to the object store for DOWNLOAD_OFFLOAD = 'presigned', or
+    None when the storage cannot sign URLs (local disk: streamed instead)"""
+    if download_setting('DOWNLOAD_OFFLOAD', None) != 'presigned':
+        return None
+    if not getattr(fieldfile.storage, 'presigned_urls', False):
+        return None
+    response = HttpResponseRedirect(fieldfile.storage.url(fieldfile.name, filename=filename))
+    # The URL expires: never reuse the redirect
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
+
+def _offload_mode(fieldfile):
+    """The X-Sendfile / X-Accel-Redirect mode, or None to stream.
+
+    The web server can only send files it can read: on an object store the
+    file is streamed (or, with 'presigned', the browser is redirected).
+    """
+    mode = download_setting('DOWNLOAD_OFFLOAD', None)
+    if mode == 'presigned' or local_path(fieldfile.storage, fieldfile.name) is None:
+        return None
+    return mode
+
+
+def _file_validators(fieldfile):
+    """(size, etag, last_modified) of a stored file; stats the file"""
+    size = fieldfile.size
+    try:
+        modified = fieldfile.storage.get_modified_time(fieldfile.name)
+    except NotImplementedError:
+        modified = None
+    last_modified = int(modified.timestamp()) if modified else None
+    return size, file_etag(fieldfile.name, size, last_modified), last_modified
+
+
+def _finish(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    # Documents are per-user: browsers may revalidate, shared caches must not store.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def serve_file(request, fieldfile, filename, content_type='application/octet-stream'):
+    """Build a download response for a stored FieldFile"""
+    redirect = _presigned_redirect(fieldfile, filename)
+    if redirect is not None:
+        return redirect
+    size, etag, last_modified = _file_validators(fieldfile)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        mode = _offload_mode(fieldfile)
+        if mode:
+            response = _offload_response(fieldfile, mode)
+        else:
+            response = _stream_response(request, fieldfile, size, etag, last_modified, content_type)
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+    return _finish(response, etag, last_modified)
+
+
+async def aserve_file(request, fieldfile, filename, content_type='application/octet-stream'):
+    """serve_file for async views: no blocking I/O in the event loop"""
+    redirect = _presigned_redirect(fieldfile, filename)
+    if redirect is not None:
+        return redirect
+    size, etag, last_modified = await sync_to_async(_file_validators, thread_sensitive=False)(fieldfile)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        mode = _offload_mode(fieldfile)
+        if mode:
+            response = _offload_response(fieldfile, mode)
+        else:
+            response = _astream_response(request, fieldfile, size, etag, last_modified, content_type)
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+    return _finish(response, etag, last_modified)
+
+
+def serve_preview(request, name):
+    """Serve a preview image (documents/previews.py) for the browser to keep.
+
+    Preview names derive from the content-addressed blob name and pages link
+    them with a version parameter, so a given URL never changes content:
+    the response is cacheable for PREVIEW_CACHE_MAX_AGE and marked immutable.
+    """
+    etag = f'"{hashlib.sha1(name.encode()).hexdigest()}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        response = FileResponse(default_storage.open(name, 'rb'), content_type=content_type)
+    response['ETag'] = etag
+    patch_cache_control(
+        response, private=True, immutable=True,
+        max_age=download_setting('PREVIEW_CACHE_MAX_AGE', 365 * 24 * 60 * 60),
+    )
+    return response
+
+
+def _requested_range(request, size, etag, last_modified):
+    """The byte range to serve (None for the whole file) or a 416 response"""
+    if request.method not in ('GET', 'HEAD') or not _if_range_matches(request, etag, last_modified):
+        return None
+    try:
+        return parse_range(request.META.get('HTTP_RANGE'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+
+def _partial(response, start, end, size):
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def _stream_response(request, fieldfile, size, etag, last_modified, content_type):
+    chunk_size = download_setting('DOWNLOAD_CHUNK_SIZE', 64 * 1024)
+    byte_range = _requested_range(request, size, etag, last_modified)
+    if isinstance(byte_range, HttpResponse):
+        return byte_range
+
+    fileobj = fieldfile.storage.open(fieldfile.name, 'rb')
+    if byte_range is None:
+        response = FileResponse(fileobj, content_type=content_type)
+        response.block_size = chunk_size
+        return response
+
+    start, end = byte_range
+    response = StreamingHttpResponse(
+        iter_file_range(fileobj, start, end, chunk_size), status=206, content_type=content_type
+    )
+    return _partial(response, start, end, size)
+
+
+def _astream_response(request, fieldfile, size, etag, last_modified, content_type):
+    chunk_size = download_setting('DOWNLOAD_CHUNK_SIZE', 64 * 1024)
+    byte_range = _requested_range(request, size, etag, last_modified)
+    if isinstance(byte_range, HttpResponse):
+        return byte_range
+
+    start, end = byte_range or (0, size - 1)
+    response = StreamingHttpResponse(
+        aiter_file_range(fieldfile.storage, fieldfile.name, start, end, chunk_size),
+        status=206 if byte_range else 200, content_type=content_type,
+    )
+    if byte_range:
+        return _partial(response, start, end, size)
+    response['Content-Length'] = str(size)
+    return response
+
+
+def _if_range_matches(request, etag, last_modified):
+    """A Range is honoured only if If-Range (when sent) still matches the file"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    if_range_date = parse_http_date_safe(if_range)
+    return if_range_date is not None and last_modified is not None and if_range_date == last_modified
@@ -1,8 +1,32 @@
 # documents/forms.py
+import os
 from django import forms
-from .models import Document
+from .models import Document, UploadSession
+from .tags import set_document_tags
+from .validators import max_chunked_upload_size, validate_extension, validate_size, validate_uploaded_file
 
-class DocumentUploadForm(forms.ModelForm):
+class DocumentTagsMixin:
+    """Write the form's tag field to Document.tags once the document is saved.
+
+    With commit=False the tags are written by save_m2m(), like any other
+    many-to-many data, after the view has saved the document.
+    """
+    tags_field = 'selected_tags'
+    
+    def save(self, commit=True):
+        instance = super().save(commit=commit)
+        tags = self.cleaned_data.get(self.tags_field) or []
+        if commit:
+            set_document_tags(instance, tags)
+        else:
+            save_m2m = self.save_m2m
+            def save_m2m_and_tags():
+                save_m2m()
+                set_document_tags(instance, tags)
+            self.save_m2m = save_m2m_and_tags
+        return instance
+
+class DocumentUploadForm(DocumentTagsMixin, forms.ModelForm):
     # Add a multiple choice field for tags
     selected_tags = forms.MultipleChoiceField(
         choices=Document.TAG_CHOICES,
@@ -24,30 +48,80 @@ class DocumentUploadForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # If editing existing document, pre-select tags
-        if self.instance and self.instance.pk and self.instance.tags:
-            existing_tags = [tag.strip() for tag in self.instance.tags.split(',') if tag.strip()]
-            self.initial['selected_tags'] = existing_tags
+        if self.instance and self.instance.pk and not self.is_bound:
+            self.initial['selected_tags'] = self.instance.get_tags_list()
     
     def clean_file(self):
         file = self.cleaned_data.get('file')
         if file:
-            # Check file size (max 10MB)
-            if file.size > 10 * 1024 * 1024:
-                raise forms.ValidationError("File size must be less than 10MB")
-            
-            # Check file extension
-            ext = file.name.split('.')[-1].lower()
-            valid_extensions = ['pdf', 'docx', 'xlsx', 'txt', 'jpg', 'png']
-            if ext not in valid_extensions:
-                raise forms.ValidationError(f"Unsupported file format. Please upload: {', '.join(valid_extensions)}")
+            # Size (max 10MB), extension and content checks
+            validate_uploaded_file(file)
         return file
     
+class ChunkedUploadForm(forms.ModelForm):
+    """Metadata sent when starting a chunked upload (the file follows in chunks)"""
+    selected_tags = forms.MultipleChoiceField(choices=Document.TAG_CHOICES, required=False)
+    
+    class Meta:
+        model = UploadSession
+        fields = ['title', 'description', 'author', 'category', 'file_name', 'total_size']
+    
+    def clean_file_name(self):
+        file_name = os.path.basename(self.cleaned_data['file_name'])
+        validate_extension(file_name)
+        return file_name
+    
+    def clean_total_size(self):
+        total_size = self.cleaned_data['total_size']
+        if total_size <= 0:
+            raise forms.ValidationError("File is empty.")
+        validate_size(total_size, max_chunked_upload_size())
+        return total_size
+    
     def save(self, commit=True):
-        # Convert selected tags to comma-separated string
         instance = super().save(commit=False)
-        selected_tags = self.cleaned_data.get('selected_tags', [])
-        instance.tags = ','.join(selected_tags)
-        
+        instance.tags = ','.join(self.cleaned_data.get('selected_tags', []))
         if commit:
             instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+class BulkUploadForm(forms.Form):
+    """Metadata applied to every file of a bulk upload (the files come as request.FILES['files'])"""
+    author = forms.CharField(max_length=100, required=False,
+                             widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Document author'}))
+    category = forms.ChoiceField(choices=Document.CATEGORY_CHOICES, initial='other',
+                                 widget=forms.Select(attrs={'class': 'form-control'}))
+    selected_tags = forms.MultipleChoiceField(
+        choices=Document.TAG_CHOICES,
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'tag-checkbox'}),
+        required=False,
+        label="Tags"
+    )
+
+class DocumentIdsField(forms.TypedMultipleChoiceField):
+    """Selected document ids; the view narrows them to the user's own documents"""
+    
+    def valid_value(self, value):
+        return str(value).isdigit()
+
+class BulkActionForm(forms.Form):
+    """An action on the documents selected in My Documents"""
+    ACTIONS = [
+        ('delete', 'Delete'),
+        ('add_tags', 'Add tags'),
+        ('remove_tags', 'Remove tags'),
+        ('category', 'Set category'),
+    ]
+    action = forms.ChoiceField(choices=ACTIONS)
+    documents = DocumentIdsField(coerce=int, error_messages={'required': "Select at least one document."})
+    tags = forms.MultipleChoiceField(choices=Document.TAG_CHOICES, required=False)
+    category = forms.ChoiceField(choices=[('', '---------')] + Document.CATEGORY_CHOICES, required=False)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        action = cleaned_data.get('action')
+        if action in ('add_tags', 'remove_tags') and not cleaned_data.get('tags'):
+            raise forms.ValidationError("Choose the tags to add or remove.")
+        if action == 'category' and not cleaned_data.get('category'):
+            raise forms.ValidationError("Choose a category.")
+        return cleaned_data
@@ -0,0 +1,23 @@
+# documents/management/commands/backfill_previews.py
+from django.core.management.base import BaseCommand
+
+from documents.previews import backfill
+from jobs.worker import run_workers
+
+
+class Command(BaseCommand):
+    help = "Queue previews for documents already in MEDIA_ROOT"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Queue every document again, not only those without a preview")
+        parser.add_argument('--run', action='store_true',
+                            help="Run the job queue right away instead of leaving it to run_workers")
+        parser.add_argument('--workers', type=int, default=None)
+
+    def handle(self, *args, **options):
+        queued = backfill(queue_all=options['all'])
+        self.stdout.write(f"Queued {queued} documents for previews.")
+        if options['run']:
+            processed = run_workers(workers=options['workers'], once=True, stdout=self.stdout)
+            self.stdout.write(self.style.SUCCESS(f"Ran {processed} jobs."))
@@ -0,0 +1,22 @@
+# documents/management/commands/convert_legacy_tags.py
+from django.core.management.base import BaseCommand
+
+from documents.tags import convert_legacy_tags, recount
+
+
+class Command(BaseCommand):
+    help = "Move comma-separated document tags into the Tag/DocumentTag tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--recount', action='store_true',
+            help="Also rebuild the per-user tag counts from scratch",
+        )
+
+    def handle(self, *args, **options):
+        converted = convert_legacy_tags(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Converted tags on {converted} documents."))
+        if options['recount']:
+            rows = recount()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} per-user tag counts."))
@@ -0,0 +1,77 @@
+# documents/management/commands/dedupe_media.py
+import os
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F
+
+from documents.blobstore import collect_garbage, hash_stream, store_path
+from documents.models import Blob, Document
+
+
+class Command(BaseCommand):
+    help = "Move existing MEDIA_ROOT documents into the content-addressed blob store"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report how much space deduplication would save")
+        parser.add_argument('--reconcile', action='store_true',
+                            help="Recompute blob refcounts from documents and versions and collect garbage")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            return self.report()
+
+        legacy = Document.objects.filter(blob__isnull=True).exclude(file='').order_by('pk')
+        migrated = missing = 0
+        blobs_by_name = {}
+        for document in legacy.iterator():
+            name = document.file.name
+            blob = blobs_by_name.get(name)
+            if blob is not None:
+                # Another document pointed at the same file: one more reference
+                Blob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+            elif default_storage.exists(name):
+                blob = blobs_by_name[name] = store_path(default_storage.path(name))
+            else:
+                self.stderr.write(f"  missing file for document {document.pk}: {name}")
+                missing += 1
+                continue
+            # update() rather than save(): nothing but the storage location changes
+            Document.objects.filter(pk=document.pk).update(
+                blob=blob,
+                file=blob.file.name,
+                file_size=blob.size,
+                original_filename=os.path.basename(name),
+            )
+            migrated += 1
+        self.stdout.write(f"Moved {migrated} documents into the blob store ({missing} missing files).")
+
+        if options['reconcile']:
+            drifted = 0
+            refs = Count('documents', distinct=True) + Count('versions', distinct=True)
+            for blob in Blob.objects.annotate(refs=refs).exclude(refcount=F('refs')):
+                Blob.objects.filter(pk=blob.pk).update(refcount=blob.refs)
+                drifted += 1
+            self.stdout.write(f"Fixed {drifted} blob refcounts.")
+
+        count, freed = collect_garbage()
+        self.stdout.write(self.style.SUCCESS(
+            f"Blobs: {Blob.objects.count()}; collected {count} unreferenced ({freed} bytes)."
+        ))
+
+    def report(self):
+        sizes = defaultdict(list)
+        for document in Document.objects.filter(blob__isnull=True).exclude(file='').iterator():
+            if not default_storage.exists(document.file.name):
+                continue
+            with default_storage.open(document.file.name, 'rb') as fileobj:
+                sha256, size = hash_stream(fileobj)
+            sizes[sha256].append(size)
+        total = sum(sum(group) for group in sizes.values())
+        unique = sum(group[0] for group in sizes.values())
+        self.stdout.write(
+            f"{sum(len(g) for g in sizes.values())} legacy files, {len(sizes)} unique: "
+            f"{total} bytes would become {unique} bytes."
+        )
@@ -0,0 +1,18 @@
+# documents/management/commands/evict_hot_files.py
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Trim the local hot tier of TieredStorage to HOT_STORAGE['MAX_BYTES'], least recently used first"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-bytes', type=int, default=None,
+                            help="Size to trim to instead of HOT_STORAGE['MAX_BYTES']")
+
+    def handle(self, *args, **options):
+        evict = getattr(default_storage, 'evict', None)
+        if evict is None:
+            raise CommandError("The default storage has no hot tier (use dms_project.storage.tiered.TieredStorage).")
+        removed, freed = evict(options['max_bytes'])
+        self.stdout.write(self.style.SUCCESS(f"Evicted {removed} files ({freed} bytes)."))
@@ -0,0 +1,58 @@
+# documents/management/commands/import_documents.py
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.bulk import Source, ingest
+from documents.validators import max_chunked_upload_size
+
+
+class Command(BaseCommand):
+    help = "Import every file under a directory as documents of one user (the files are copied)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--user', required=True, help="Username of the uploader")
+        parser.add_argument('--category', default='other')
+        parser.add_argument('--tags', default='', help="Comma-separated tags for every document")
+        parser.add_argument('--author', default='')
+        parser.add_argument('--no-recursive', action='store_true', help="Only the top level of the directory")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--workers', type=int, default=None)
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not os.path.isdir(directory):
+            raise CommandError(f"{directory} is not a directory")
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['user']!r}")
+
+        paths = []
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            paths.extend(os.path.join(root, name) for name in sorted(files))
+            if options['no_recursive']:
+                break
+
+        reports = ingest(
+            user,
+            [Source.from_path(path) for path in paths],
+            category=options['category'],
+            tags=options['tags'].split(','),
+            author=options['author'],
+            limit=max_chunked_upload_size(),
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+        )
+        failed = 0
+        for path, report in zip(paths, reports):
+            if report['ok']:
+                self.stdout.write(f"  ok      {path} -> document {report['id']}")
+            else:
+                failed += 1
+                self.stdout.write(f"  FAILED  {path}: {report['error']}")
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(f"Imported {len(reports) - failed} of {len(reports)} files."))
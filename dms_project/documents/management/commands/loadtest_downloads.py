@@ -0,0 +1,156 @@
+# documents/management/commands/loadtest_downloads.py
+"""Load-test document downloads against a running server.
+
+Compares the WSGI and the ASGI deployment (README, "ASGI deployment"): run
+it once against each with the same options. Clients are asyncio
+connections, so one process can hold hundreds of them open, and --rate
+makes each one read slowly, like a user on a poor connection; that is the
+case where a threaded WSGI worker runs out of threads.
+
+The command logs the user in by creating a session in the database the
+server uses, so it must run with the server's settings.
+"""
+import asyncio
+import itertools
+import socket
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from documents.models import Document
+
+READ_SIZE = 64 * 1024
+# Receive buffer of a throttled client. Left to autotuning, the kernel would
+# accept megabytes on the reader's behalf and the server would never wait.
+SLOW_RECEIVE_BUFFER = 64 * 1024
+
+
+def login_cookie(user):
+    """Cookie header value for a fresh session of `user`"""
+    store = import_string(f'{settings.SESSION_ENGINE}.SessionStore')()
+    store[SESSION_KEY] = str(user.pk)
+    store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    store.create()
+    return f'{settings.SESSION_COOKIE_NAME}={store.session_key}'
+
+
+async def fetch(host, port, path, cookie, rate):
+    """GET path on a new connection: (status, seconds to first byte, seconds, body bytes)"""
+    started = time.perf_counter()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if rate:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SLOW_RECEIVE_BUFFER)
+    sock.setblocking(False)
+    try:
+        await asyncio.get_running_loop().sock_connect(sock, (host, port))
+    except OSError:
+        sock.close()
+        raise
+    reader, writer = await asyncio.open_connection(sock=sock)
+    try:
+        writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nCookie: {cookie}\r\n'
+            f'Connection: close\r\n\r\n'.encode()
+        )
+        await writer.drain()
+        head = await reader.readuntil(b'\r\n\r\n')
+        first_byte = time.perf_counter() - started
+        status = int(head.split(b' ', 2)[1])
+        size = 0
+        while chunk := await reader.read(READ_SIZE):
+            size += len(chunk)
+            if rate:
+                # A slow reader: the server's writes back up behind it
+                await asyncio.sleep(len(chunk) / rate)
+        return status, first_byte, time.perf_counter() - started, size
+    finally:
+        writer.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def run(host, port, paths, cookie, concurrency, total, rate, timeout):
+    """Run `total` downloads, `concurrency` at a time; returns the results and the wall time"""
+    results = []
+    paths = itertools.cycle(paths)
+
+    async def client(count):
+        for _ in range(count):
+            try:
+                results.append(await asyncio.wait_for(fetch(host, port, next(paths), cookie, rate), timeout))
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+                results.append(type(exc).__name__)
+
+    started = time.perf_counter()
+    shares = [total // concurrency + (i < total % concurrency) for i in range(concurrency)]
+    await asyncio.gather(*(client(count) for count in shares if count))
+    return results, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = "Download documents from a running server with many concurrent (optionally slow) clients"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Base URL of the server")
+        parser.add_argument('--user', required=True, help="Username to download as")
+        parser.add_argument('--documents', default='', help="Comma-separated document ids (default: the user's)")
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--rate', type=int, default=0, help="Bytes per second each client reads (0: no limit)")
+        parser.add_argument('--timeout', type=float, default=120, help="Seconds before a download counts as failed")
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError("--url must be a plain http:// URL")
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['user']!r}")
+        if options['documents']:
+            ids = [int(pk) for pk in options['documents'].split(',')]
+        else:
+            ids = list(Document.objects.filter(uploader=user).order_by('pk').values_list('pk', flat=True)[:50])
+        if not ids:
+            raise CommandError(f"{user.username} has no documents to download")
+
+        prefix = url.path.rstrip('/')
+        paths = [prefix + reverse('documents:download', args=[pk]) for pk in ids]
+        results, elapsed = asyncio.run(run(
+            url.hostname, url.port or 80, paths, login_cookie(user),
+            options['concurrency'], options['requests'], options['rate'], options['timeout'],
+        ))
+
+        done = [result for result in results if not isinstance(result, str) and result[0] == 200]
+        failed = len(results) - len(done)
+        self.stdout.write(
+            f"{len(results)} downloads, {options['concurrency']} concurrent, "
+            f"{elapsed:.1f}s: {len(done) / elapsed:.1f} downloads/s, "
+            f"{sum(result[3] for result in done) / elapsed / 1e6:.1f} MB/s, {failed} failed"
+        )
+        if failed:
+            errors = [result if isinstance(result, str) else f'HTTP {result[0]}' for result in results]
+            self.stdout.write("  failures: " + ", ".join(
+                f'{name} x{count}' for name, count in sorted(
+                    (name, errors.count(name)) for name in set(errors) if name != 'HTTP 200'
+                )
+            ))
+        if done:
+            for label, index in (('first byte', 1), ('complete', 2)):
+                values = [result[index] * 1000 for result in done]
+                self.stdout.write(
+                    f"  {label:<10} ms: p50 {percentile(values, 0.5):.0f}  p95 {percentile(values, 0.95):.0f}"
+                    f"  p99 {percentile(values, 0.99):.0f}  max {max(values):.0f}"
+                    f"  mean {statistics.fmean(values):.0f}"
+                )
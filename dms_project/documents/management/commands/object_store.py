@@ -0,0 +1,34 @@
+# documents/management/commands/object_store.py
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from dms_project.storage.s3 import object_storage_setting
+from dms_project.storage.server import ObjectStoreServer
+
+
+class Command(BaseCommand):
+    help = "Run the local S3-compatible stand-in (dms_project/storage/server.py) for development"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', default=os.path.join(settings.BASE_DIR, 'objects'),
+                            help="Directory holding the buckets")
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=9000)
+
+    def handle(self, *args, **options):
+        bucket = os.path.join(options['root'], object_storage_setting('BUCKET'))
+        os.makedirs(bucket, exist_ok=True)
+        server = ObjectStoreServer(
+            (options['host'], options['port']), options['root'],
+            object_storage_setting('ACCESS_KEY'), object_storage_setting('SECRET_KEY'),
+            object_storage_setting('REGION'),
+        )
+        self.stdout.write(f"Serving {options['root']} at {server.endpoint_url} (Ctrl-C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
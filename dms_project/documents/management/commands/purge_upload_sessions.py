@@ -0,0 +1,15 @@
+# documents/management/commands/purge_upload_sessions.py
+from django.core.management.base import BaseCommand
+
+from documents.uploads import purge_stale_sessions
+
+
+class Command(BaseCommand):
+    help = "Abort chunked uploads that stalled and delete their partial files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        purged = purge_stale_sessions(options['max_age_hours'])
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} stale upload sessions."))
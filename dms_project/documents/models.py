@@ -1,12 +1,58 @@
 # documents/models.py
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 import os
+import uuid
 
 def document_upload_path(instance, filename):
     # File will be uploaded to MEDIA_ROOT/documents/user_<id>/<filename>
     return f'documents/user_{instance.uploader.id}/{filename}'
 
+class Blob(models.Model):
+    """Content-addressed file: identical uploads are stored once.
+
+    `refcount` is the number of Documents and DocumentVersions pointing at
+    the blob; when it drops to zero the blob and its file are garbage
+    collected (documents/blobstore.py).
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=255)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.refcount} refs)"
+
+class Tag(models.Model):
+    """A tag name, shared by every document that carries it"""
+    name = models.CharField(max_length=50, unique=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+class DocumentQuerySet(models.QuerySet):
+    """Relation shapes for the views that list or show documents"""
+
+    def with_uploader(self):
+        """Lists and pages that print the uploader's name"""
+        return self.select_related('uploader')
+
+    def with_review_history(self):
+        """Document pages that show reviews and who wrote them"""
+        Review = self.model._meta.get_field('reviews').related_model
+        return self.with_uploader().prefetch_related(
+            models.Prefetch('reviews', queryset=Review.objects.with_reviewer().order_by('-created_at'))
+        )
+
+    def with_tags(self):
+        """Pages that list each document's tags (see get_tags_list)"""
+        return self.prefetch_related('tags')
+
+
 class Document(models.Model):
     # R-2.1 Supported formats
     SUPPORTED_FORMATS = [
@@ -56,40 +102,236 @@ class Document(models.Model):
     file = models.FileField(upload_to=document_upload_path)
     file_type = models.CharField(max_length=10, choices=SUPPORTED_FORMATS, default='pdf')
     file_size = models.IntegerField(help_text="File size in bytes", editable=False, default=0)
+    # Stored content (file points at blob.file) and the name the user uploaded it as
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name='documents')
+    original_filename = models.CharField(max_length=255, blank=True, editable=False)
     
     # Metadata for search - Now with choices
     author = models.CharField(max_length=100, blank=True)
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, blank=True, default='other')
-    tags = models.CharField(max_length=500, blank=True, help_text="Comma-separated tags")
+    # Tags live in DocumentTag (documents/tags.py writes them). tag_names is the
+    # old comma-separated column, kept as a denormalized copy for display and
+    # the MySQL FULLTEXT index; convert_legacy_tags fills the table from it.
+    tags = models.ManyToManyField(Tag, through='DocumentTag', related_name='documents', blank=True, editable=False)
+    tag_names = models.CharField(max_length=500, blank=True, help_text="Comma-separated tags", db_column='tags')
     
     # Relationships
     uploader = models.ForeignKey(User, on_delete=models.CASCADE, related_name='documents')
     
     # Status for workflow
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Optimistic concurrency token: moves on every write, so a reviewer's
+    # decision only applies to the row they looked at (review/decisions.py)
+    version = models.PositiveIntegerField(default=0, editable=False)
+    # Set on bulk-inserted rows so their ids can be read back on databases
+    # whose bulk INSERT returns none (documents/bulk.py)
+    bulk_token = models.UUIDField(null=True, blank=True, editable=False, db_index=True)
     
     # Timestamps
     uploaded_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = DocumentQuerySet.as_manager()
+    
     def save(self, *args, **kwargs):
-        # Auto-set file size and type
-        if self.file and not self.file_size:
-            self.file_size = self.file.size
-        if self.file and not self.file_type:
-            ext = os.path.splitext(self.file.name)[1][1:].lower()
-            self.file_type = ext if ext in dict(self.SUPPORTED_FORMATS) else 'other'
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # A newly attached file (upload or resubmission) goes to the blob store
+            replaced = None
+            if self.file and not self.file._committed:
+                from .blobstore import store_upload
+                if self.blob_id:
+                    # What the old file was, for its entry in the version history
+                    replaced = (self.blob_id, self.original_filename, self.file_type)
+                self.original_filename = os.path.basename(self.file.name)
+                ext = os.path.splitext(self.original_filename)[1][1:].lower()
+                self.file_type = ext if ext in dict(self.SUPPORTED_FORMATS) else 'other'
+                self.blob = store_upload(self.file)
+                self.file = self.blob.file.name
+                self.file_size = self.blob.size
+            
+            # Auto-set file size and type
+            if self.file and not self.file_size:
+                self.file_size = self.file.size
+            if self.file and not self.file_type:
+                ext = os.path.splitext(self.file.name)[1][1:].lower()
+                self.file_type = ext if ext in dict(self.SUPPORTED_FORMATS) else 'other'
+            if not self._state.adding:
+                self.version += 1
+            super().save(*args, **kwargs)
+            
+            if replaced:
+                from .blobstore import release_blob
+                from .versions import record_replacement
+                # Version 1 may keep the document's reference on the old blob
+                if not record_replacement(self, *replaced):
+                    release_blob(replaced[0])
     
     def filename(self):
-        return os.path.basename(self.file.name)
+        return self.original_filename or os.path.basename(self.file.name)
     
     def get_tags_list(self):
-        """Return tags as a list"""
-        return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
+        """Return tag names as a list (prefetch with with_tags() when listing)"""
+        return [tag.name for tag in self.tags.all()]
     
     def __str__(self):
         return self.title
     
     class Meta:
-        ordering = ['-uploaded_at']
\ No newline at end of file
+        ordering = ['-uploaded_at']
+        # Keyset pagination in search seeks on (uploader, <sort key>, id)
+        indexes = [
+            models.Index(fields=['uploader', 'uploaded_at', 'id'], name='doc_uploader_uploaded_idx'),
+            models.Index(fields=['uploader', 'title', 'id'], name='doc_uploader_title_idx'),
+            models.Index(fields=['uploader', 'file_size', 'id'], name='doc_uploader_size_idx'),
+            # My Documents / dashboards: one user's documents in a status, newest first
+            models.Index(fields=['uploader', 'status', '-uploaded_at'], name='doc_uploader_status_idx'),
+            # Review and admin listings: everything in a status, newest first
+            models.Index(fields=['status', '-uploaded_at'], name='doc_status_uploaded_idx'),
+        ]
+
+
+class DocumentVersion(models.Model):
+    """One revision of a document's file, kept when the file is replaced.
+
+    `blob` holds the content itself (FULL) or a binary delta (DELTA) that
+    rebuilds it from version `base_number` of the same document, `depth`
+    deltas away from a full copy. Old versions are rebuilt on demand
+    (documents/versions.py).
+    """
+    FULL = 'full'
+    DELTA = 'delta'
+    STORAGE_CHOICES = [
+        (FULL, 'Full copy'),
+        (DELTA, 'Delta'),
+    ]
+    
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='versions')
+    number = models.PositiveIntegerField()
+    # The version's content, whatever way it is stored
+    sha256 = models.CharField(max_length=64)
+    size = models.BigIntegerField()
+    file_type = models.CharField(max_length=10)
+    original_filename = models.CharField(max_length=255, blank=True)
+    
+    storage = models.CharField(max_length=10, choices=STORAGE_CHOICES, default=FULL)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, related_name='versions')
+    base_number = models.PositiveIntegerField(null=True, blank=True)
+    depth = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-number']
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'number'], name='docversion_document_number_uniq'),
+        ]
+    
+    def filename(self):
+        return self.original_filename or f'version-{self.number}.{self.file_type}'
+    
+    def __str__(self):
+        return f"{self.document_id} v{self.number} ({self.storage})"
+
+
+class DocumentTag(models.Model):
+    """Through table for Document.tags"""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='document_tags')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='document_tags')
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'tag'], name='unique_document_tag'),
+        ]
+        indexes = [
+            # tag -> documents (filters and facets)
+            models.Index(fields=['tag', 'document'], name='doctag_tag_document_idx'),
+        ]
+
+
+class UserTagCount(models.Model):
+    """How many of a user's documents carry a tag, kept current by documents/tags.py"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tag_counts')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='user_counts')
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'tag'], name='unique_user_tag_count'),
+        ]
+
+
+class DocumentPreview(models.Model):
+    """A small preview of a document's file for the detail page (R-3.2).
+
+    Either a downsampled image stored next to the original file or a text
+    snippet from its head. A new file resets the row to `queued` and
+    queues a `documents.build_preview` job (documents/previews.py).
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    ]
+    KIND_CHOICES = [
+        ('image', 'Image'),
+        ('text', 'Text'),
+    ]
+    
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='preview')
+    file_name = models.CharField(max_length=255, blank=True, help_text="File the preview was made from")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, blank=True)
+    image = models.CharField(max_length=255, blank=True, help_text="Storage name of the preview image")
+    snippet = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='doc_preview_status_idx'),
+        ]
+
+
+class UploadSession(models.Model):
+    """A chunked upload in progress (R-2.1 for large files).
+
+    Chunks are appended to a `.part` file under document_upload_path (kept
+    as one object per chunk on an object store, documents/uploads.py); the
+    session remembers how many bytes arrived so a client can resume after a
+    dropped connection. Finalizing turns the part file into a Document.
+    """
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('complete', 'Complete'),
+        ('aborted', 'Aborted'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    uploader = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+
+    # Metadata of the Document to create
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    author = models.CharField(max_length=100, blank=True)
+    category = models.CharField(max_length=50, choices=Document.CATEGORY_CHOICES, blank=True, default='other')
+    tags = models.CharField(max_length=500, blank=True)
+
+    # File being received
+    file_name = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    received_size = models.BigIntegerField(default=0)
+    part_name = models.CharField(max_length=255, blank=True, help_text="Storage name of the partial file")
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='upload_status_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.file_name} ({self.received_size}/{self.total_size})"
@@ -0,0 +1,105 @@
+# documents/previewers.py
+"""Preview renderers, one per file format.
+
+These run in the worker processes of documents/previews.py, so they take a
+file path and plain options and return plain data: no ORM, no storage.
+Images are decoded at reduced scale where the format allows it (JPEG draft
+mode), PDFs are rasterized with poppler's pdftoppm, and text-like formats
+reuse the streaming extractors of the search app to read only the head.
+"""
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import namedtuple
+
+from search.extractors import ExtractionUnavailable, extract_text
+
+try:
+    from PIL import Image
+except ImportError:  # optional dependency, image previews are skipped without it
+    Image = None
+
+# kind: 'image' or 'text'; content: bytes or str; extension: of the image file
+Preview = namedtuple('Preview', 'kind content extension')
+
+PDF_RENDER_TIMEOUT = 60
+
+
+class PreviewUnavailable(Exception):
+    """No preview can be made for this file"""
+
+
+def _encode_image(image, size):
+    image.thumbnail(size)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        fmt, extension = 'PNG', 'png'
+    else:
+        fmt, extension = 'JPEG', 'jpg'
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, optimize=True, quality=80)
+    return Preview('image', buffer.getvalue(), extension)
+
+
+def image_thumbnail(path, options):
+    if Image is None:
+        raise PreviewUnavailable("Pillow is not installed")
+    size = tuple(options['SIZE'])
+    with Image.open(path) as image:
+        # JPEG: let the decoder downscale by 1/2..1/8 instead of decoding full size
+        image.draft('RGB', size)
+        return _encode_image(image, size)
+
+
+def pdf_first_page(path, options):
+    pdftoppm = shutil.which('pdftoppm')
+    if pdftoppm is None:
+        raise PreviewUnavailable("pdftoppm (poppler-utils) is not installed")
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'page')
+        subprocess.run(
+            [pdftoppm, '-png', '-f', '1', '-l', '1', '-singlefile',
+             '-scale-to', str(max(options['SIZE'])), path, output],
+            check=True, capture_output=True, timeout=PDF_RENDER_TIMEOUT,
+        )
+        with open(output + '.png', 'rb') as fileobj:
+            return Preview('image', fileobj.read(), 'png')
+
+
+def text_snippet(path, file_type, options):
+    try:
+        with open(path, 'rb') as fileobj:
+            text, truncated = extract_text(fileobj, file_type, max_chars=options['SNIPPET_CHARS'])
+    except ExtractionUnavailable as exc:
+        raise PreviewUnavailable(str(exc))
+    text = text.strip()
+    if not text:
+        raise PreviewUnavailable("No text to preview")
+    return Preview('text', text + ('…' if truncated else ''), '')
+
+
+def render_preview(path, file_type, options):
+    """Build the Preview of a local file; raises PreviewUnavailable"""
+    if file_type in ('jpg', 'png'):
+        return image_thumbnail(path, options)
+    if file_type == 'pdf':
+        try:
+            return pdf_first_page(path, options)
+        except PreviewUnavailable:
+            # No rasterizer here: the first page's text is still a preview
+            return text_snippet(path, file_type, options)
+    if file_type in ('txt', 'docx', 'xlsx'):
+        return text_snippet(path, file_type, options)
+    raise PreviewUnavailable(f"No preview for {file_type!r} files")
+
+
+def render_job(path, file_type, options):
+    """Worker-process entry point: (status, Preview or None, error)"""
+    try:
+        return 'done', render_preview(path, file_type, options), ''
+    except PreviewUnavailable as exc:
+        return 'skipped', None, str(exc)
+    except Exception as exc:
+        return 'failed', None, f'{type(exc).__name__}: {exc}'
@@ -0,0 +1,128 @@
+# documents/previews.py
+"""Off-request preview generation, run as background jobs (jobs app).
+
+Rendering (documents/previewers.py) is CPU-bound; run the workers with
+JOBS['POOL'] = 'process' to spread it over cores. DocumentPreview rows hold
+the state and the result shown on the detail page. Preview images are
+written next to the original (`<file>.preview.jpg`), so a blob shared by
+several documents is rendered once and its preview is deleted with it
+(documents/blobstore.py).
+"""
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from dms_project.storage import local_copy
+from jobs.queue import enqueue, enqueue_many
+from .models import Document, DocumentPreview
+from .previewers import render_job
+
+DEFAULTS = {
+    'SIZE': (320, 320),
+    'SNIPPET_CHARS': 1500,
+}
+IMAGE_EXTENSIONS = ('jpg', 'png')
+
+
+def preview_setting(name):
+    return getattr(settings, 'DOCUMENT_PREVIEWS', {}).get(name, DEFAULTS[name])
+
+
+def preview_name(file_name, extension):
+    return f'{file_name}.preview.{extension}'
+
+
+def existing_preview(file_name):
+    """Storage name of an image already rendered for this file, if any"""
+    for extension in IMAGE_EXTENSIONS:
+        name = preview_name(file_name, extension)
+        if default_storage.exists(name):
+            return name
+    return None
+
+
+def delete_previews(file_name):
+    for extension in IMAGE_EXTENSIONS:
+        default_storage.delete(preview_name(file_name, extension))
+
+
+def queue_preview(document, created=False, force=False):
+    """Queue a preview of the document's current file"""
+    fields = {'file_name': document.file.name or '', 'status': 'queued'}
+    if created or not DocumentPreview.objects.filter(document_id=document.pk).update(
+        kind='', image='', snippet='', error='', **fields
+    ):
+        DocumentPreview.objects.create(document_id=document.pk, **fields)
+    # A resubmission back to an earlier file (A -> B -> A) finds that file's
+    # job already done: requeue it, or the row just reset would stay queued
+    enqueue('documents.build_preview', document.pk, fields['file_name'],
+            key=f'preview:{document.pk}:{fields["file_name"]}', force=force or not created)
+
+
+def queue_new_previews(documents):
+    """Queue previews of freshly bulk-created documents: two inserts in all"""
+    DocumentPreview.objects.bulk_create(
+        [DocumentPreview(document_id=document.pk, file_name=document.file.name) for document in documents],
+        batch_size=500,
+    )
+    enqueue_many(
+        'documents.build_preview',
+        [[document.pk, document.file.name] for document in documents],
+        keys=[f'preview:{document.pk}:{document.file.name}' for document in documents],
+    )
+
+
+def store_result(document_id, file_name, result):
+    """Save a rendering result, unless the row was requeued for a newer file meanwhile"""
+    status, preview, error = result
+    fields = {'status': status, 'error': error}
+    if preview is not None and preview.kind == 'image':
+        name = preview_name(file_name, preview.extension)
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(preview.content))
+        fields.update(kind='image', image=name)
+    elif preview is not None:
+        fields.update(kind='text', snippet=preview.content)
+    DocumentPreview.objects.filter(
+        document_id=document_id, status='processing', file_name=file_name
+    ).update(**fields)
+    return status
+
+
+def build_preview(document_id, file_name):
+    """Job: render and store the preview of one document file"""
+    claimed = DocumentPreview.objects.filter(
+        document_id=document_id, file_name=file_name, status__in=['queued', 'processing', 'failed']
+    ).update(status='processing')
+    if not claimed:
+        return None  # requeued for a newer file, or the document is gone
+
+    image = existing_preview(file_name)
+    if image:
+        # Same blob as another document: its preview is already there
+        DocumentPreview.objects.filter(
+            document_id=document_id, status='processing', file_name=file_name
+        ).update(status='done', kind='image', image=image)
+        return 'done'
+
+    file_type = Document.objects.filter(pk=document_id).values_list('file_type', flat=True).first()
+    options = {'SIZE': preview_setting('SIZE'), 'SNIPPET_CHARS': preview_setting('SNIPPET_CHARS')}
+    # Renderers need a file on disk: an object store's file is downloaded for the job
+    with local_copy(default_storage, file_name) as path:
+        status = store_result(document_id, file_name, render_job(path, file_type, options))
+    if status == 'failed':
+        # Recorded on the row; raising lets the job queue retry with backoff
+        raise RuntimeError(f"Preview of {file_name} failed")
+    return status
+
+
+def backfill(queue_all=False, batch_size=500):
+    """Queue previews for documents that have none yet (or, with queue_all, all of them)"""
+    documents = Document.objects.order_by()
+    if not queue_all:
+        documents = documents.filter(preview__isnull=True)
+    queued = 0
+    for document in documents.only('id', 'file').iterator(chunk_size=batch_size):
+        queue_preview(document, force=True)
+        queued += 1
+    return queued
@@ -0,0 +1,127 @@
+# documents/signals.py
+from contextvars import ContextVar
+
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from dms_project.cache import bump_generation, bump_shared_generation
+
+from .blobstore import release_blob, release_blobs
+from .models import Document, DocumentVersion
+from .previews import delete_previews, queue_new_previews, queue_preview
+from .tags import release_document_tags, release_tags_of
+from .versions import version_blob_counts
+
+
+# True while delete_documents (documents/bulk.py) runs its QuerySet.delete():
+# the documents_bulk_deleting receivers below already did, set-based, what the
+# per-row delete receivers of documents and their cascade would do, so those
+# return early, as save receivers do for `raw`.
+bulk_deleting = ContextVar('bulk_deleting', default=False)
+
+
+# Covers every delete path, including cascades from a deleted user.
+@receiver(post_delete, sender=Document)
+def release_document_blob(sender, instance, **kwargs):
+    if bulk_deleting.get():
+        return
+    if instance.blob_id:
+        release_blob(instance.blob_id)
+    elif instance.file:
+        # Files from before the blob store: their preview goes with the document
+        delete_previews(instance.file.name)
+
+
+@receiver(pre_delete, sender=Document)
+def release_document_tag_counts(sender, instance, **kwargs):
+    if bulk_deleting.get():
+        return
+    # Before the cascade removes the DocumentTag rows the counts are read from
+    release_document_tags(instance)
+
+
+@receiver(pre_delete, sender=Document)
+def release_version_blobs(sender, instance, **kwargs):
+    if bulk_deleting.get():
+        return
+    # The cascade deletes the versions, not the blob references they hold
+    release_blobs(version_blob_counts(DocumentVersion.objects.filter(document=instance)))
+
+
+# Cached pages and counts of the uploader (dms_project/cache.py) are stale now,
+# and so are those of grantees and staff who see the document (access/policy.py).
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+def expire_uploader_cache(sender, instance, raw=False, **kwargs):
+    if not raw and not bulk_deleting.get():
+        bump_generation(instance.uploader_id)
+        bump_shared_generation()
+
+
+# document_file_changed: the hook for background work on a document's file
+# (previews here, text extraction in search/signals.py). Sent after a save
+# that created the document or attached a new file, with `created`. The
+# loaded file name is read from __dict__, so a deferred field is not loaded.
+document_file_changed = Signal()
+
+
+@receiver(post_init, sender=Document)
+def remember_file_name(sender, instance, **kwargs):
+    file = instance.__dict__.get('file')
+    instance._loaded_file_name = getattr(file, 'name', file)
+
+
+@receiver(post_save, sender=Document)
+def detect_file_change(sender, instance, created, raw=False, **kwargs):
+    if raw or 'file' not in instance.__dict__ or not instance.file:
+        return
+    if created or instance.file.name != instance._loaded_file_name:
+        document_file_changed.send(sender=Document, document=instance, created=created)
+    instance._loaded_file_name = instance.file.name
+
+
+@receiver(document_file_changed)
+def queue_document_preview(sender, document, created, **kwargs):
+    queue_preview(document, created=created)
+
+
+# Bulk operations (documents/bulk.py) write with bulk_create and update(),
+# which send none of the per-row signals above, and delete with bulk_deleting
+# set. Apps keeping data derived from documents (counters, facets, index,
+# queues) listen to these instead and adjust it set-based:
+#   documents_bulk_created(documents)        a list of saved documents
+#   documents_bulk_deleting(queryset)        before the rows and their cascade go
+#   documents_bulk_updating(queryset, changes)  before queryset.update(**changes)
+documents_bulk_created = Signal()
+documents_bulk_deleting = Signal()
+documents_bulk_updating = Signal()
+
+
+@receiver(documents_bulk_created)
+def process_created_documents(sender, documents, **kwargs):
+    queue_new_previews(documents)
+    for uploader_id in {document.uploader_id for document in documents}:
+        bump_generation(uploader_id)
+    bump_shared_generation()
+
+
+@receiver(documents_bulk_deleting)
+def release_deleted_documents(sender, queryset, **kwargs):
+    release_tags_of(queryset)
+    release_blobs(dict(
+        queryset.exclude(blob=None).order_by().values_list('blob_id').annotate(count=Count('id'))
+    ))
+    release_blobs(version_blob_counts(DocumentVersion.objects.filter(document__in=queryset)))
+    for name in queryset.filter(blob=None).exclude(file='').values_list('file', flat=True):
+        delete_previews(name)
+    for uploader_id in queryset.order_by().values_list('uploader_id', flat=True).distinct():
+        bump_generation(uploader_id)
+    bump_shared_generation()
+
+
+@receiver(documents_bulk_updating)
+def expire_updated_documents(sender, queryset, changes, **kwargs):
+    for uploader_id in queryset.order_by().values_list('uploader_id', flat=True).distinct():
+        bump_generation(uploader_id)
+    bump_shared_generation()
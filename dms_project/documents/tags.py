@@ -0,0 +1,234 @@
+# documents/tags.py
+"""Writing document tags and keeping the per-user tag counts current.
+
+Tags are stored once in Tag and linked through DocumentTag. Every change
+goes through `set_document_tags`, which also adjusts UserTagCount (the
+facet counts) and the denormalized Document.tag_names copy, so neither
+needs a scan to read.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from dms_project.cache import bump_generation, bump_shared_generation
+from .models import Document, DocumentTag, Tag, UserTagCount
+
+MAX_TAG_LENGTH = Tag._meta.get_field('name').max_length
+
+
+def normalize_tags(names):
+    """Stripped, lower-cased, de-duplicated tag names in their original order"""
+    seen = []
+    for name in names:
+        name = name.strip().lower()[:MAX_TAG_LENGTH]
+        if name and name not in seen:
+            seen.append(name)
+    return seen
+
+
+def split_tags(text):
+    """Tag names from a comma-separated string (legacy column, free-text input)"""
+    return normalize_tags((text or '').split(','))
+
+
+def get_or_create_tags(names):
+    """{name: Tag} for every name, creating the missing ones in one insert"""
+    tags = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+    missing = [name for name in names if name not in tags]
+    if missing:
+        Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+        tags.update({tag.name: tag for tag in Tag.objects.filter(name__in=missing)})
+    return tags
+
+
+def _adjust_counts(user_id, tag_ids, delta):
+    if not tag_ids:
+        return
+    if delta > 0:
+        UserTagCount.objects.bulk_create(
+            [UserTagCount(user_id=user_id, tag_id=tag_id) for tag_id in tag_ids],
+            ignore_conflicts=True,
+        )
+        UserTagCount.objects.filter(user_id=user_id, tag_id__in=tag_ids).update(count=F('count') + delta)
+    else:
+        UserTagCount.objects.filter(
+            user_id=user_id, tag_id__in=tag_ids, count__gt=0
+        ).update(count=F('count') + delta)
+
+
+def set_document_tags(document, names, reindex=True):
+    """Replace a saved document's tags with `names`; returns the normalized names"""
+    names = normalize_tags(names)
+    with transaction.atomic():
+        tags = get_or_create_tags(names) if names else {}
+        wanted = {tag.pk for tag in tags.values()}
+        current = set(DocumentTag.objects.filter(document_id=document.pk).values_list('tag_id', flat=True))
+        added, removed = wanted - current, current - wanted
+
+        if removed:
+            DocumentTag.objects.filter(document_id=document.pk, tag_id__in=removed).delete()
+        DocumentTag.objects.bulk_create([DocumentTag(document_id=document.pk, tag_id=tag_id) for tag_id in added])
+        _adjust_counts(document.uploader_id, added, 1)
+        _adjust_counts(document.uploader_id, removed, -1)
+
+        tag_names = ','.join(names)
+        if tag_names != document.tag_names:
+            # update() rather than save(): nothing else about the document changed
+            Document.objects.filter(pk=document.pk).update(tag_names=tag_names)
+            document.tag_names = tag_names
+
+    getattr(document, '_prefetched_objects_cache', {}).pop('tags', None)
+    if added or removed:
+        bump_generation(document.uploader_id)
+        bump_shared_generation()
+    if reindex and (added or removed):
+        from search.backends import get_search_backend
+        get_search_backend().index_document(document)
+    return names
+
+
+def release_document_tags(document):
+    """Take a document that is about to be deleted out of the tag counts"""
+    tag_ids = list(DocumentTag.objects.filter(document_id=document.pk).values_list('tag_id', flat=True))
+    _adjust_counts(document.uploader_id, tag_ids, -1)
+
+
+def _adjust_grouped(deltas):
+    """Apply {(user_id, tag_id): delta} with one _adjust_counts per (user, delta)"""
+    groups = defaultdict(list)
+    for (user_id, tag_id), delta in deltas.items():
+        if delta:
+            groups[user_id, delta].append(tag_id)
+    for (user_id, delta), tag_ids in groups.items():
+        _adjust_counts(user_id, tag_ids, delta)
+
+
+def retag_documents(documents, add=(), remove=(), reindex=True):
+    """Add and remove tags on many documents with set-based writes.
+
+    `documents` is a queryset. One DELETE and one INSERT for the links, one
+    UPDATE per (user, delta) for the counts and a bulk update of tag_names,
+    however many documents there are. Returns the documents that changed.
+    """
+    add, remove = normalize_tags(add), [name for name in normalize_tags(remove) if name not in add]
+    with transaction.atomic():
+        rows = list(documents.order_by().values_list('pk', 'uploader_id', 'tag_names'))
+        ids = [pk for pk, _, _ in rows]
+        tags = get_or_create_tags(add) if add else {}
+        add_ids = {tag.pk for tag in tags.values()}
+        remove_ids = set(Tag.objects.filter(name__in=remove).values_list('pk', flat=True)) if remove else set()
+
+        current = defaultdict(set)
+        for document_id, tag_id in DocumentTag.objects.filter(
+            document_id__in=ids, tag_id__in=add_ids | remove_ids
+        ).values_list('document_id', 'tag_id'):
+            current[document_id].add(tag_id)
+
+        deltas = defaultdict(int)
+        links = []
+        changed = []
+        for pk, uploader_id, tag_names in rows:
+            added = add_ids - current[pk]
+            removed = remove_ids & current[pk]
+            if not (added or removed):
+                continue
+            links.extend(DocumentTag(document_id=pk, tag_id=tag_id) for tag_id in added)
+            for tag_id in added:
+                deltas[uploader_id, tag_id] += 1
+            for tag_id in removed:
+                deltas[uploader_id, tag_id] -= 1
+            names = [name for name in split_tags(tag_names) if name not in remove]
+            names += [name for name in add if name not in names]
+            changed.append(Document(pk=pk, uploader_id=uploader_id, tag_names=','.join(names)))
+
+        if remove_ids:
+            DocumentTag.objects.filter(document_id__in=ids, tag_id__in=remove_ids).delete()
+        DocumentTag.objects.bulk_create(links, batch_size=500)
+        _adjust_grouped(deltas)
+        Document.objects.bulk_update(changed, ['tag_names'], batch_size=500)
+
+    for user_id in {document.uploader_id for document in changed}:
+        bump_generation(user_id)
+    if changed:
+        bump_shared_generation()
+    if reindex and changed:
+        from search.backends import get_search_backend
+        get_search_backend().index_documents(
+            Document.objects.filter(pk__in=[document.pk for document in changed]).select_related('content')
+        )
+    return changed
+
+
+def tag_new_documents(documents, names):
+    """Tag freshly bulk-created documents of one uploader (see documents/bulk.py).
+
+    Their tag_names must already hold `names`; this writes the links and the
+    counts only.
+    """
+    names = normalize_tags(names)
+    if not names or not documents:
+        return
+    tags = get_or_create_tags(names)
+    DocumentTag.objects.bulk_create(
+        [DocumentTag(document_id=document.pk, tag_id=tag.pk) for document in documents for tag in tags.values()],
+        batch_size=500,
+    )
+    _adjust_counts(documents[0].uploader_id, [tag.pk for tag in tags.values()], len(documents))
+
+
+def release_tags_of(documents):
+    """Take many documents that are about to be deleted out of the tag counts"""
+    rows = (
+        DocumentTag.objects.filter(document__in=documents)
+        .order_by()
+        .values_list('document__uploader_id', 'tag_id')
+        .annotate(total=Count('id'))
+    )
+    _adjust_grouped({(user_id, tag_id): -total for user_id, tag_id, total in rows})
+
+
+def user_tags(user):
+    """[(name, count), ...] for the tags on a user's documents, by name"""
+    return list(
+        UserTagCount.objects.filter(user=user, count__gt=0)
+        .order_by('tag__name')
+        .values_list('tag__name', 'count')
+    )
+
+
+def recount():
+    """Rebuild UserTagCount from DocumentTag; returns the number of rows written"""
+    rows = (
+        DocumentTag.objects.order_by()
+        .values('document__uploader_id', 'tag_id')
+        .annotate(total=Count('id'))
+    )
+    with transaction.atomic():
+        UserTagCount.objects.all().delete()
+        counts = UserTagCount.objects.bulk_create(
+            [UserTagCount(user_id=row['document__uploader_id'], tag_id=row['tag_id'], count=row['total'])
+             for row in rows],
+            batch_size=500,
+        )
+    return len(counts)
+
+
+def convert_legacy_tags(batch_size=500, stdout=None):
+    """Fill DocumentTag from the comma-separated tag_names column.
+
+    Only documents with tag_names but no DocumentTag rows are converted, so
+    the conversion can be re-run safely. Returns the number converted.
+    """
+    pending = (
+        Document.objects.exclude(tag_names='')
+        .filter(document_tags__isnull=True)
+        .order_by('pk')
+    )
+    converted = 0
+    for document in pending.iterator(chunk_size=batch_size):
+        set_document_tags(document, split_tags(document.tag_names))
+        converted += 1
+        if stdout and converted % batch_size == 0:
+            stdout.write(f"  converted {converted} documents")
+    return converted
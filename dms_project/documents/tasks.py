@@ -0,0 +1,17 @@
+# documents/tasks.py
+from jobs.registry import task
+
+from .blobstore import collect_garbage
+from .models import Blob
+from .previews import build_preview
+
+
+@task('documents.build_preview')
+def build_document_preview(document_id, file_name):
+    build_preview(document_id, file_name)
+
+
+@task('documents.collect_blob')
+def collect_blob(blob_id):
+    """Delete a blob's file once nothing references it (queued by release_blob)"""
+    collect_garbage(Blob.objects.filter(pk=blob_id))
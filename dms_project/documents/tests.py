@@ -1,3 +1,793 @@
-from django.test import TestCase
+# documents/tests.py
+import difflib
+import io
+import os
+import shutil
+import tempfile
+import urllib.error
+import urllib.request
+import uuid
+from contextlib import nullcontext
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import models
+from django.db.models import Count
+from django.db.models.signals import post_delete, pre_delete
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import path
+
+from access.models import DocumentGrant
+from accounts.stats import GLOBAL, get_counters, reconcile, user_scope
+from dms_project import urls as project_urls
+from dms_project.cache import SHARED_SCOPE, generation, get_cache
+from dms_project.storage.s3 import S3Storage
+from dms_project.storage.server import start_server
+from dms_project.storage.tiered import TieredStorage
+from dms_project.testing import QueryPlanTestCase
+from jobs.models import Job
+from jobs.queue import claim
+from jobs.worker import execute
+from review.models import Review, ReviewAssignment
+from . import delta, views
+from .blobstore import acquire_blobs, collect_garbage, write_blob
+from .bulk import _fill_pks, delete_documents, set_category
+from .models import Blob, Document, DocumentPreview, DocumentTag, DocumentVersion, UploadSession, UserTagCount
+from .tags import convert_legacy_tags, retag_documents, set_document_tags, user_tags
+from .uploads import ChunkRejected, append_chunk, finalize_session, start_session
+from .versions import open_version
+
+try:
+    from PIL import Image
+except ImportError:  # optional dependency, as in documents/previewers.py
+    Image = None
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+# The ASGI profile's URLconf for AsyncViewQueryTests: the async views take
+# over their URLs, names still reverse through the project URLconf
+urlpatterns = [
+    path('documents/upload/', views.upload_document_async),
+    path('documents/<int:doc_id>/download/', views.download_document_async),
+] + project_urls.urlpatterns
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DocumentViewQueryTests(QueryPlanTestCase):
+    """Query budgets and plans for the documents views"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='pw-12345!')
+        self.other = User.objects.create_user('other', password='pw-12345!')
+        self.document = self.add_document(self.user, 'first')
+        self.add_document(self.other, 'not mine')
+        self.client.login(username='owner', password='pw-12345!')
+
+    def add_document(self, user, title, content=None):
+        return Document.objects.create(
+            title=title,
+            uploader=user,
+            file=SimpleUploadedFile(f'{title}.txt', (content or title).encode()),
+        )
+
+    def add_documents(self, count=3):
+        for i in range(count):
+            self.add_document(self.user, f'extra {i}', content=f'extra content {i}')
+
+    def test_my_documents(self):
+        self.assertEfficientView('/documents/my-documents/', 3, grow=self.add_documents)
+
+    def add_rejections(self):
+        for i in range(2):
+            reviewer = User.objects.create_user(f'reviewer{Review.objects.count()}')
+            Review.objects.create(document=self.document, reviewer=reviewer, status='rejected', comments='no')
+
+    # Views that fetch a document go through access/policy.py: one more
+    # query, for the user's grants (cached, but budgets are measured cold)
+    def test_document_detail(self):
+        self.document.status = 'rejected'
+        self.document.save()
+        self.add_rejections()
+        response = self.assertEfficientView(f'/documents/{self.document.pk}/', 6, grow=self.add_rejections)
+        self.assertEqual(response.context['last_rejection'].status, 'rejected')
+
+    def test_preview(self):
+        image = default_storage.save(f'{self.document.file.name}.preview.png', ContentFile(b'png'))
+        DocumentPreview.objects.filter(document=self.document).update(status='done', kind='image', image=image)
+        response = self.assertEfficientView(f'/documents/{self.document.pk}/preview/', 4)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(b''.join(response.streaming_content), b'png')
+
+    def test_download(self):
+        response = self.assertEfficientView(f'/documents/{self.document.pk}/download/', 4)
+        self.assertEqual(b''.join(response.streaming_content), b'first')
+
+    def test_upload_form(self):
+        self.assertEfficientView('/documents/upload/', 2)
+
+    def test_upload(self):
+        self.assertEfficientView('/documents/upload/', 23, method='post', status=302, data={
+            'title': 'new',
+            'description': 'desc',
+            'author': 'me',
+            'category': 'other',
+            'file': SimpleUploadedFile('new.txt', b'new content'),
+        })
+        self.assertTrue(Document.objects.filter(title='new').exists())
+
+    def test_upload_initiate(self):
+        self.assertEfficientView('/documents/uploads/', 3, method='post', status=201, data={
+            'title': 'big',
+            'file_name': 'big.txt',
+            'total_size': 10,
+        })
+
+    # Deleting also cascades to the document's grants and versions, releasing
+    # the blobs the versions hold
+    def test_delete(self):
+        self.assertEfficientView(f'/documents/{self.document.pk}/delete/', 25, method='post', status=302)
+        self.assertFalse(Document.objects.filter(pk=self.document.pk).exists())
+
+    def bulk_files(self, count):
+        return [SimpleUploadedFile(f'bulk{i}.txt', f'bulk content {i}'.encode()) for i in range(count)]
+
+    def test_bulk_upload(self):
+        response = self.assertEfficientView('/documents/bulk/upload/', 26, method='post', data={
+            'files': self.bulk_files(2),
+            'category': 'report',
+            'selected_tags': ['draft'],
+        })
+        self.assertEqual(response.context['created'], 2)
+        # Set-based: more files in the batch cost no more queries
+        _, queries = self.capture('/documents/bulk/upload/', 'post', {
+            'files': self.bulk_files(8), 'category': 'report', 'selected_tags': ['draft'],
+        })
+        self.assertLessEqual(len(queries), 26)
+        self.assertEqual(Document.objects.filter(uploader=self.user, category='report').count(), 10)
+
+    def test_bulk_actions(self):
+        self.add_documents(6)
+        ids = list(Document.objects.filter(uploader=self.user).values_list('pk', flat=True))
+        for data, budget in [
+            ({'action': 'add_tags', 'tags': ['urgent', 'final']}, 14),
+            ({'action': 'remove_tags', 'tags': ['urgent']}, 11),
+            ({'action': 'category', 'category': 'invoice'}, 9),
+            # QuerySet.delete() loads the rows with delete receivers, one query per table
+            ({'action': 'delete'}, 34),
+        ]:
+            self.assertEfficientView('/documents/bulk/', budget, method='post', status=302,
+                                     data={'documents': ids, **data})
+        self.assertFalse(Document.objects.filter(uploader=self.user).exists())
+
+
+@async_to_sync
+async def read_async(response):
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, ROOT_URLCONF=__name__, DOWNLOAD_CHUNK_SIZE=4)
+class AsyncViewQueryTests(QueryPlanTestCase):
+    """The async views of the ASGI profile answer like the sync ones, on the same budgets"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='pw-12345!')
+        self.other = User.objects.create_user('other', password='pw-12345!')
+        self.document = Document.objects.create(
+            title='first', uploader=self.user,
+            file=SimpleUploadedFile('first.txt', b'first document'),
+        )
+        self.client.login(username='owner', password='pw-12345!')
+
+    def test_download(self):
+        url = f'/documents/{self.document.pk}/download/'
+        response = self.assertEfficientView(url, 4)
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Length'], '14')
+        self.assertEqual(read_async(response), b'first document')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=6-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 6-13/14')
+        self.assertEqual(read_async(response), b'document')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        empty = Document.objects.create(title='empty', uploader=self.user, file=SimpleUploadedFile('empty.txt', b''))
+        response = self.client.get(f'/documents/{empty.pk}/download/', HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */0')
+
+    def test_download_permissions(self):
+        self.client.login(username='other', password='pw-12345!')
+        self.assertEfficientView(f'/documents/{self.document.pk}/download/', 5, status=302)
+        self.assertEfficientView('/documents/999999/download/', 5, status=404)
+        self.client.logout()
+        response = self.client.get(f'/documents/{self.document.pk}/download/')
+        self.assertRedirects(response, f'/accounts/login/?next=/documents/{self.document.pk}/download/',
+                             fetch_redirect_response=False)
+
+    def test_upload(self):
+        self.assertEfficientView('/documents/upload/', 2)
+        self.assertEfficientView('/documents/upload/', 23, method='post', status=302, data={
+            'title': 'new',
+            'description': 'desc',
+            'author': 'me',
+            'category': 'other',
+            'file': SimpleUploadedFile('new.txt', b'new content'),
+        })
+        self.assertTrue(Document.objects.filter(title='new', uploader=self.user).exists())
+
+
+def numbered_lines(count, changed=()):
+    return b''.join(
+        (b'changed %d\n' if i in changed else b'line %d\n') % i for i in range(count)
+    )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CachedPageTests(TestCase):
+    """Writes move the generation, so cached pages are never served stale"""
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user('owner', password='pw-12345!')
+        self.document = Document.objects.create(
+            title='alpha', uploader=self.user, file=SimpleUploadedFile('alpha.txt', b'alpha'),
+        )
+        self.client.login(username='owner', password='pw-12345!')
+
+    def page(self):
+        return self.client.get('/documents/my-documents/').content.decode()
+
+    def test_writes_bump_the_generations(self):
+        for write in [
+            lambda: self.document.save(),
+            lambda: set_document_tags(self.document, ['draft']),
+            lambda: set_category(Document.objects.all(), 'report'),
+            lambda: delete_documents(Document.objects.all()),
+        ]:
+            mine, shared = generation(self.user.pk), generation(SHARED_SCOPE)
+            write()
+            self.assertGreater(generation(self.user.pk), mine)
+            self.assertGreater(generation(SHARED_SCOPE), shared)
+
+    def test_stale_page_is_not_served(self):
+        self.page()  # sets the CSRF cookie: a response that sets cookies is not stored
+        self.assertIn('alpha', self.page())
+        # A write that bypasses the signals is not seen: the page came from the cache
+        Document.objects.filter(pk=self.document.pk).update(title='unseen')
+        self.assertIn('alpha', self.page())
+
+        self.document.title = 'beta'
+        self.document.save()
+        page = self.page()
+        self.assertIn('beta', page)
+        self.assertNotIn('alpha', page)
+
+        delete_documents(Document.objects.all())
+        self.assertNotIn('beta', self.page())
+
+    def test_shared_page_follows_the_owner(self):
+        # The grantee's search page shows the owner's document: it expires with the shared generation
+        User.objects.create_user('reader', password='pw-12345!')
+        DocumentGrant.objects.create(user=User.objects.get(username='reader'), document=self.document)
+        self.client.login(username='reader', password='pw-12345!')
+        self.client.get('/search/')
+        self.assertIn('alpha', self.client.get('/search/').content.decode())
+
+        self.document.title = 'beta'
+        self.document.save()
+        self.assertIn('beta', self.client.get('/search/').content.decode())
+
+    def test_other_users_keep_their_pages(self):
+        other = User.objects.create_user('other')
+        theirs = generation(other.pk)
+        self.document.save()
+        self.assertEqual(generation(other.pk), theirs)
+
+
+def run_jobs():
+    while (ids := claim(10)):
+        for job_id in ids:
+            execute(job_id)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class PreviewTests(TestCase):
+    """The preview job and what the detail page shows of its result"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='pw-12345!')
+        self.client.login(username='owner', password='pw-12345!')
+
+    def add_document(self, name, content):
+        return Document.objects.create(title=name, uploader=self.user, file=SimpleUploadedFile(name, content))
+
+    def detail(self, document):
+        response = self.client.get(f'/documents/{document.pk}/')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_text_snippet(self):
+        document = self.add_document('notes.txt', b'Quarterly figures attached')
+        self.assertIn('The preview is being generated.', self.detail(document))
+        run_jobs()
+        preview = DocumentPreview.objects.get(document=document)
+        self.assertEqual((preview.status, preview.kind, preview.snippet), ('done', 'text', 'Quarterly figures attached'))
+        self.assertIn('Quarterly figures attached', self.detail(document))
+
+    @skipUnless(Image, "Pillow is not installed")
+    def test_image_thumbnail(self):
+        png = io.BytesIO()
+        Image.new('RGB', (800, 600), 'navy').save(png, 'PNG')
+        document = self.add_document('photo.png', png.getvalue())
+        run_jobs()
+        preview = DocumentPreview.objects.get(document=document)
+        self.assertEqual((preview.status, preview.kind), ('done', 'image'))
+        with default_storage.open(preview.image) as fileobj, Image.open(fileobj) as thumbnail:
+            self.assertLessEqual(max(thumbnail.size), 320)
+        self.assertIn(f'/documents/{document.pk}/preview/', self.detail(document))
+        self.assertEqual(self.client.get(f'/documents/{document.pk}/preview/').status_code, 200)
+
+    @skipUnless(Image, "Pillow is not installed")
+    def test_failed_preview_leaves_the_page_usable(self):
+        document = self.add_document('broken.png', b'\x89PNG\r\n\x1a\n not an image')
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            run_jobs()
+        preview = DocumentPreview.objects.get(document=document)
+        self.assertEqual(preview.status, 'failed')
+        self.assertTrue(preview.error)
+        # Retried later with backoff
+        job = Job.objects.get(name='documents.build_preview')
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('No preview available for this file.', self.detail(document))
+        self.assertEqual(self.client.get(f'/documents/{document.pk}/preview/').status_code, 404)
+
+
+class DeltaTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        base = numbered_lines(500)
+        target = numbered_lines(500, changed={3, 250}) + b'tail without newline'
+        out = io.BytesIO()
+        self.assertTrue(delta.encode(io.BytesIO(base), io.BytesIO(target), out))
+        self.assertLess(len(out.getvalue()), len(target) // 10)
+        rebuilt = io.BytesIO()
+        delta.apply(io.BytesIO(base), io.BytesIO(out.getvalue()), rebuilt)
+        self.assertEqual(rebuilt.getvalue(), target)
+        # Over the limit: not worth storing
+        self.assertFalse(delta.encode(io.BytesIO(base), io.BytesIO(target), io.BytesIO(), limit=10))
+        with self.assertRaises(delta.DeltaError):
+            delta.apply(io.BytesIO(base), io.BytesIO(out.getvalue()[:-3]), io.BytesIO())
+
+    def test_unified_diff_matches_difflib(self):
+        a = numbered_lines(40)
+        b = numbered_lines(40, changed={5, 30})
+        ours = b''.join(delta.unified_diff(io.BytesIO(a), io.BytesIO(b), 'a', 'b'))
+        expected = difflib.diff_bytes(difflib.unified_diff, a.splitlines(True), b.splitlines(True), b'a', b'b')
+        self.assertEqual(ours, b''.join(expected))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BlobStoreTests(TestCase):
+
+    def test_lost_file_is_written_again(self):
+        user = User.objects.create_user('owner')
+        first = Document.objects.create(title='a', uploader=user, file=SimpleUploadedFile('a.txt', b'same'))
+        default_storage.delete(first.file.name)
+        second = Document.objects.create(title='b', uploader=user, file=SimpleUploadedFile('b.txt', b'same'))
+        self.assertEqual(second.blob_id, first.blob_id)
+        self.assertEqual(Blob.objects.get().refcount, 2)
+        with default_storage.open(second.file.name) as f:
+            self.assertEqual(f.read(), b'same')
+
+    def test_collected_between_write_and_acquire(self):
+        user = User.objects.create_user('owner')
+        Document.objects.create(title='a', uploader=user, file=SimpleUploadedFile('a.txt', b'same')).delete()
+        # The bulk path: write_blob finds the unreferenced file and keeps it...
+        sha256, size = write_blob(io.BytesIO(b'same'))
+        # ...garbage collection takes row and file before the references...
+        self.assertEqual(collect_garbage(), (1, 4))
+        # ...and acquiring writes the file again from the source
+        blob = acquire_blobs({sha256: (size, 1)}, {sha256: lambda: nullcontext(io.BytesIO(b'same'))})[sha256]
+        self.assertEqual(blob.refcount, 1)
+        with default_storage.open(blob.file.name) as f:
+            self.assertEqual(f.read(), b'same')
+
+
+class BulkIngestTests(TestCase):
+
+    def test_ids_read_back_by_token(self):
+        # The same file uploaded twice at once, as the same user
+        user = User.objects.create_user('owner')
+        documents = [
+            Document(title=title, uploader=user, file='same.txt', original_filename='same.txt', bulk_token=uuid.uuid4())
+            for title in ('first', 'second')
+        ]
+        Document.objects.bulk_create(documents)
+        expected = {document.title: document.pk for document in documents}
+        # As on MySQL, whose bulk INSERT returns no ids
+        for document in documents:
+            document.pk = None
+        _fill_pks(documents[::-1])
+        self.assertEqual({document.title: document.pk for document in documents}, expected)
+
+
+class Trickle(io.BytesIO):
+    """A request body that arrives one byte per read"""
+
+    def read(self, size=-1):
+        return super().read(1)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ChunkedUploadTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner')
+
+    def start(self, file_name, total_size):
+        return start_session(UploadSession(
+            uploader=self.user, title=file_name, file_name=file_name, total_size=total_size,
+        ))
+
+    def test_signature_split_across_reads(self):
+        content = b'\x89PNG\r\n\x1a\n' + b'pixels' * 10
+        session = self.start('image.png', len(content))
+        self.assertEqual(append_chunk(session, 0, Trickle(content[:20]), 20), 20)
+        append_chunk(session, 20, io.BytesIO(content[20:]), len(content) - 20)
+        with finalize_session(session).file.open('rb') as f:
+            self.assertEqual(f.read(), content)
+
+    def test_second_finalize(self):
+        session = self.start('notes.txt', 5)
+        append_chunk(session, 0, io.BytesIO(b'notes'), 5)
+        document = finalize_session(session)
+        # A retry, e.g. after a lost response, from a fresh copy of the session
+        retried = UploadSession.objects.get(pk=session.pk)
+        retried.status = 'active'
+        self.assertEqual(finalize_session(retried), document)
+        self.assertEqual(Document.objects.count(), 1)
+        self.assertEqual(Blob.objects.get().refcount, 1)
+
+    def test_wrong_signature_aborts(self):
+        session = self.start('image.png', 40)
+        with self.assertRaises(ChunkRejected) as rejected:
+            append_chunk(session, 0, Trickle(b'GIF89a' + b'x' * 34), 40)
+        self.assertEqual(rejected.exception.status, 415)
+        self.assertEqual(UploadSession.objects.get().status, 'aborted')
+
+    def test_first_chunk_shorter_than_signature(self):
+        session = self.start('image.png', 40)
+        with self.assertRaises(ChunkRejected):
+            append_chunk(session, 0, io.BytesIO(b'\x89PNG'), 4)
+        self.assertEqual(UploadSession.objects.get().received_size, 0)
+
+
+# Models a bulk delete removes whose delete signals keep other data in step,
+# and the documents_bulk_deleting receiver doing that work set-based instead
+BULK_DELETE_HANDLED = {
+    Document: 'documents.signals.release_deleted_documents and the other receivers',
+    Review: 'accounts.signals.uncount_deleted_documents, review.signals.expire_reviewer_caches',
+    DocumentGrant: 'documents.signals.release_deleted_documents (shared cache generation)',
+}
+
+
+def reverse_relations(model):
+    return [
+        relation for relation in model._meta.get_fields(include_hidden=True)
+        if relation.auto_created and not relation.concrete and (relation.one_to_many or relation.one_to_one)
+    ]
+
+
+def cascade_models(model, seen=None):
+    seen = set() if seen is None else seen
+    seen.add(model)
+    for relation in reverse_relations(model):
+        if relation.on_delete is models.CASCADE and relation.related_model not in seen:
+            cascade_models(relation.related_model, seen)
+    return seen
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BulkDeleteTests(TestCase):
+    """delete_documents cascades like any delete, with derived data adjusted once"""
+
+    def test_every_relation_is_cleared(self):
+        user = User.objects.create_user('owner')
+        document = Document.objects.create(title='a', uploader=user, file=SimpleUploadedFile('a.txt', b'one'))
+        document.file = SimpleUploadedFile('a.txt', b'two')
+        document.save()
+        set_document_tags(document, ['draft'])
+        Review.objects.create(document=document, reviewer=user, status='approved')
+        ReviewAssignment.objects.create(document=document, assigned_to=user)
+        DocumentGrant.objects.create(user=User.objects.create_user('reader'), document=document)
+        UploadSession.objects.create(uploader=user, title='a', file_name='a.txt', total_size=3, document=document)
+        get_counters(GLOBAL)
+        get_counters(user_scope(user.pk))
+
+        relations = reverse_relations(Document)
+        # A relation added to Document needs a row here, so the delete below covers it
+        for relation in relations:
+            related = relation.related_model._base_manager.filter(**{relation.field.name: document})
+            self.assertTrue(related.exists(), f"no {relation.related_model.__name__} row in this test")
+
+        self.assertEqual(delete_documents(Document.objects.filter(pk=document.pk)), 1)
+        for relation in relations:
+            related = relation.related_model._base_manager.filter(**{f'{relation.field.name}_id': document.pk})
+            self.assertFalse(related.exists(), relation.related_model.__name__)
+        self.assertIsNone(UploadSession.objects.get().document_id)
+        # Per-row receivers skipped what the bulk receivers did: nothing counted twice
+        self.assertEqual(reconcile(), 0)
+        self.assertFalse(Blob.objects.filter(refcount__gt=0).exists())
+        self.assertFalse(UserTagCount.objects.filter(count__gt=0).exists())
+
+    def test_delete_signals_have_bulk_receivers(self):
+        # Per-row delete receivers are skipped (bulk_deleting): derived data they
+        # keep needs a documents_bulk_deleting receiver doing the same
+        for model in cascade_models(Document):
+            if pre_delete.has_listeners(model) or post_delete.has_listeners(model):
+                self.assertIn(model, BULK_DELETE_HANDLED, f"{model.__name__} has delete receivers")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class TagTests(TestCase):
+    """DocumentTag links and the UserTagCount facet counts"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+
+    def add_document(self, title, tag_names=''):
+        return Document.objects.create(
+            title=title, uploader=self.owner, tag_names=tag_names, file=SimpleUploadedFile('a.txt', b'x'),
+        )
+
+    def links(self, document):
+        return sorted(DocumentTag.objects.filter(document=document).values_list('tag__name', flat=True))
+
+    def assertCountsMatchLinks(self):
+        expected = (
+            DocumentTag.objects.filter(document__uploader=self.owner)
+            .order_by('tag__name').values_list('tag__name').annotate(total=Count('id'))
+        )
+        self.assertEqual(user_tags(self.owner), list(expected))
+
+    def test_convert_legacy_tags(self):
+        # Rows written before DocumentTag existed: only the comma-separated column
+        legacy = self.add_document('legacy', ' Finance, tax,,finance ')
+        untagged = self.add_document('untagged')
+        converted = self.add_document('converted')
+        set_document_tags(converted, ['tax'])
+
+        self.assertEqual(convert_legacy_tags(), 1)
+        legacy.refresh_from_db()
+        self.assertEqual(self.links(legacy), ['finance', 'tax'])
+        self.assertEqual(legacy.tag_names, 'finance,tax')
+        self.assertEqual(self.links(untagged), [])
+        self.assertEqual(user_tags(self.owner), [('finance', 1), ('tax', 2)])
+        self.assertCountsMatchLinks()
+        # Already converted: nothing left to do
+        self.assertEqual(convert_legacy_tags(), 0)
+
+    def test_counts_follow_edits(self):
+        first, second = self.add_document('first'), self.add_document('second')
+        set_document_tags(first, ['draft', 'tax'])
+        set_document_tags(second, ['Draft'])
+        self.assertEqual(user_tags(self.owner), [('draft', 2), ('tax', 1)])
+
+        set_document_tags(first, ['tax', 'final'])
+        self.assertEqual(user_tags(self.owner), [('draft', 1), ('final', 1), ('tax', 1)])
+        self.assertEqual(Document.objects.get(pk=first.pk).tag_names, 'tax,final')
+
+        retag_documents(Document.objects.all(), add=['final'], remove=['draft'])
+        self.assertEqual(user_tags(self.owner), [('final', 2), ('tax', 1)])
+        self.assertCountsMatchLinks()
+
+        first.delete()
+        self.assertEqual(user_tags(self.owner), [('final', 1)])
+        delete_documents(Document.objects.all())
+        self.assertEqual(user_tags(self.owner), [])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DocumentVersionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='pw-12345!')
+        self.document = Document.objects.create(
+            title='notes', uploader=self.user, file=SimpleUploadedFile('notes.txt', numbered_lines(300)),
+        )
+
+    def replace(self, content, name='notes.txt'):
+        self.document.file = SimpleUploadedFile(name, content)
+        self.document.save()
+
+    def assertRefcountsExact(self):
+        blobs = Blob.objects.annotate(docs=Count('documents', distinct=True), vers=Count('versions', distinct=True))
+        for blob in blobs:
+            self.assertEqual(blob.refcount, blob.docs + blob.vers, blob)
+
+    def test_history(self):
+        v2 = numbered_lines(300, changed={100})
+        v4 = numbered_lines(300, changed={100, 200})
+        self.replace(v2)
+        self.replace(v2)  # unchanged
+        self.replace(v4)
+        self.replace(b'%PDF-1.4 binary', name='notes.pdf')
+        versions = {v.number: v for v in DocumentVersion.objects.filter(document=self.document)}
+        self.assertEqual([(n, v.storage, v.depth) for n, v in sorted(versions.items())], [
+            (1, 'full', 0), (2, 'delta', 1), (3, 'delta', 1), (4, 'delta', 2), (5, 'full', 0),
+        ])
+        self.assertEqual(versions[3].blob_id, versions[2].blob_id)
+        self.assertRefcountsExact()
+
+        # The v2 content is no longer a blob once collected: it is rebuilt from v1
+        collect_garbage()
+        self.assertFalse(Blob.objects.filter(sha256=versions[2].sha256).exists())
+        with open_version(versions[2]) as rebuilt:
+            self.assertEqual(rebuilt.read(), v2)
+        with open_version(versions[4]) as rebuilt:
+            self.assertEqual(rebuilt.read(), v4)
+
+        self.client.login(username='owner', password='pw-12345!')
+        response = self.client.get(f'/documents/{self.document.pk}/versions/4/download/')
+        self.assertEqual(b''.join(response.streaming_content), v4)
+        self.assertEqual(response['ETag'], f'"{versions[4].sha256}"')
+
+        response = self.client.get(f'/documents/{self.document.pk}/versions/diff/', {'from': 2, 'to': 4})
+        diff = b''.join(response.streaming_content)
+        self.assertIn(b'-line 200\n+changed 200\n', diff)
+        self.assertNotIn(b'line 100', diff)
+        response = self.client.get(f'/documents/{self.document.pk}/versions/diff/')
+        self.assertIn(b'Binary versions differ', b''.join(response.streaming_content))
+
+        self.document.delete()
+        self.assertRefcountsExact()
+        collect_garbage()
+        self.assertFalse(Blob.objects.exists())
+
+
+class ObjectStorageTests(TestCase):
+    """The S3 backend against the local stand-in (dms_project/storage/server.py)"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.root, ignore_errors=True)
+        cls.server = start_server(cls.root, 'test-key', 'test-secret', bucket='dms')
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+        cls.enterClassContext(override_settings(
+            MEDIA_ROOT=MEDIA_ROOT,
+            STORAGES={'default': {'BACKEND': 'dms_project.storage.s3.S3Storage'}},
+            OBJECT_STORAGE={'ENDPOINT_URL': cls.server.endpoint_url, 'BUCKET': 'dms',
+                            'ACCESS_KEY': 'test-key', 'SECRET_KEY': 'test-secret'},
+        ))
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='pw-12345!')
+        self.bucket = os.path.join(self.root, 'dms')
+        shutil.rmtree(self.bucket, ignore_errors=True)
+        os.makedirs(self.bucket)
+
+    def objects(self):
+        return sorted(os.path.relpath(os.path.join(d, name), self.bucket)
+                      for d, _, names in os.walk(self.bucket) for name in names)
+
+    def test_storage_api(self):
+        storage = S3Storage()
+        connections = self.server.connections
+        self.assertEqual(storage.save('a/b.txt', ContentFile(b'0123456789')), 'a/b.txt')
+        self.assertTrue(storage.exists('a/b.txt'))
+        self.assertFalse(storage.exists('a/missing.txt'))
+        self.assertEqual(storage.size('a/b.txt'), 10)
+        self.assertEqual(storage.listdir('a'), ([], ['b.txt']))
+        self.assertEqual(storage.listdir(''), (['a'], []))
+        with storage.open('a/b.txt') as f:
+            f.seek(4)
+            self.assertEqual(f.read(3), b'456')
+            self.assertEqual(f.read(), b'789')
+        storage.delete('a/b.txt')
+        self.assertFalse(storage.exists('a/b.txt'))
+        # Every call went over one kept-alive connection
+        self.assertEqual(storage.client.pool.created, 1)
+        self.assertEqual(self.server.connections - connections, 1)
+
+    def test_multipart_upload(self):
+        storage = S3Storage(multipart_threshold=10, part_size=4)
+        storage.save('big.bin', ContentFile(b'x' * 11 + b'y' * 11))
+        with storage.open('big.bin') as f:
+            self.assertEqual(f.read(), b'x' * 11 + b'y' * 11)
+        self.assertEqual(os.listdir(os.path.join(self.root, '.uploads')), [])
+
+    def test_presigned_url(self):
+        storage = S3Storage()
+        storage.save('report.txt', ContentFile(b'signed'))
+        url = storage.url('report.txt', filename='Q3 report.txt')
+        with urllib.request.urlopen(url) as response:
+            self.assertEqual(response.read(), b'signed')
+            self.assertIn('Q3 report.txt', response.headers['Content-Disposition'])
+        with self.assertRaises(urllib.error.HTTPError) as caught:
+            urllib.request.urlopen(url.replace('report.txt?', 'other.txt?'))
+        self.assertEqual(caught.exception.code, 403)
+
+    def test_documents(self):
+        document = Document.objects.create(
+            title='notes', uploader=self.user, file=SimpleUploadedFile('notes.txt', b'stored remotely'),
+        )
+        self.assertEqual(self.objects(), [document.file.name])
+        self.client.login(username='owner', password='pw-12345!')
+        response = self.client.get(f'/documents/{document.pk}/download/')
+        self.assertEqual(b''.join(response.streaming_content), b'stored remotely')
+        # The web server cannot read the object store: X-Sendfile falls back to streaming
+        with self.settings(DOWNLOAD_OFFLOAD='x-sendfile'):
+            response = self.client.get(f'/documents/{document.pk}/download/')
+        self.assertNotIn('X-Sendfile', response)
+        self.assertEqual(b''.join(response.streaming_content), b'stored remotely')
+        with self.settings(DOWNLOAD_OFFLOAD='presigned'):
+            response = self.client.get(f'/documents/{document.pk}/download/')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('no-store', response['Cache-Control'])
+        with urllib.request.urlopen(response['Location']) as direct:
+            self.assertEqual(direct.read(), b'stored remotely')
+
+        # Resubmissions keep text deltas in the object store too
+        document.file = SimpleUploadedFile('notes.txt', numbered_lines(50))
+        document.save()
+        document.file = SimpleUploadedFile('notes.txt', numbered_lines(50, changed={10}))
+        document.save()
+        version = DocumentVersion.objects.get(document=document, number=3)
+        self.assertEqual(version.storage, DocumentVersion.DELTA)
+        collect_garbage()
+        with open_version(DocumentVersion.objects.get(document=document, number=2)) as rebuilt:
+            self.assertEqual(rebuilt.read(), numbered_lines(50))
+
+        document.delete()
+        collect_garbage()
+        self.assertEqual(self.objects(), [])
+
+    def test_chunked_upload(self):
+        content = b'chunked ' * 10
+        session = start_session(UploadSession(
+            uploader=self.user, title='chunked', file_name='chunked.txt', total_size=len(content),
+        ))
+        append_chunk(session, 0, io.BytesIO(content[:30]), 30)
+        append_chunk(session, 30, io.BytesIO(content[30:]), len(content) - 30)
+        document = finalize_session(session)
+        with document.file.open('rb') as f:
+            self.assertEqual(f.read(), content)
+        # The chunk objects are gone once joined
+        self.assertEqual(self.objects(), [document.file.name])
+
+    def test_tiered(self):
+        hot = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, hot, ignore_errors=True)
+        storage = TieredStorage(location=hot, max_bytes=0)
+        storage.save('a.txt', ContentFile(b'hot and cold'))
+        self.assertTrue(os.path.exists(os.path.join(hot, 'a.txt')))
+        self.assertEqual(storage.evict(), (1, 12))
+        self.assertFalse(os.path.exists(os.path.join(hot, 'a.txt')))
+        # Read again from the object store, and hot once more
+        with storage.open('a.txt') as f:
+            self.assertEqual(f.read(), b'hot and cold')
+        self.assertTrue(os.path.exists(os.path.join(hot, 'a.txt')))
+        storage.delete('a.txt')
+        self.assertFalse(S3Storage().exists('a.txt'))
+
+        # A hot copy left behind after another node deleted the object is not the file
+        storage.save('b.txt', ContentFile(b'gone elsewhere'))
+        S3Storage().delete('b.txt')
+        self.assertFalse(storage.exists('b.txt'))
@@ -0,0 +1,244 @@
+# documents/uploads.py
+"""Chunked, resumable uploads: initiate, append chunks, finalize.
+
+Each chunk is streamed from the request straight onto the end of the
+session's part file in MEDIA_ROOT while its SHA-256 is computed, so a worker
+never holds more than one read buffer of the upload in memory. Size and
+content checks run as bytes arrive; a chunk whose checksum does not match is
+cut off again and the client simply retries from the last good offset.
+Chunks for one session are appended under a lock on its row, one at a time.
+
+An object store cannot append, so there each accepted chunk becomes an
+object of its own under `<part_name>/<offset>` (spooled to a temporary file
+while it is checked), and finalizing joins them into the blob store.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from dms_project.storage import COPY_CHUNK_SIZE, local_path
+from .blobstore import store_path
+from .models import Document, UploadSession, document_upload_path
+from .tags import set_document_tags, split_tags
+from .validators import SNIFF_LENGTH, file_extension, validate_content
+
+READ_SIZE = 64 * 1024
+
+
+class ChunkRejected(Exception):
+    """The chunk was not appended; `offset` is where the client should resume"""
+
+    def __init__(self, message, offset, status=400):
+        super().__init__(message)
+        self.offset = offset
+        self.status = status
+
+
+def max_chunk_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+
+
+def start_session(session):
+    """Save a new session and create its empty part file"""
+    session.part_name = document_upload_path(session, f'.{session.id}.part')
+    path = local_path(default_storage, session.part_name)
+    if path is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+    session.save()
+    return session
+
+
+def append_chunk(session, offset, stream, length, checksum=None):
+    """Append `length` bytes read from `stream` at `offset`; return the new offset"""
+    if session.status != 'active':
+        raise ChunkRejected("Upload is no longer active.", session.received_size, status=409)
+    if offset != session.received_size:
+        raise ChunkRejected("Chunk does not start at the current offset.", session.received_size, status=409)
+    if length <= 0 or length > max_chunk_size():
+        raise ChunkRejected(f"Chunks must be 1 to {max_chunk_size()} bytes.", offset)
+    if offset + length > session.total_size:
+        raise ChunkRejected("Chunk goes past the declared file size.", offset)
+
+    path = local_path(default_storage, session.part_name)
+    try:
+        # The row lock serializes PUTs for the same upload: only one writes the part at a time
+        with transaction.atomic():
+            _lock(session, offset)
+            if path is None:
+                with tempfile.SpooledTemporaryFile(max_size=READ_SIZE * 16) as part:
+                    _receive(session, offset, stream, length, checksum, part, 0)
+                    part.seek(0)
+                    default_storage.save(chunk_name(session, offset), File(part, session.part_name))
+            else:
+                with open(path, 'r+b') as part:
+                    part.seek(offset)
+                    _receive(session, offset, stream, length, checksum, part, offset)
+            return _advance(session, offset, length)
+    except ChunkRejected as exc:
+        if exc.status == 415:
+            abort_session(session)  # after the rollback, so the abort sticks
+        raise
+
+
+def chunk_name(session, offset):
+    """The object holding the chunk at `offset`, when the storage cannot append"""
+    return f'{session.part_name}/{offset:015d}'
+
+
+def _lock(session, offset):
+    """Lock the session row and re-check that the chunk still fits at `offset`"""
+    current = UploadSession.objects.select_for_update().filter(pk=session.pk).values_list(
+        'status', 'received_size'
+    ).first()
+    if current is None or current[0] != 'active':
+        raise ChunkRejected("Upload is no longer active.", session.received_size, status=409)
+    session.received_size = current[1]
+    if offset != current[1]:
+        raise ChunkRejected("Chunk does not start at the current offset.", current[1], status=409)
+
+
+def _receive(session, offset, stream, length, checksum, part, start):
+    """Copy and check a chunk into `part` at `start`; cut off again if rejected"""
+    digest = hashlib.sha256()
+    written = 0
+    # The first bytes of the file are held back until the longest signature has arrived
+    head = b'' if offset == 0 else None
+    sniff_length = min(SNIFF_LENGTH, session.total_size)
+    try:
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                break
+            digest.update(data)
+            written += len(data)
+            if head is not None:
+                head += data
+                if len(head) < sniff_length:
+                    continue
+                validate_content(file_extension(session.file_name), head[:SNIFF_LENGTH])
+                data, head = head, None
+            part.write(data)
+    except ValidationError as exc:
+        part.truncate(start)
+        raise ChunkRejected(exc.messages[0], offset, status=415)
+
+    if head is not None and written == length:
+        raise ChunkRejected(f"The first chunk must be at least {sniff_length} bytes.", offset)
+    if written != length:
+        part.truncate(start)
+        raise ChunkRejected("Connection closed before the chunk was complete.", offset)
+    if checksum and digest.hexdigest() != checksum.lower():
+        part.truncate(start)
+        raise ChunkRejected("Chunk checksum mismatch.", offset)
+
+
+def _advance(session, offset, length):
+    new_offset = offset + length
+    updated = UploadSession.objects.filter(
+        pk=session.pk, status='active', received_size=offset
+    ).update(received_size=new_offset, updated_at=timezone.now())
+    if not updated:
+        session.refresh_from_db()
+        raise ChunkRejected("Upload changed concurrently.", session.received_size, status=409)
+    session.received_size = new_offset
+    return new_offset
+
+
+def _chunk_names(session):
+    try:
+        _, names = default_storage.listdir(session.part_name)
+    except FileNotFoundError:
+        return []
+    return [f'{session.part_name}/{name}' for name in sorted(names)]
+
+
+def _join_chunks(session):
+    """The chunk objects joined into one local temporary file; returns its path"""
+    with tempfile.NamedTemporaryFile(delete=False) as joined:
+        for name in _chunk_names(session):
+            with default_storage.open(name, 'rb') as chunk:
+                shutil.copyfileobj(chunk, joined, COPY_CHUNK_SIZE)
+    return joined.name
+
+
+def finalize_session(session):
+    """Turn a completely received upload into a Document.
+
+    Runs under the session's row lock: a repeated or concurrent finalize
+    gets the document the first one made.
+    """
+    with transaction.atomic():
+        locked = UploadSession.objects.select_for_update().select_related('document').get(pk=session.pk)
+        session.status, session.received_size = locked.status, locked.received_size
+        if locked.status == 'complete' and locked.document is not None:
+            session.document = locked.document
+            return locked.document
+        if session.status != 'active':
+            raise ValidationError("Upload is no longer active.")
+        if session.received_size != session.total_size:
+            raise ValidationError(f"Upload incomplete: {session.received_size} of {session.total_size} bytes received.")
+
+        document = Document(
+            title=session.title,
+            description=session.description,
+            author=session.author,
+            category=session.category,
+            uploader=session.uploader,
+            file_type=file_extension(session.file_name),
+            file_size=session.total_size,
+        )
+        # The part file is hashed and moved into the blob store (or dropped as a duplicate)
+        path = local_path(default_storage, session.part_name)
+        if path is None:
+            path = _join_chunks(session)
+            if os.path.getsize(path) != session.total_size:
+                os.remove(path)
+                raise ValidationError("Upload incomplete: stored chunks are missing.")
+        blob = store_path(path)
+        document.blob = blob
+        document.file = blob.file.name
+        document.original_filename = os.path.basename(session.file_name)
+        document.save()
+        set_document_tags(document, split_tags(session.tags))
+
+        session.status = 'complete'
+        session.document = document
+        session.save(update_fields=['status', 'document', 'updated_at'])
+    _delete_chunks(session)
+    return document
+
+
+def _delete_chunks(session):
+    if local_path(default_storage, session.part_name) is None:
+        for name in _chunk_names(session):
+            default_storage.delete(name)
+
+
+def abort_session(session):
+    if local_path(default_storage, session.part_name) is None:
+        _delete_chunks(session)
+    elif default_storage.exists(session.part_name):
+        default_storage.delete(session.part_name)
+    session.status = 'aborted'
+    session.save(update_fields=['status', 'updated_at'])
+
+
+def purge_stale_sessions(max_age_hours=24):
+    """Abort active sessions that have not received a chunk in max_age_hours"""
+    cutoff = timezone.now() - timedelta(hours=max_age_hours)
+    stale = UploadSession.objects.filter(status='active', updated_at__lt=cutoff)
+    count = 0
+    for session in stale.iterator():
+        abort_session(session)
+        count += 1
+    return count
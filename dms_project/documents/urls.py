@@ -1,13 +1,27 @@
 # documents/urls.py
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# The ASGI profile (settings_asgi.py) serves the I/O-bound views with their
+# async versions. Under WSGI an async view would just get an event loop of
+# its own per request, so the sync ones stay the default.
+ASYNC_VIEWS = getattr(settings, 'ASYNC_VIEWS', False)
+
 app_name = 'documents'
 
 urlpatterns = [
-    path('upload/', views.upload_document, name='upload'),
+    path('upload/', views.upload_document_async if ASYNC_VIEWS else views.upload_document, name='upload'),
+    path('bulk/upload/', views.bulk_upload, name='bulk_upload'),
+    path('bulk/', views.bulk_action, name='bulk_action'),
+    path('uploads/', views.upload_initiate, name='upload_initiate'),
+    path('uploads/<uuid:session_id>/', views.upload_session, name='upload_session'),
+    path('uploads/<uuid:session_id>/finalize/', views.upload_finalize, name='upload_finalize'),
     path('my-documents/', views.my_documents, name='my_documents'),
     path('<int:doc_id>/', views.document_detail, name='detail'),
-    path('<int:doc_id>/download/', views.download_document, name='download'),
+    path('<int:doc_id>/preview/', views.document_preview, name='preview'),
+    path('<int:doc_id>/download/', views.download_document_async if ASYNC_VIEWS else views.download_document, name='download'),
     path('<int:doc_id>/delete/', views.delete_document, name='delete'),
+    path('<int:doc_id>/versions/<int:number>/download/', views.download_version, name='version_download'),
+    path('<int:doc_id>/versions/diff/', views.version_diff, name='version_diff'),
 ]
\ No newline at end of file
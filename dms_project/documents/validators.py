@@ -0,0 +1,71 @@
+# documents/validators.py
+"""Upload checks shared by the upload forms and the chunked upload API.
+
+The checks work on a file name, a size and the first bytes of the file, so
+they can run while data is still streaming in rather than after the whole
+upload has been buffered.
+"""
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+VALID_EXTENSIONS = ['pdf', 'docx', 'xlsx', 'txt', 'jpg', 'png']
+
+# Bytes needed to recognise any of the formats below
+SNIFF_LENGTH = 8
+
+MAGIC_NUMBERS = {
+    'pdf': [b'%PDF-'],
+    'docx': [b'PK\x03\x04'],
+    'xlsx': [b'PK\x03\x04'],
+    'jpg': [b'\xff\xd8\xff'],
+    'png': [b'\x89PNG\r\n\x1a\n'],
+}
+
+
+def max_upload_size():
+    """Cap for a single multipart upload (forms)"""
+    return getattr(settings, 'DOCUMENT_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+
+
+def max_chunked_upload_size():
+    """Cap for a file uploaded through the chunked API"""
+    return getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024)
+
+
+def file_extension(name):
+    return os.path.splitext(name)[1][1:].lower()
+
+
+def validate_extension(name):
+    ext = file_extension(name)
+    if ext not in VALID_EXTENSIONS:
+        raise ValidationError(f"Unsupported file format. Please upload: {', '.join(VALID_EXTENSIONS)}")
+    return ext
+
+
+def validate_size(size, limit):
+    if size > limit:
+        raise ValidationError(f"File size must be less than {limit // (1024 * 1024)}MB")
+
+
+def validate_content(ext, head):
+    """Check the first bytes of a file against what its extension promises"""
+    if ext == 'txt':
+        # Plain text: no NUL bytes in the sniffed prefix
+        if b'\x00' in head:
+            raise ValidationError("File content does not look like text.")
+        return
+    if not any(head.startswith(magic) for magic in MAGIC_NUMBERS[ext]):
+        raise ValidationError(f"File content does not match the .{ext} extension.")
+
+
+def validate_uploaded_file(uploaded_file, limit=None):
+    """Run every check on a Django UploadedFile; returns its extension"""
+    validate_size(uploaded_file.size, limit or max_upload_size())
+    ext = validate_extension(uploaded_file.name)
+    head = uploaded_file.read(SNIFF_LENGTH)
+    uploaded_file.seek(0)
+    validate_content(ext, head)
+    return ext
@@ -0,0 +1,180 @@
+# documents/versions.py
+"""Version history of document files.
+
+A document's current file is always its blob. When a save replaces the file
+(a resubmission), `record_replacement` appends to DocumentVersion:
+
+* on the first replacement, the original file as version 1: a full copy
+  that takes over the document's reference on the old blob;
+* the new file as the next version. Content identical to the version
+  before shares its storage; text files (TEXT_FORMATS) are kept as a delta
+  against it (documents/delta.py) when the delta is small enough and the
+  chain of deltas short enough; anything else takes a reference on the
+  new blob.
+
+So a text file edited ten times costs one full copy, ten small deltas and
+the current file. Old versions are rebuilt only when someone asks: straight
+from the blob store when a blob with their hash exists (the current file, a
+full copy, any identical upload), otherwise by applying the deltas forward
+from the nearest full copy, each step into a spooled temporary file.
+"""
+import tempfile
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db.models import Count, F
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from . import delta
+from .blobstore import acquire_blobs, write_blob
+from .downloads import serve_file
+from .models import Blob, DocumentVersion
+
+DEFAULTS = {
+    'TEXT_FORMATS': ('txt',),
+    'MAX_DELTA_RATIO': 0.5,
+    'MAX_CHAIN': 10,
+    'SPOOL_SIZE': 1024 * 1024,
+}
+
+
+def version_setting(name):
+    return getattr(settings, 'DOCUMENT_VERSIONS', {}).get(name, DEFAULTS[name])
+
+
+def _spooled():
+    return tempfile.SpooledTemporaryFile(max_size=version_setting('SPOOL_SIZE'))
+
+
+def _open_blob(blob):
+    return blob.file.storage.open(blob.file.name, 'rb')
+
+
+def _store_delta(base_blob, blob):
+    """A referenced Blob holding the delta from base_blob to blob, or None if
+    the delta would be larger than MAX_DELTA_RATIO of the file"""
+    limit = int(blob.size * version_setting('MAX_DELTA_RATIO'))
+    with _open_blob(base_blob) as base, _open_blob(blob) as target, _spooled() as out:
+        if not delta.encode(base, target, out, limit):
+            return None
+        sha256, size = write_blob(out)
+        return acquire_blobs({sha256: (size, 1)}, {sha256: lambda: nullcontext(out)})[sha256]
+
+
+def record_replacement(document, replaced_blob_id, replaced_filename, replaced_file_type):
+    """Record the versions for a save that replaced a document's blob.
+
+    Returns True when version 1 took over the document's reference on the
+    replaced blob, which the caller must then not release.
+    """
+    replaced = Blob.objects.get(pk=replaced_blob_id)
+    latest = DocumentVersion.objects.filter(document=document).order_by('-number').first()
+    handed_over = latest is None
+    if latest is None:
+        latest = DocumentVersion.objects.create(
+            document=document, number=1, sha256=replaced.sha256, size=replaced.size,
+            file_type=replaced_file_type, original_filename=replaced_filename, blob=replaced,
+        )
+
+    blob = document.blob
+    version = DocumentVersion(
+        document=document, number=latest.number + 1, sha256=blob.sha256, size=blob.size,
+        file_type=document.file_type, original_filename=document.original_filename,
+    )
+    if blob.sha256 == latest.sha256:
+        # Unchanged content: the same stored bytes serve both versions
+        version.storage, version.blob_id = latest.storage, latest.blob_id
+        version.base_number, version.depth = latest.base_number, latest.depth
+        Blob.objects.filter(pk=latest.blob_id).update(refcount=F('refcount') + 1)
+    else:
+        stored = None
+        if (document.file_type in version_setting('TEXT_FORMATS') and latest.file_type == document.file_type
+                and latest.sha256 == replaced.sha256 and latest.depth < version_setting('MAX_CHAIN')):
+            stored = _store_delta(replaced, blob)
+        if stored is not None:
+            version.storage, version.blob = DocumentVersion.DELTA, stored
+            version.base_number, version.depth = latest.number, latest.depth + 1
+        else:
+            version.blob = blob
+            Blob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+    version.save()
+    return handed_over
+
+
+def version_blob_counts(versions):
+    """{blob id: references} held by a queryset of versions, for release_blobs"""
+    return dict(versions.order_by().values_list('blob_id').annotate(count=Count('id')))
+
+
+def content_blob(version):
+    """A Blob holding exactly the version's content, if one exists"""
+    return Blob.objects.filter(sha256=version.sha256).first()
+
+
+def rebuild(version):
+    """The version's content from its chain of deltas, as a spooled file at offset 0"""
+    stored = {
+        v.number: v for v in DocumentVersion.objects.filter(
+            document_id=version.document_id, number__lte=version.number,
+        ).select_related('blob')
+    }
+    chain = [version]
+    while chain[-1].storage == DocumentVersion.DELTA:
+        chain.append(stored[chain[-1].base_number])
+    current = _open_blob(chain.pop().blob)
+    try:
+        while chain:
+            step = chain.pop()
+            out = _spooled()
+            with _open_blob(step.blob) as patch:
+                delta.apply(current, patch, out)
+            current.close()
+            current = out
+    except BaseException:
+        current.close()
+        raise
+    current.seek(0)
+    return current
+
+
+def open_version(version):
+    """A readable, seekable file object with the version's content; the caller closes it"""
+    blob = content_blob(version)
+    return _open_blob(blob) if blob is not None else rebuild(version)
+
+
+def serve_version(request, version):
+    """Download response for a version: from the blob store, or rebuilt"""
+    blob = content_blob(version)
+    if blob is not None:
+        return serve_file(request, blob.file, version.filename())
+    # The content hash is the validator; a rebuilt file has no stored mtime
+    etag = f'"{version.sha256}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = FileResponse(rebuild(version), as_attachment=True, filename=version.filename(),
+                                content_type='application/octet-stream')
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def iter_diff(old, new):
+    """Unified diff of two versions of a document, as byte strings"""
+    labels = (f'v{old.number} {old.filename()}', f'v{new.number} {new.filename()}')
+    if old.sha256 == new.sha256:
+        yield b'The versions are identical.\n'
+        return
+    text_formats = version_setting('TEXT_FORMATS')
+    if old.file_type not in text_formats or new.file_type not in text_formats:
+        yield (f'Binary versions differ: {labels[0]} ({old.size} bytes), '
+               f'{labels[1]} ({new.size} bytes)\n').encode()
+        return
+    with open_version(old) as a, open_version(new) as b:
+        yield from delta.unified_diff(a, b, *labels)
+
+
+def diff_response(old, new):
+    """The diff of two versions, streamed as it is computed"""
+    return StreamingHttpResponse(iter_diff(old, new), content_type='text/plain; charset=utf-8')
@@ -1,96 +1,312 @@
 # documents/views.py
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import Http404, JsonResponse
+from django.core.exceptions import ValidationError
+from django.views.decorators.http import require_http_methods, require_POST
 
-from review.models import Review
-from .models import Document
-from .forms import DocumentUploadForm
-import os
+from access.policy import MANAGE, aget_permitted, document_filter, get_permitted
+from dms_project.asyncviews import alogin_required, arender
+from dms_project.cache import cache_page_per_user
+from .models import Document, DocumentPreview, DocumentVersion, UploadSession
+from .bulk import Source, delete_documents, ingest, retag, set_category
+from .forms import BulkActionForm, BulkUploadForm, ChunkedUploadForm, DocumentUploadForm
+from .downloads import aserve_file, serve_file, serve_preview
+from .validators import max_chunked_upload_size, max_upload_size
+from .versions import diff_response, serve_version
+from .uploads import ChunkRejected, append_chunk, abort_session, finalize_session, max_chunk_size, start_session
 
 # R-2.1: Upload documents
+def _handle_upload(request):
+    """Validate and save a posted upload form: (form, document or None)"""
+    form = DocumentUploadForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return form, None
+    document = form.save(commit=False)
+    document.uploader = request.user
+    document.save()
+    form.save_m2m()
+    messages.success(request, f'Document "{document.title}" uploaded successfully!')
+    return form, document
+
+def _upload_context(form):
+    return {
+        'form': form,
+        'supported_formats': ['PDF', 'DOCX', 'XLSX', 'TXT', 'JPG', 'PNG'],
+        'max_upload_size': max_upload_size(),
+        'max_chunked_upload_size': max_chunked_upload_size(),
+    }
+
 @login_required(login_url='accounts:login')
 def upload_document(request):
     if request.method == 'POST':
-        form = DocumentUploadForm(request.POST, request.FILES)
-        if form.is_valid():
-            document = form.save(commit=False)
-            document.uploader = request.user
-            document.save()
-            messages.success(request, f'Document "{document.title}" uploaded successfully!')
+        form, document = _handle_upload(request)
+        if document is not None:
             return redirect('documents:my_documents')
     else:
         form = DocumentUploadForm()
     
-    return render(request, 'documents/upload.html', {
+    return render(request, 'documents/upload.html', _upload_context(form))
+
+# ASGI profile: the server has received the body into a temporary file
+# without holding a thread; only parsing, validating and storing it take one
+@alogin_required(login_url='accounts:login')
+async def upload_document_async(request):
+    if request.method == 'POST':
+        form, document = await sync_to_async(_handle_upload)(request)
+        if document is not None:
+            return redirect('documents:my_documents')
+    else:
+        form = DocumentUploadForm()
+    
+    return await arender(request, 'documents/upload.html', _upload_context(form))
+
+# R-2.1: Bulk upload - many files, one set of metadata, one report per file.
+# Answers with JSON when the client asks for it (Accept: application/json).
+@login_required(login_url='accounts:login')
+def bulk_upload(request):
+    wants_json = request.accepts('application/json') and not request.accepts('text/html')
+    reports = None
+    if request.method == 'POST':
+        form = BulkUploadForm(request.POST)
+        files = request.FILES.getlist('files')
+        if not files:
+            form.add_error(None, "Choose at least one file.")
+        if form.is_valid():
+            reports = ingest(
+                request.user,
+                [Source.from_upload(uploaded_file) for uploaded_file in files],
+                category=form.cleaned_data['category'],
+                tags=form.cleaned_data['selected_tags'],
+                author=form.cleaned_data['author'],
+            )
+            created = sum(report['ok'] for report in reports)
+            if wants_json:
+                return JsonResponse({
+                    'created': created,
+                    'failed': len(reports) - created,
+                    'results': reports,
+                }, status=201 if created else 400)
+            form = BulkUploadForm()
+        elif wants_json:
+            return JsonResponse({'errors': form.errors}, status=400)
+    else:
+        form = BulkUploadForm()
+    
+    return render(request, 'documents/bulk_upload.html', {
         'form': form,
-        'supported_formats': ['PDF', 'DOCX', 'XLSX', 'TXT', 'JPG', 'PNG']
+        'reports': reports,
+        'created': sum(report['ok'] for report in reports or []),
+        'max_upload_size': max_upload_size(),
     })
 
+# R-2.1: Chunked upload API for large files
+# POST uploads/ starts a session, PUT uploads/<id>/?offset=N appends a chunk
+# (X-Chunk-SHA256 header optional), GET uploads/<id>/ reports the offset to
+# resume from, POST uploads/<id>/finalize/ creates the document.
+def _session_state(session):
+    return {
+        'id': str(session.id),
+        'status': session.status,
+        'offset': session.received_size,
+        'total_size': session.total_size,
+        'chunk_size': max_chunk_size(),
+    }
+
+@login_required(login_url='accounts:login')
+@require_POST
+def upload_initiate(request):
+    form = ChunkedUploadForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    session = form.save(commit=False)
+    session.uploader = request.user
+    start_session(session)
+    return JsonResponse(_session_state(session), status=201)
+
+@login_required(login_url='accounts:login')
+@require_http_methods(['GET', 'PUT', 'DELETE'])
+def upload_session(request, session_id):
+    session = get_object_or_404(UploadSession, id=session_id, uploader=request.user)
+    
+    if request.method == 'PUT':
+        try:
+            offset = int(request.GET.get('offset', session.received_size))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid offset or Content-Length.'}, status=400)
+        try:
+            append_chunk(session, offset, request, length, request.META.get('HTTP_X_CHUNK_SHA256'))
+        except ChunkRejected as exc:
+            return JsonResponse({'error': str(exc), 'offset': exc.offset}, status=exc.status)
+    elif request.method == 'DELETE' and session.status == 'active':
+        abort_session(session)
+    
+    return JsonResponse(_session_state(session))
+
+@login_required(login_url='accounts:login')
+@require_POST
+def upload_finalize(request, session_id):
+    session = get_object_or_404(UploadSession, id=session_id, uploader=request.user)
+    try:
+        document = finalize_session(session)
+    except ValidationError as exc:
+        return JsonResponse({'error': exc.messages[0], **_session_state(session)}, status=409)
+    messages.success(request, f'Document "{document.title}" uploaded successfully!')
+    return JsonResponse({
+        'document_id': document.id,
+        'redirect': reverse('documents:my_documents'),
+    }, status=201)
+
 # R-2.3: View user's documents
 @login_required(login_url='accounts:login')
+@cache_page_per_user('documents:mine')
 def my_documents(request):
     documents = Document.objects.filter(uploader=request.user)
     return render(request, 'documents/my_documents.html', {
-        'documents': documents
+        'documents': documents,
+        'bulk_form': BulkActionForm(),
     })
 
+# R-2.3: Bulk delete / re-tag / category change of the documents selected in
+# My Documents, each as set-based writes (documents/bulk.py)
+@login_required(login_url='accounts:login')
+@require_POST
+def bulk_action(request):
+    form = BulkActionForm(request.POST)
+    if not form.is_valid():
+        messages.error(request, next(iter(form.errors.values()))[0])
+        return redirect('documents:my_documents')
+    
+    documents = Document.objects.filter(uploader=request.user, pk__in=form.cleaned_data['documents'])
+    action = form.cleaned_data['action']
+    if action == 'delete':
+        count = delete_documents(documents)
+        messages.success(request, f'{count} document(s) deleted.')
+    elif action == 'category':
+        count = set_category(documents, form.cleaned_data['category'])
+        messages.success(request, f'{count} document(s) moved to {form.cleaned_data["category"]}.')
+    else:
+        tags = form.cleaned_data['tags']
+        if action == 'add_tags':
+            count = retag(documents, add=tags)
+        else:
+            count = retag(documents, remove=tags)
+        messages.success(request, f'Tags updated on {count} document(s).')
+    return redirect('documents:my_documents')
+
 # R-3.2: View document preview
 @login_required(login_url='accounts:login')
 def document_detail(request, doc_id):
-    document = get_object_or_404(Document, id=doc_id)
-    
-    # Check if user has permission to view (R-5)
-    if document.uploader != request.user and not request.user.is_staff:
+    # Fetched through the access policy (R-5, access/policy.py)
+    document = get_permitted(
+        request.user, doc_id, Document.objects.with_review_history().with_tags().select_related('preview')
+    )
+    if document is None:
         messages.error(request, "You don't have permission to view this document.")
         return redirect('documents:my_documents')
     
+    # All reviews, newest first, were prefetched with their reviewers
+    reviews = document.reviews.all()
+    
     # Get the most recent rejection review if document is rejected
     last_rejection = None
     if document.status == 'rejected':
-        last_rejection = Review.objects.filter(
-            document=document, 
-            status='rejected'
-        ).order_by('-created_at').first()
+        last_rejection = next((review for review in reviews if review.status == 'rejected'), None)
     
-    # Get all reviews for history
-    reviews = document.reviews.all().order_by('-created_at')
+    # A thumbnail or text snippet made off-request (documents/previews.py)
+    try:
+        preview = document.preview
+    except DocumentPreview.DoesNotExist:
+        preview = None
     
     return render(request, 'documents/document_detail.html', {
         'document': document,
         'last_rejection': last_rejection,
         'reviews': reviews,
+        'preview': preview,
     })
 
+# R-3.2: Preview image shown on the detail page
+@login_required(login_url='accounts:login')
+def document_preview(request, doc_id):
+    # A document the user may not see has no preview for them either
+    preview = get_object_or_404(
+        DocumentPreview.objects.filter(document_filter(request.user, prefix='document__')),
+        document_id=doc_id, status='done', kind='image',
+    )
+    
+    return serve_preview(request, preview.image)
+
 # R-3.2.1: Download document
 @login_required(login_url='accounts:login')
 def download_document(request, doc_id):
-    document = get_object_or_404(Document, id=doc_id)
+    document = get_permitted(request.user, doc_id)
+    if document is None:
+        messages.error(request, "You don't have permission to download this document.")
+        return redirect('documents:my_documents')
     
-    # Check permissions
-    if document.uploader != request.user and not request.user.is_staff:
+    # Streamed in chunks, with Range / conditional request support
+    return serve_file(request, document.file, document.filename())
+
+# ASGI profile: one async query, then the file streams from the thread pool
+# while the coroutine waits on the client, however slow it reads
+@alogin_required(login_url='accounts:login')
+async def download_document_async(request, doc_id):
+    document = await aget_permitted(request.user, doc_id)
+    if document is None:
         messages.error(request, "You don't have permission to download this document.")
         return redirect('documents:my_documents')
     
-    response = HttpResponse(document.file, content_type='application/octet-stream')
-    response['Content-Disposition'] = f'attachment; filename="{document.filename()}"'
-    return response
+    return await aserve_file(request, document.file, document.filename())
+
+# Earlier versions of a document's file (documents/versions.py), rebuilt on demand
+@login_required(login_url='accounts:login')
+def download_version(request, doc_id, number):
+    document = get_permitted(request.user, doc_id)
+    if document is None:
+        messages.error(request, "You don't have permission to download this document.")
+        return redirect('documents:my_documents')
+    
+    version = get_object_or_404(DocumentVersion, document=document, number=number)
+    return serve_version(request, version)
+
+# Line diff of two versions for reviewers, streamed: ?from=<n>&to=<n>, by
+# default the latest version against the one before it
+@login_required(login_url='accounts:login')
+def version_diff(request, doc_id):
+    document = get_permitted(request.user, doc_id)
+    if document is None:
+        messages.error(request, "You don't have permission to view this document.")
+        return redirect('documents:my_documents')
+    
+    versions = DocumentVersion.objects.filter(document=document)
+    try:
+        numbers = [int(request.GET['from']), int(request.GET['to'])]
+    except (KeyError, ValueError):
+        found = list(versions.order_by('-number')[:2])[::-1]
+    else:
+        found = sorted(versions.filter(number__in=numbers), key=lambda version: numbers.index(version.number))
+    if len(found) != 2:
+        raise Http404("No such versions of this document.")
+    return diff_response(*found)
 
 # R-2.3: Delete document
 @login_required(login_url='accounts:login')
 def delete_document(request, doc_id):
-    document = get_object_or_404(Document, id=doc_id)
-    
-    # Only uploader or admin can delete
-    if document.uploader != request.user and not request.user.is_staff:
+    # The uploader, staff, or a grant to manage it
+    document = get_permitted(request.user, doc_id, permission=MANAGE)
+    if document is None:
         messages.error(request, "You don't have permission to delete this document.")
         return redirect('documents:my_documents')
     
     if request.method == 'POST':
         title = document.title
-        document.file.delete()  # Delete the actual file
-        document.delete()       # Delete the database record
+        # Deleting the record releases its blob; the file goes once unreferenced
+        document.delete()
         messages.success(request, f'Document "{title}" deleted successfully.')
         return redirect('documents:my_documents')
     
@@ -0,0 +1,10 @@
+# jobs/admin.py
+from django.contrib import admin
+from .models import Job
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'run_after', 'updated_at']
+    list_filter = ['status', 'name']
+    search_fields = ['key']
+    readonly_fields = ['created_at', 'updated_at']
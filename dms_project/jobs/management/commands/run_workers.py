@@ -0,0 +1,31 @@
+# jobs/management/commands/run_workers.py
+from django.core.management.base import BaseCommand
+
+from jobs.queue import purge, retry_failed
+from jobs.worker import run_workers
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (previews, text extraction, file cleanup)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Pool size (default: JOBS['WORKERS'])")
+        parser.add_argument('--pool', choices=['thread', 'process'], default=None,
+                            help="Thread or process pool (default: JOBS['POOL'])")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the queue and exit instead of polling")
+        parser.add_argument('--retry-failed', action='store_true',
+                            help="First put failed jobs back in the queue")
+        parser.add_argument('--purge', action='store_true',
+                            help="First delete jobs finished more than JOBS['KEEP_DONE_DAYS'] ago")
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            self.stdout.write(f"Requeued {retry_failed()} failed jobs.")
+        if options['purge']:
+            self.stdout.write(f"Deleted {purge()} finished jobs.")
+        processed = run_workers(
+            workers=options['workers'], pool=options['pool'], once=options['once'], stdout=self.stdout
+        )
+        self.stdout.write(self.style.SUCCESS(f"Ran {processed} jobs."))
@@ -0,0 +1,128 @@
+# jobs/queue.py
+"""The Job table as a queue: enqueueing, claiming, finishing and retrying.
+
+Everything is plain SQL on the project database, so it works the same on
+MySQL and SQLite with no broker. Jobs enqueued inside a transaction only
+become visible to workers when it commits. Claiming uses SELECT ... FOR
+UPDATE SKIP LOCKED where the database has it, so several worker processes
+can share the table.
+"""
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+from .registry import get_task
+
+DEFAULTS = {
+    'POOL': 'thread',
+    'WORKERS': 4,
+    'POLL_INTERVAL': 2,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 10,
+    'BACKOFF_MAX': 60 * 60,
+    'LEASE': 10 * 60,
+    'KEEP_DONE_DAYS': 7,
+}
+
+
+def job_setting(name):
+    return getattr(settings, 'JOBS', {}).get(name, DEFAULTS[name])
+
+
+def enqueue(name, *args, key=None, delay=0, force=False):
+    """Queue the job `name` with JSON-serializable args.
+
+    With a `key`, the job is queued once: a later enqueue with the same key
+    does nothing, or with `force` puts the existing job back in the queue.
+    """
+    func = get_task(name)
+    fields = {
+        'name': name,
+        'args': list(args),
+        'max_attempts': func.max_attempts or job_setting('MAX_ATTEMPTS'),
+        'run_after': timezone.now() + timedelta(seconds=delay),
+    }
+    if key is not None and force:
+        requeued = Job.objects.filter(key=key).update(
+            status='queued', attempts=0, last_error='', locked_at=None, **fields
+        )
+        if requeued:
+            return
+    Job.objects.bulk_create([Job(key=key, **fields)], ignore_conflicts=key is not None)
+
+
+def enqueue_many(name, arg_lists, keys=None):
+    """Queue one `name` job per argument list in a single insert (see enqueue)"""
+    func = get_task(name)
+    now = timezone.now()
+    keys = keys or [None] * len(arg_lists)
+    Job.objects.bulk_create(
+        [Job(name=name, args=list(args), key=key, run_after=now,
+             max_attempts=func.max_attempts or job_setting('MAX_ATTEMPTS'))
+         for args, key in zip(arg_lists, keys)],
+        ignore_conflicts=any(key is not None for key in keys),
+        batch_size=500,
+    )
+
+
+def claim(limit):
+    """Mark up to `limit` due jobs as running and return their ids.
+
+    Jobs left running longer than LEASE seconds belong to a worker that
+    died; they are claimed again.
+    """
+    now = timezone.now()
+    due = Q(status='queued', run_after__lte=now) | Q(
+        status='running', locked_at__lt=now - timedelta(seconds=job_setting('LEASE'))
+    )
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by('run_after')
+            .values_list('id', flat=True)[:limit]
+        )
+        if ids:
+            Job.objects.filter(id__in=ids).update(status='running', locked_at=now, attempts=F('attempts') + 1)
+    return ids
+
+
+def backoff(attempts):
+    """Seconds before retry number `attempts`: exponential, capped, jittered"""
+    delay = min(job_setting('BACKOFF_MAX'), job_setting('BACKOFF_BASE') * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def finish(job):
+    Job.objects.filter(pk=job.pk, status='running').update(status='done', locked_at=None, last_error='')
+
+
+def fail(job, error, permanent=False):
+    """Schedule a retry with backoff, or give up after max_attempts"""
+    if permanent or job.attempts >= job.max_attempts:
+        fields = {'status': 'failed'}
+    else:
+        fields = {'status': 'queued', 'run_after': timezone.now() + timedelta(seconds=backoff(job.attempts))}
+    Job.objects.filter(pk=job.pk, status='running').update(locked_at=None, last_error=error, **fields)
+    return fields['status']
+
+
+def retry_failed(name=None):
+    """Put failed jobs back in the queue; returns how many"""
+    jobs = Job.objects.filter(status='failed')
+    if name:
+        jobs = jobs.filter(name=name)
+    return jobs.update(status='queued', attempts=0, run_after=timezone.now())
+
+
+def purge(days=None):
+    """Delete jobs finished more than `days` (KEEP_DONE_DAYS) ago"""
+    days = job_setting('KEEP_DONE_DAYS') if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Job.objects.filter(status='done', updated_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,31 @@
+# jobs/registry.py
+"""Names of job functions.
+
+Apps register work in their tasks.py with @task('app.what'); the name is
+what gets stored on the Job row, so renaming a function does not strand
+queued jobs.
+"""
+TASKS = {}
+
+
+class PermanentError(Exception):
+    """Raised by a task when retrying cannot help; the job fails at once"""
+
+
+def task(name, max_attempts=None):
+    """Register a function as the job named `name`"""
+    def decorator(func):
+        if name in TASKS and TASKS[name] is not func:
+            raise ValueError(f"Job name {name!r} is already registered")
+        func.job_name = name
+        func.max_attempts = max_attempts
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def get_task(name):
+    try:
+        return TASKS[name]
+    except KeyError:
+        raise PermanentError(f"No task registered as {name!r}") from None
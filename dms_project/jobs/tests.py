@@ -0,0 +1,78 @@
+# jobs/tests.py
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import claim, enqueue
+from .registry import PermanentError, task
+from .worker import execute
+
+CALLS = []
+
+
+@task('jobs.tests.record')
+def record(value):
+    CALLS.append(value)
+
+
+@task('jobs.tests.flaky', max_attempts=2)
+def flaky():
+    raise RuntimeError('try again')
+
+
+@task('jobs.tests.hopeless')
+def hopeless():
+    raise PermanentError('no point')
+
+
+def run_due():
+    return [execute(job_id) for job_id in claim(10)]
+
+
+@override_settings(JOBS={'BACKOFF_BASE': 10, 'LEASE': 60})
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        CALLS.clear()
+
+    def test_runs_queued_job(self):
+        enqueue('jobs.tests.record', 'a')
+        self.assertEqual(run_due(), ['done'])
+        self.assertEqual(CALLS, ['a'])
+        self.assertEqual(run_due(), [])
+
+    def test_idempotency_key(self):
+        enqueue('jobs.tests.record', 'a', key='once')
+        enqueue('jobs.tests.record', 'b', key='once')
+        run_due()
+        enqueue('jobs.tests.record', 'c', key='once')
+        self.assertEqual(run_due(), [])
+        enqueue('jobs.tests.record', 'd', key='once', force=True)
+        run_due()
+        self.assertEqual(CALLS, ['a', 'd'])
+
+    def test_retry_with_backoff_then_fail(self):
+        enqueue('jobs.tests.flaky')
+        self.assertEqual(run_due(), ['queued'])
+        job = Job.objects.get()
+        self.assertIn('try again', job.last_error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=4))
+        self.assertEqual(run_due(), [])  # not due yet
+
+        Job.objects.update(run_after=timezone.now())
+        self.assertEqual(run_due(), ['failed'])
+        self.assertEqual(Job.objects.get().attempts, 2)
+
+    def test_permanent_error(self):
+        enqueue('jobs.tests.hopeless')
+        self.assertEqual(run_due(), ['failed'])
+
+    def test_expired_lease_is_reclaimed(self):
+        enqueue('jobs.tests.record', 'a')
+        claim(10)  # a worker that never finishes
+        self.assertEqual(claim(10), [])
+        Job.objects.update(locked_at=timezone.now() - timedelta(seconds=120))
+        self.assertEqual(run_due(), ['done'])
+        self.assertEqual(Job.objects.get().attempts, 2)
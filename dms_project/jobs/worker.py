@@ -0,0 +1,81 @@
+# jobs/worker.py
+"""Running claimed jobs on a thread or process pool.
+
+A thread pool suits I/O-bound work and shares this process's Django
+setup. A process pool suits CPU-bound work (previews): its workers are
+spawned fresh and run django.setup() once, so no database connection is
+ever shared across a fork.
+"""
+import logging
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.db import close_old_connections, connection
+
+from .models import Job
+from .queue import claim, fail, finish, job_setting
+from .registry import PermanentError, get_task
+
+logger = logging.getLogger(__name__)
+
+
+def _close_old_connections():
+    # Not inside a transaction (a test, or a job run inline): that would end it
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+
+def execute(job_id):
+    """Run one claimed job; returns its new status"""
+    _close_old_connections()
+    try:
+        try:
+            job = Job.objects.get(pk=job_id, status='running')
+        except Job.DoesNotExist:
+            return None
+        try:
+            get_task(job.name)(*job.args)
+        except PermanentError as exc:
+            logger.error("Job %s failed permanently: %s", job, exc)
+            return fail(job, str(exc), permanent=True)
+        except Exception:
+            logger.exception("Job %s failed (attempt %d of %d)", job, job.attempts, job.max_attempts)
+            return fail(job, traceback.format_exc())
+        finish(job)
+        return 'done'
+    finally:
+        _close_old_connections()
+
+
+def make_pool(kind, workers):
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jobs')
+    if kind == 'process':
+        return ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+        )
+    raise ValueError(f"Unknown JOBS['POOL'] {kind!r}: use 'thread' or 'process'")
+
+
+def run_workers(workers=None, pool=None, once=False, stdout=None):
+    """Claim due jobs and run them on the pool.
+
+    With `once` the queue is drained (jobs scheduled for later are left)
+    and the count of jobs run is returned; otherwise it polls forever.
+    """
+    workers = workers or job_setting('WORKERS')
+    processed = 0
+    with make_pool(pool or job_setting('POOL'), workers) as executor:
+        while True:
+            ids = claim(workers * 2)
+            if ids:
+                processed += len(list(executor.map(execute, ids)))
+                if stdout:
+                    stdout.write(f"  ran {processed} jobs")
+                continue
+            if once:
+                return processed
+            time.sleep(job_setting('POLL_INTERVAL'))
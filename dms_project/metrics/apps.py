@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class MetricsConfig(AppConfig):
+    name = 'metrics'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,88 @@
+# metrics/export.py
+"""Registry contents as Prometheus text and as rows for the staff page."""
+from .registry import metrics_setting, registry
+
+# measurement -> (metric name, help, factor from the stored unit)
+PROMETHEUS = {
+    'duration_ms': ('dms_request_duration_seconds', 'Wall time of sampled requests', 0.001),
+    'queries': ('dms_request_queries', 'Database queries per sampled request', 1),
+    'query_ms': ('dms_request_query_seconds', 'Database time per sampled request', 0.001),
+    'template_ms': ('dms_request_template_seconds', 'Template render time per sampled request', 0.001),
+    'response_bytes': ('dms_response_size_bytes', 'Response body size of sampled requests', 1),
+}
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return format(value, 'g') if isinstance(value, float) else str(value)
+
+
+def prometheus_text():
+    """The text exposition format (version 0.0.4) of this process' registry"""
+    requests, histograms, _ = registry.snapshot()
+    lines = [
+        '# HELP dms_requests_total Requests handled, sampled or not.',
+        '# TYPE dms_requests_total counter',
+    ]
+    for (view, method, status), count in sorted(requests.items()):
+        lines.append(
+            f'dms_requests_total{{view="{_label(view)}",method="{_label(method)}",status="{status}"}} {count}'
+        )
+    lines += [
+        '# HELP dms_metrics_sample_rate Fraction of requests measured in the histograms.',
+        '# TYPE dms_metrics_sample_rate gauge',
+        f"dms_metrics_sample_rate {_number(float(metrics_setting('SAMPLE_RATE', 0.1)))}",
+    ]
+    for measurement, (metric, help_text, factor) in PROMETHEUS.items():
+        lines += [f'# HELP {metric} {help_text}.', f'# TYPE {metric} histogram']
+        for view in sorted(histograms):
+            histogram = histograms[view][measurement]
+            label = f'view="{_label(view)}"'
+            for bound, count in histogram.cumulative():
+                le = bound if bound == '+Inf' else _number(bound * factor)
+                lines.append(f'{metric}_bucket{{{label},le="{le}"}} {count}')
+            lines.append(f'{metric}_sum{{{label}}} {_number(histogram.sum * factor)}')
+            lines.append(f'{metric}_count{{{label}}} {histogram.count}')
+    return '\n'.join(lines) + '\n'
+
+
+def _round(value, digits=1):
+    return None if value is None else round(value, digits)
+
+
+def view_rows():
+    """One dict per URL name, slowest p95 first"""
+    requests, histograms, _ = registry.snapshot()
+    totals = {}
+    for (view, _, _), count in requests.items():
+        totals[view] = totals.get(view, 0) + count
+    rows = []
+    for view, total in totals.items():
+        row = {'view': view, 'requests': total, 'sampled': 0}
+        by_name = histograms.get(view)
+        if by_name:
+            duration = by_name['duration_ms']
+            row.update({
+                'sampled': duration.count,
+                'p50': _round(duration.quantile(0.50)),
+                'p95': _round(duration.quantile(0.95)),
+                'p99': _round(duration.quantile(0.99)),
+                'max': _round(duration.max),
+                'queries': _round(by_name['queries'].mean),
+                'max_queries': by_name['queries'].max,
+                'query_ms': _round(by_name['query_ms'].mean),
+                'template_ms': _round(by_name['template_ms'].mean),
+                'response_kb': _round(by_name['response_bytes'].mean / 1024 if by_name['response_bytes'].count else None),
+            })
+        rows.append(row)
+    rows.sort(key=lambda row: (row.get('p95') or -1, row['requests']), reverse=True)
+    return rows
+
+
+def slowest_recent(limit=20):
+    """The slowest of the samples in the ring buffer"""
+    _, _, recent = registry.snapshot()
+    return sorted(recent, key=lambda sample: sample.duration_ms, reverse=True)[:limit]
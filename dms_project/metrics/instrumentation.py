@@ -0,0 +1,61 @@
+# metrics/instrumentation.py
+"""Hooks that add query and template time to the sample of the current request.
+
+The sample lives in a context variable set by InstrumentationMiddleware.
+asgiref copies the context into the threads that sync_to_async runs ORM
+calls and template rendering in, so the hooks find it under ASGI as well.
+Outside a sampled request they only pay a context variable lookup.
+"""
+import time
+from contextvars import ContextVar
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+# Transaction bookkeeping, not work the view asked for (as in dms_project/middleware.py)
+UNCOUNTED = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+current_sample = ContextVar('metrics_sample', default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper (connection.execute_wrappers)"""
+    sample = current_sample.get()
+    if sample is None or sql.startswith(UNCOUNTED):
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries += 1
+        sample.query_ms += (time.perf_counter() - started) * 1000
+
+
+class Template(django_backend.Template):
+
+    def render(self, context=None, request=None):
+        sample = current_sample.get()
+        if sample is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            sample.template_ms += (time.perf_counter() - started) * 1000
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend, timing each top-level render.
+
+    Included and extended templates render inside their parent, so they
+    are part of its time and not counted twice.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
@@ -0,0 +1,86 @@
+# metrics/middleware.py
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+
+from .instrumentation import current_sample
+from .registry import Sample, metrics_setting, registry
+
+
+class InstrumentationMiddleware:
+    """Measure requests per URL name into metrics.registry.
+
+    Every request is counted; METRICS['SAMPLE_RATE'] of them are measured:
+    wall time, queries and their time (metrics/instrumentation.py), template
+    render time and response size. Wall time ends when the response is
+    returned, so for a streamed download it is the time to the first byte;
+    the size of a stream is its Content-Length, if it has one. Goes first in
+    MIDDLEWARE so that the time covers the other middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics_setting('ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sample = self.start(request)
+        if sample is None:
+            response = self.get_response(request)
+            registry.count(self.view_name(request), request.method, response.status_code)
+            return response
+        token = current_sample.set(sample)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_sample.reset(token)
+        self.finish(request, response, sample, started)
+        return response
+
+    async def __acall__(self, request):
+        sample = self.start(request)
+        if sample is None:
+            response = await self.get_response(request)
+            registry.count(self.view_name(request), request.method, response.status_code)
+            return response
+        token = current_sample.set(sample)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_sample.reset(token)
+        self.finish(request, response, sample, started)
+        return response
+
+    @staticmethod
+    def start(request):
+        """A Sample for this request, or None when it is not sampled"""
+        rate = metrics_setting('SAMPLE_RATE', 0.1)
+        if rate < 1 and random.random() >= rate:
+            return None
+        return Sample(method=request.method)
+
+    @staticmethod
+    def view_name(request):
+        # URL names, never paths: unmatched URLs must not each get their own series
+        match = request.resolver_match
+        return match.view_name if match else '<unresolved>'
+
+    def finish(self, request, response, sample, started):
+        sample.duration_ms = (time.perf_counter() - started) * 1000
+        sample.view = self.view_name(request)
+        sample.status = response.status_code
+        if not response.streaming:
+            sample.response_bytes = len(response.content)
+        elif response.has_header('Content-Length'):
+            sample.response_bytes = int(response['Content-Length'])
+        registry.record(sample)
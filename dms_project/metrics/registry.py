@@ -0,0 +1,136 @@
+# metrics/registry.py
+"""In-process store of per-request measurements.
+
+Every process keeps its own `registry`: a count of all requests by URL
+name, method and status, and for the sampled ones (METRICS['SAMPLE_RATE'])
+cumulative histograms per URL name plus a ring buffer of the last
+METRICS['BUFFER'] samples. Histograms have fixed buckets, so recording is
+constant time and memory does not grow with traffic; percentiles are
+estimated from the buckets the way Prometheus' histogram_quantile does.
+"""
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+from django.conf import settings
+
+# Upper bounds of the histogram buckets, per measurement
+BUCKETS = {
+    'duration_ms': (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+    'queries': (0, 1, 2, 5, 10, 20, 50, 100),
+    'query_ms': (1, 5, 10, 25, 50, 100, 250, 1000),
+    'template_ms': (1, 5, 10, 25, 50, 100, 250, 1000),
+    'response_bytes': (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2),
+}
+
+
+def metrics_setting(name, default):
+    return getattr(settings, 'METRICS', {}).get(name, default)
+
+
+@dataclass
+class Sample:
+    """Measurements of one sampled request; filled in while it runs"""
+    view: str = ''
+    method: str = ''
+    status: int = 0
+    started_at: float = field(default_factory=time.time)
+    duration_ms: float = 0.0
+    queries: int = 0
+    query_ms: float = 0.0
+    template_ms: float = 0.0
+    response_bytes: Optional[int] = None  # None: a stream of unknown length
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """[(upper bound, observations <= bound)], ending with ('+Inf', count)"""
+        total, result = 0, []
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, fraction):
+        """Estimate, interpolating linearly inside the bucket it falls in"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        lower, seen = 0, 0
+        for bound, count in zip(self.bounds, self.counts):
+            if count and seen + count >= rank:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        # Past the last bound all we know is the largest value
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+
+class Registry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = Counter()  # (view, method, status) -> count
+            self.histograms = {}  # view -> {measurement: Histogram}
+            self.recent = deque(maxlen=metrics_setting('BUFFER', 1000))
+
+    def count(self, view, method, status):
+        with self.lock:
+            self.requests[view, method, status] += 1
+
+    def record(self, sample):
+        with self.lock:
+            self.requests[sample.view, sample.method, sample.status] += 1
+            histograms = self.histograms.get(sample.view)
+            if histograms is None:
+                histograms = self.histograms[sample.view] = {
+                    name: Histogram(bounds) for name, bounds in BUCKETS.items()
+                }
+            for name, histogram in histograms.items():
+                value = getattr(sample, name)
+                if value is not None:
+                    histogram.observe(value)
+            self.recent.append(sample)
+
+    def snapshot(self):
+        """Copies of the counters, histograms and recent samples, taken under the lock"""
+        with self.lock:
+            histograms = {}
+            for view, by_name in self.histograms.items():
+                histograms[view] = {}
+                for name, histogram in by_name.items():
+                    copy = histograms[view][name] = Histogram(histogram.bounds)
+                    copy.counts = list(histogram.counts)
+                    copy.count, copy.sum, copy.max = histogram.count, histogram.sum, histogram.max
+            return dict(self.requests), histograms, list(self.recent)
+
+
+registry = Registry()
@@ -0,0 +1,12 @@
+# metrics/signals.py
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .instrumentation import time_query
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    """Every connection runs its queries through time_query, once"""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
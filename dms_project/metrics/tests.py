@@ -0,0 +1,86 @@
+# metrics/tests.py
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .registry import Histogram, Sample, registry
+
+SAMPLE_ALL = {'ENABLED': True, 'SAMPLE_RATE': 1, 'BUFFER': 3, 'TOKEN': 'scrape-token'}
+
+
+class HistogramTests(SimpleTestCase):
+
+    def test_buckets_and_quantiles(self):
+        histogram = Histogram((10, 100))
+        for value in (1, 5, 20, 50, 500):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [(10, 2), (100, 4), ('+Inf', 5)])
+        self.assertEqual(histogram.quantile(0.2), 5)  # halfway into the first bucket
+        self.assertEqual(histogram.quantile(0.6), 55)
+        self.assertEqual(histogram.quantile(0.99), 500)  # beyond the last bound: the max
+        self.assertEqual(histogram.mean, 115.2)
+        self.assertIsNone(Histogram((1,)).quantile(0.5))
+
+
+@override_settings(METRICS=SAMPLE_ALL)
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        registry.reset()
+        self.user = User.objects.create_user('alice', password='pw-12345!')
+        self.staff = User.objects.create_user('staff', password='pw-12345!', is_staff=True)
+
+    def samples(self, view):
+        return [sample for sample in registry.snapshot()[2] if sample.view == view]
+
+    def test_records_queries_template_time_and_size(self):
+        self.client.login(username='alice', password='pw-12345!')
+        response = self.client.get(reverse('accounts:dashboard'))
+        sample, = self.samples('accounts:dashboard')
+        self.assertEqual((sample.method, sample.status), ('GET', 200))
+        self.assertGreater(sample.queries, 0)
+        self.assertGreater(sample.query_ms, 0)
+        self.assertGreater(sample.template_ms, 0)
+        self.assertGreaterEqual(sample.duration_ms, sample.query_ms)
+        self.assertEqual(sample.response_bytes, len(response.content))
+
+    def test_ring_buffer_keeps_the_last_samples(self):
+        for _ in range(5):
+            self.client.get(reverse('accounts:login'))
+        requests, histograms, recent = registry.snapshot()
+        self.assertEqual(len(recent), 3)
+        self.assertEqual(requests['accounts:login', 'GET', 200], 5)
+        self.assertEqual(histograms['accounts:login']['duration_ms'].count, 5)
+
+    @override_settings(METRICS={**SAMPLE_ALL, 'SAMPLE_RATE': 0})
+    def test_unsampled_requests_are_only_counted(self):
+        self.client.get(reverse('accounts:login'))
+        self.client.get('/no/such/page/')
+        requests, histograms, recent = registry.snapshot()
+        self.assertEqual(requests, {('accounts:login', 'GET', 200): 1, ('<unresolved>', 'GET', 404): 1})
+        self.assertEqual((histograms, recent), ({}, []))
+
+    def test_dashboard_is_staff_only(self):
+        self.client.login(username='alice', password='pw-12345!')
+        self.assertEqual(self.client.get(reverse('metrics:dashboard')).status_code, 302)
+        self.client.login(username='staff', password='pw-12345!')
+        response = self.client.get(reverse('metrics:dashboard'))
+        self.assertContains(response, '<code>metrics:dashboard</code>')  # the 302 above
+
+    def test_prometheus_export(self):
+        registry.record(Sample(view='documents:detail', method='GET', status=200, duration_ms=30,
+                               queries=4, query_ms=2, template_ms=5, response_bytes=2048))
+        url = reverse('metrics:prometheus')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('dms_requests_total{view="documents:detail",method="GET",status="200"} 1', text)
+        self.assertIn('dms_request_duration_seconds_bucket{view="documents:detail",le="0.025"} 0', text)
+        self.assertIn('dms_request_duration_seconds_bucket{view="documents:detail",le="0.05"} 1', text)
+        self.assertIn('dms_request_duration_seconds_sum{view="documents:detail"} 0.03', text)
+        self.assertIn('dms_request_queries_count{view="documents:detail"} 1', text)
+        self.assertIn('dms_metrics_sample_rate 1', text)
@@ -0,0 +1,10 @@
+# metrics/urls.py
+from django.urls import path
+from . import views
+
+app_name = 'metrics'
+
+urlpatterns = [
+    path('', views.metrics_dashboard, name='dashboard'),
+    path('prometheus/', views.prometheus_metrics, name='prometheus'),
+]
@@ -0,0 +1,38 @@
+# metrics/views.py
+import hmac
+
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import HttpResponse
+from django.shortcuts import render
+
+from .export import prometheus_text, slowest_recent, view_rows
+from .registry import metrics_setting
+
+
+def is_staff_or_admin(user):
+    return user.is_staff or user.is_superuser
+
+
+@login_required(login_url='accounts:login')
+@user_passes_test(is_staff_or_admin)
+def metrics_dashboard(request):
+    """Per-view latency, queries and sizes measured by this process"""
+    return render(request, 'metrics/dashboard.html', {
+        'rows': view_rows(),
+        'slowest': slowest_recent(),
+        'sample_rate': metrics_setting('SAMPLE_RATE', 0.1),
+        'buffer': metrics_setting('BUFFER', 1000),
+    })
+
+
+def _bearer_token_matches(request):
+    token = metrics_setting('TOKEN', '')
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+
+
+def prometheus_metrics(request):
+    """Prometheus text export, for staff or a scraper sending METRICS['TOKEN']"""
+    if not (_bearer_token_matches(request) or is_staff_or_admin(request.user)):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,7 +10,7 @@ class ReviewAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('document', 'reviewer')
+        return super().get_queryset(request).with_dashboard_relations()
 
 @admin.register(ReviewAssignment)
 class ReviewAssignmentAdmin(admin.ModelAdmin):
@@ -20,4 +20,4 @@ class ReviewAssignmentAdmin(admin.ModelAdmin):
     readonly_fields = ['assigned_at']
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('document', 'assigned_to', 'assigned_by')
\ No newline at end of file
+        return super().get_queryset(request).with_dashboard_relations()
\ No newline at end of file
@@ -0,0 +1,75 @@
+# review/decisions.py
+"""Approving and rejecting documents, one at a time or many at once.
+
+A decision applies only to the exact version of each document the reviewer
+looked at (Document.version) and only while the document is still open.
+The check and the status change are one conditional UPDATE, so when two
+reviewers decide the same document concurrently exactly one of them wins;
+the other gets DecisionConflict and nothing of theirs is written.
+"""
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from documents.models import Document
+from documents.signals import documents_bulk_updating
+from .models import Review, ReviewAssignment, ReviewQueueEntry
+from .signals import reviews_bulk_created
+
+DECISIONS = ['approved', 'rejected']
+
+
+class DecisionConflict(Exception):
+    """Some documents were changed or decided since the reviewer loaded them"""
+
+    def __init__(self, document_ids):
+        self.document_ids = document_ids
+        super().__init__(f"Documents changed since they were loaded: {document_ids}")
+
+
+def parse_selection(values):
+    """{document id: version} from 'id:version' form values; malformed ones are dropped"""
+    versions = {}
+    for value in values:
+        pk, _, version = str(value).partition(':')
+        if pk.isdigit() and version.isdigit():
+            versions[int(pk)] = int(version)
+    return versions
+
+
+def decide(reviewer, versions, status, comments=''):
+    """Record one decision on many documents, all or nothing.
+
+    `versions` maps document ids to the version the reviewer saw. Runs one
+    UPDATE of Document, one INSERT of Review rows, one UPDATE of the
+    assignments and one DELETE from the review queue. Returns the number of
+    documents decided; raises DecisionConflict if any of them moved on.
+    """
+    if status not in DECISIONS:
+        raise ValueError(f"Not a decision: {status!r}")
+    if not versions:
+        return 0
+
+    seen = Q()
+    for pk, version in versions.items():
+        seen |= Q(pk=pk, version=version)
+    with transaction.atomic():
+        documents = Document.objects.filter(seen, status__in=ReviewQueueEntry.OPEN_STATUSES)
+        current = set(documents.values_list('pk', flat=True))
+        if current != set(versions):
+            raise DecisionConflict(sorted(set(versions) - current))
+        documents_bulk_updating.send(sender=Document, queryset=documents, changes={'status': status})
+        updated = documents.update(status=status, version=F('version') + 1, updated_at=timezone.now())
+        if updated != len(versions):
+            # Another reviewer got in between the read and the write: undo it all
+            raise DecisionConflict(sorted(versions))
+
+        reviews = Review.objects.bulk_create([
+            Review(document_id=pk, reviewer=reviewer, status=status, comments=comments)
+            for pk in versions
+        ])
+        reviews_bulk_created.send(sender=Review, reviews=reviews)
+        ReviewAssignment.objects.filter(document_id__in=versions, is_active=True).update(is_active=False)
+        # Decided documents are no longer open: they leave the queue
+        ReviewQueueEntry.objects.filter(document_id__in=versions).delete()
+    return updated
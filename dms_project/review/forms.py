@@ -1,11 +1,18 @@
 # review/forms.py
 from django import forms
 from django.contrib.auth.models import User
+from .decisions import parse_selection
 from .models import Review, ReviewAssignment
+from documents.forms import DocumentTagsMixin
 from documents.models import Document
+from documents.tags import split_tags
+from documents.validators import validate_uploaded_file
 
 class ReviewForm(forms.ModelForm):
     """Form for reviewers to submit their decision"""
+    # The document version the reviewer saw (review/decisions.py)
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False, min_value=0)
+    
     class Meta:
         model = Review
         fields = ['status', 'comments']
@@ -15,10 +22,27 @@ class ReviewForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['status'].widget = forms.RadioSelect(choices=[
+        decisions = [
             ('approved', '✅ Approve'),
             ('rejected', '❌ Reject'),
-        ])
+        ]
+        self.fields['status'].choices = decisions
+        self.fields['status'].widget = forms.RadioSelect(choices=decisions)
+
+class SelectionField(forms.MultipleChoiceField):
+    """Selected documents as 'id:version' values, cleaned to {id: version}"""
+    
+    def valid_value(self, value):
+        return bool(parse_selection([value]))
+    
+    def clean(self, value):
+        return parse_selection(super().clean(value))
+
+class BatchReviewForm(forms.Form):
+    """One decision for every document selected on the dashboard"""
+    documents = SelectionField(error_messages={'required': "Select at least one document."})
+    status = forms.ChoiceField(choices=[('approved', 'Approve'), ('rejected', 'Reject')])
+    comments = forms.CharField(widget=forms.Textarea(attrs={'rows': 2}), required=False)
 
 class AssignmentForm(forms.ModelForm):
     """Form for assigning documents to reviewers"""
@@ -35,7 +59,7 @@ class AssignmentForm(forms.ModelForm):
         self.fields['assigned_to'].label = "Assign to Reviewer"
         self.fields['due_date'].required = False
 
-class ResubmissionForm(forms.ModelForm):
+class ResubmissionForm(DocumentTagsMixin, forms.ModelForm):
     """Form for resubmitting rejected documents with NEW file option"""
     
     # Add a file field for new upload
@@ -54,33 +78,39 @@ class ResubmissionForm(forms.ModelForm):
         label="Resubmission Note"
     )
     
+    # Free-text tags, written to Document.tags by DocumentTagsMixin
+    tags = forms.CharField(
+        required=False,
+        help_text="Comma-separated tags",
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'e.g., report, confidential, draft'
+        })
+    )
+    tags_field = 'tags'
+    
     class Meta:
         model = Document
-        fields = ['title', 'description', 'author', 'category', 'tags']
+        fields = ['title', 'description', 'author', 'category']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'rows': 3, 'class': 'form-control'}),
             'author': forms.TextInput(attrs={'class': 'form-control'}),
             'category': forms.Select(attrs={'class': 'form-control'}),
-            'tags': forms.TextInput(attrs={
-                'class': 'form-control',
-                'placeholder': 'e.g., report, confidential, draft'
-            }),
         }
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance and self.instance.pk and not self.is_bound:
+            self.initial['tags'] = ', '.join(self.instance.get_tags_list())
+    
+    def clean_tags(self):
+        return split_tags(self.cleaned_data.get('tags'))
+    
     def clean_new_file(self):
         """Validate the new file if uploaded"""
         new_file = self.cleaned_data.get('new_file')
         if new_file:
-            # Check file size (max 10MB)
-            if new_file.size > 10 * 1024 * 1024:
-                raise forms.ValidationError("File size must be less than 10MB")
-            
-            # Check file extension
-            ext = new_file.name.split('.')[-1].lower()
-            valid_extensions = ['pdf', 'docx', 'xlsx', 'txt', 'jpg', 'png']
-            if ext not in valid_extensions:
-                raise forms.ValidationError(
-                    f"Unsupported file format. Please upload: {', '.join(valid_extensions)}"
-                )
+            # Size (max 10MB), extension and content checks
+            validate_uploaded_file(new_file)
         return new_file
\ No newline at end of file
@@ -0,0 +1,12 @@
+# review/management/commands/rebuild_review_queue.py
+from django.core.management.base import BaseCommand
+
+from review.queue import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized review queue from documents and assignments"
+
+    def handle(self, *args, **options):
+        size = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Review queue rebuilt with {size} entries."))
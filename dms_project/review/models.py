@@ -4,6 +4,15 @@ from django.contrib.auth.models import User
 from documents.models import Document
 from django.utils import timezone
 
+class ReviewQuerySet(models.QuerySet):
+    def with_reviewer(self):
+        """Review history lists"""
+        return self.select_related('reviewer')
+
+    def with_dashboard_relations(self):
+        """Lists that show the document and the reviewer (and __str__)"""
+        return self.select_related('document', 'reviewer')
+
 class Review(models.Model):
     """R-4.3: Review history"""
     REVIEW_STATUS = [
@@ -20,12 +29,30 @@ class Review(models.Model):
     comments = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = ReviewQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Review history and "last rejection" for a document
+            models.Index(fields=['document', 'status', '-created_at'], name='review_doc_status_idx'),
+            # A reviewer's recent reviews
+            models.Index(fields=['reviewer', '-created_at'], name='review_reviewer_created_idx'),
+            # Reviews of a given outcome by day ("approved today")
+            models.Index(fields=['status', 'created_at'], name='review_status_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.document.title} - {self.status} - {self.created_at.date()}"
 
+class ReviewAssignmentQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(is_active=True)
+
+    def with_dashboard_relations(self):
+        """Assignment lists: document, its uploader, and both users (and __str__)"""
+        return self.select_related('document__uploader', 'assigned_to', 'assigned_by')
+
 class ReviewAssignment(models.Model):
     """Assign documents to specific reviewers"""
     document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='assignment')
@@ -35,5 +62,47 @@ class ReviewAssignment(models.Model):
     due_date = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
     
+    objects = ReviewAssignmentQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['assigned_to', 'is_active'], name='assignment_active_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.document.title} → {self.assigned_to.username}"
+
+class ReviewQueueEntryQuerySet(models.QuerySet):
+    def with_dashboard_relations(self):
+        """Queue rows as the dashboard shows them: the document and its uploader"""
+        return self.select_related('document__uploader')
+
+class ReviewQueueEntry(models.Model):
+    """Denormalized row per document waiting on a reviewer (R-4.1 dashboard).
+
+    Only open documents (pending, resubmitted, under review) have an entry,
+    so the dashboard reads the next N straight off a small indexed table.
+    Maintained by review/queue.py on every status transition.
+    """
+    OPEN_STATUSES = ['pending', 'resubmitted', 'under_review']
+    
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='queue_entry')
+    uploader = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20, choices=Document.STATUS_CHOICES)
+    uploaded_at = models.DateTimeField()
+    assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    due_date = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = ReviewQueueEntryQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # "next N waiting", newest first (uploader excluded while scanning)
+            models.Index(fields=['status', '-uploaded_at'], name='queue_status_uploaded_idx'),
+            # "my assignments"
+            models.Index(fields=['assigned_to', '-uploaded_at'], name='queue_assignee_uploaded_idx'),
+        ]
+    
     def __str__(self):
-        return f"{self.document.title} → {self.assigned_to.username}"
\ No newline at end of file
+        return f"{self.document_id} - {self.status}"
@@ -0,0 +1,79 @@
+# review/queue.py
+"""Maintenance and reads for the materialized review queue (ReviewQueueEntry)."""
+from documents.models import Document
+from .models import ReviewAssignment, ReviewQueueEntry
+
+WAITING_STATUSES = ['pending', 'resubmitted']
+
+
+def sync_document(document):
+    """Bring the queue entry for `document` in line with its status and assignment"""
+    if document.status not in ReviewQueueEntry.OPEN_STATUSES:
+        ReviewQueueEntry.objects.filter(document_id=document.pk).delete()
+        return None
+
+    assignment = ReviewAssignment.objects.active().filter(document_id=document.pk).first()
+    entry, _ = ReviewQueueEntry.objects.update_or_create(
+        document_id=document.pk,
+        defaults={
+            'uploader_id': document.uploader_id,
+            'status': document.status,
+            'uploaded_at': document.uploaded_at,
+            'assigned_to_id': assignment.assigned_to_id if assignment else None,
+            'due_date': assignment.due_date if assignment else None,
+        },
+    )
+    return entry
+
+
+def add_new_documents(documents):
+    """Queue entries for freshly bulk-created documents (none has an assignment yet)"""
+    ReviewQueueEntry.objects.bulk_create(
+        [ReviewQueueEntry(document_id=doc.pk, uploader_id=doc.uploader_id, status=doc.status,
+                          uploaded_at=doc.uploaded_at)
+         for doc in documents if doc.status in ReviewQueueEntry.OPEN_STATUSES],
+        batch_size=500,
+    )
+
+
+def next_for_reviewer(reviewer, limit=20):
+    """Newest waiting documents the reviewer did not upload themselves"""
+    entries = (
+        ReviewQueueEntry.objects.filter(status__in=WAITING_STATUSES)
+        .exclude(uploader=reviewer)
+        .with_dashboard_relations()
+        .order_by('-uploaded_at')[:limit]
+    )
+    return [entry.document for entry in entries]
+
+
+def assigned_to(reviewer):
+    """Open documents assigned to the reviewer, as queue entries"""
+    return list(
+        ReviewQueueEntry.objects.filter(assigned_to=reviewer)
+        .with_dashboard_relations()
+        .order_by('-uploaded_at')
+    )
+
+
+def rebuild():
+    """Recreate the whole queue from Document and ReviewAssignment; returns its size"""
+    ReviewQueueEntry.objects.all().delete()
+    assignments = {
+        a.document_id: a
+        for a in ReviewAssignment.objects.active().filter(document__status__in=ReviewQueueEntry.OPEN_STATUSES)
+    }
+    entries = [
+        ReviewQueueEntry(
+            document_id=doc.pk,
+            uploader_id=doc.uploader_id,
+            status=doc.status,
+            uploaded_at=doc.uploaded_at,
+            assigned_to_id=assignments[doc.pk].assigned_to_id if doc.pk in assignments else None,
+            due_date=assignments[doc.pk].due_date if doc.pk in assignments else None,
+        )
+        for doc in Document.objects.filter(status__in=ReviewQueueEntry.OPEN_STATUSES)
+        .only('id', 'uploader_id', 'status', 'uploaded_at').iterator()
+    ]
+    ReviewQueueEntry.objects.bulk_create(entries, batch_size=500)
+    return len(entries)
@@ -0,0 +1,56 @@
+# review/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from dms_project.cache import bump_generation
+
+from documents.models import Document
+from documents.signals import bulk_deleting, documents_bulk_created, documents_bulk_deleting
+from .models import Review
+from .queue import add_new_documents, sync_document
+
+
+# Sent with the Review rows a batch decision (review/decisions.py) created
+# with bulk_create, which sends no post_save.
+reviews_bulk_created = Signal()
+
+
+@receiver(post_save, sender=Document)
+def enqueue_new_document(sender, instance, created, raw=False, **kwargs):
+    """New uploads enter the review queue; later transitions are synced by the review views"""
+    if created and not raw:
+        sync_document(instance)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def expire_review_caches(sender, instance, raw=False, **kwargs):
+    """A review changes what its reviewer and the document's uploader see"""
+    if raw or bulk_deleting.get():
+        return
+    bump_generation(instance.reviewer_id)
+    # Only when the document is already loaded; the views that write reviews
+    # also save the document, which expires the uploader's cache itself.
+    if Review.document.is_cached(instance):
+        bump_generation(instance.document.uploader_id)
+
+
+@receiver(documents_bulk_created)
+def enqueue_new_documents(sender, documents, **kwargs):
+    add_new_documents(documents)
+
+
+@receiver(documents_bulk_deleting)
+def expire_reviewer_caches(sender, queryset, **kwargs):
+    """Reviews go with bulk-deleted documents; their reviewers' pages change"""
+    for reviewer_id in Review.objects.filter(document__in=queryset).order_by().values_list(
+        'reviewer_id', flat=True
+    ).distinct():
+        bump_generation(reviewer_id)
+
+
+@receiver(reviews_bulk_created)
+def expire_batch_reviewer_caches(sender, reviews, **kwargs):
+    # The documents' uploaders were expired by documents_bulk_updating
+    for reviewer_id in {review.reviewer_id for review in reviews}:
+        bump_generation(reviewer_id)
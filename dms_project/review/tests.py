@@ -1,3 +1,194 @@
-from django.test import TestCase
+# review/tests.py
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from dms_project.testing import QueryPlanTestCase
+from accounts.stats import global_stats
+from documents.bulk import Source, delete_documents, ingest
+from documents.models import Document
+from .decisions import decide
+from .models import Review, ReviewAssignment, ReviewQueueEntry
+from .queue import next_for_reviewer, rebuild
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ReviewViewQueryTests(QueryPlanTestCase):
+    """Query budgets and plans for the review views"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='pw-12345!')
+        self.admin = User.objects.create_superuser('admin', password='pw-12345!')
+        self.document = self.add_document('contract')
+        global_stats()  # seed the dashboard counters outside the measured requests
+        self.client.login(username='admin', password='pw-12345!')
+
+    def add_document(self, title, status='pending'):
+        document = Document.objects.create(
+            title=title,
+            uploader=self.owner,
+            file=SimpleUploadedFile(f'{title}.txt', title.encode()),
+        )
+        if status != 'pending':
+            document.status = status
+            document.save()
+        return document
+
+    def grow_queue(self):
+        """More waiting, assigned and reviewed documents"""
+        count = Document.objects.count()
+        for i in range(count, count + 3):
+            self.add_document(f'waiting {i}')
+            assigned = self.add_document(f'assigned {i}', status='under_review')
+            ReviewAssignment.objects.create(document=assigned, assigned_to=self.admin, assigned_by=self.admin)
+            reviewed = self.add_document(f'reviewed {i}', status='approved')
+            Review.objects.create(document=reviewed, reviewer=self.admin, status='approved')
+
+    def test_dashboard(self):
+        self.assertEfficientView('/review/', 7, grow=self.grow_queue)
+
+    def test_review_form(self):
+        self.add_reviews()
+        self.assertEfficientView(f'/review/document/{self.document.pk}/review/', 4, grow=self.add_reviews)
+
+    # The first review of a status on a day also creates its per-day counter
+    # row (accounts/stats.py, bump_daily): 3 queries instead of 1.
+    def test_review_submit(self):
+        self.assertEfficientView(f'/review/document/{self.document.pk}/review/', 23, method='post', status=302, data={
+            'status': 'approved', 'comments': 'fine',
+        })
+        self.assertEqual(Document.objects.get(pk=self.document.pk).status, 'approved')
+
+    def test_review_conflict(self):
+        stale = self.document.version
+        self.document.save()  # someone else touched it after the form was rendered
+        self.client.post(f'/review/document/{self.document.pk}/review/', {
+            'status': 'approved', 'comments': 'fine', 'version': stale,
+        })
+        self.assertEqual(Document.objects.get(pk=self.document.pk).status, 'pending')
+        self.assertFalse(Review.objects.exists())
+
+    def selection(self, documents):
+        return [f'{document.pk}:{document.version}' for document in documents]
+
+    def test_batch_review(self):
+        documents = [self.document] + [self.add_document(f'batch {i}') for i in range(5)]
+        assigned = self.add_document('assigned', status='under_review')
+        ReviewAssignment.objects.create(document=assigned, assigned_to=self.admin, assigned_by=self.admin)
+        documents.append(assigned)
+        self.assertEfficientView('/review/batch/', 24, method='post', status=302, data={
+            'documents': self.selection(documents), 'status': 'rejected', 'comments': 'incomplete',
+        })
+        self.assertEqual(Document.objects.filter(status='rejected').count(), 7)
+        self.assertEqual(Review.objects.filter(status='rejected', reviewer=self.admin).count(), 7)
+        self.assertFalse(ReviewAssignment.objects.active().exists())
+        self.assertEqual(global_stats()['reviews']['rejected'], 7)
+
+    def test_batch_review_conflict(self):
+        documents = [self.document, self.add_document('second')]
+        selection = self.selection(documents)
+        # Another reviewer decides one of them first: the whole batch is refused
+        self.client.post('/review/batch/', {'documents': selection[1:], 'status': 'approved'})
+        self.client.post('/review/batch/', {'documents': selection, 'status': 'rejected'})
+        self.assertEqual(Document.objects.get(pk=self.document.pk).status, 'pending')
+        self.assertEqual(Document.objects.get(pk=documents[1].pk).status, 'approved')
+        self.assertFalse(Review.objects.filter(status='rejected').exists())
+
+    def test_assign(self):
+        # The reviewer picker lists staff users; auth_user has no index on is_staff
+        self.assertEfficientView(f'/review/document/{self.document.pk}/assign/', 4, allow_scans={'auth_user'})
+        self.assertEfficientView(f'/review/document/{self.document.pk}/assign/', 21, method='post', status=302, data={
+            'assigned_to': self.admin.pk,
+        }, allow_scans={'auth_user'})
+
+    def add_reviews(self):
+        for status in ('rejected', 'resubmitted'):
+            reviewer = User.objects.create_user(f'reviewer{Review.objects.count()}')
+            Review.objects.create(document=self.document, reviewer=reviewer, status=status)
+
+    def test_history(self):
+        self.add_reviews()
+        # Reviews with their reviewers, and the file versions
+        self.assertEfficientView(f'/review/document/{self.document.pk}/history/', 5, grow=self.add_reviews)
+
+    def test_resubmit(self):
+        self.document.status = 'rejected'
+        self.document.save()
+        Review.objects.create(document=self.document, reviewer=self.admin, status='rejected')
+        self.client.login(username='owner', password='pw-12345!')
+        self.assertEfficientView(f'/review/document/{self.document.pk}/resubmit/', 5)
+        self.assertEfficientView(f'/review/document/{self.document.pk}/resubmit/', 23, method='post', status=302, data={
+            'title': 'contract v2', 'description': '', 'resubmission_note': 'fixed',
+        })
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ReviewQueueTests(TestCase):
+    """ReviewQueueEntry follows each document through the review"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='pw-12345!')
+        self.admin = User.objects.create_superuser('admin', password='pw-12345!')
+        self.document = Document.objects.create(
+            title='contract', uploader=self.owner, file=SimpleUploadedFile('contract.txt', b'contract'),
+        )
+        self.client.login(username='admin', password='pw-12345!')
+
+    def entry(self, document):
+        """(status, assignee id) of the document's queue entry, or None"""
+        return ReviewQueueEntry.objects.filter(document=document).values_list('status', 'assigned_to_id').first()
+
+    def assertMatchesRebuild(self):
+        entries = sorted(ReviewQueueEntry.objects.values_list('document_id', 'status', 'assigned_to_id'))
+        rebuild()
+        self.assertEqual(sorted(ReviewQueueEntry.objects.values_list('document_id', 'status', 'assigned_to_id')), entries)
+
+    def test_through_assign_reject_and_resubmit(self):
+        self.assertEqual(self.entry(self.document), ('pending', None))
+        self.assertEqual(next_for_reviewer(self.admin), [self.document])
+        self.assertEqual(next_for_reviewer(self.owner), [])  # nobody reviews their own upload
+
+        self.client.post(f'/review/document/{self.document.pk}/assign/', {'assigned_to': self.admin.pk})
+        self.assertEqual(self.entry(self.document), ('under_review', self.admin.pk))
+        self.assertMatchesRebuild()
+
+        self.client.post(f'/review/document/{self.document.pk}/review/', {'status': 'rejected', 'comments': 'no'})
+        self.assertIsNone(self.entry(self.document))
+        self.assertMatchesRebuild()
+
+        self.client.login(username='owner', password='pw-12345!')
+        self.client.post(f'/review/document/{self.document.pk}/resubmit/', {
+            'title': 'contract v2', 'description': '', 'resubmission_note': 'fixed',
+        })
+        self.assertEqual(self.entry(self.document), ('resubmitted', None))
+        self.assertMatchesRebuild()
+
+    def test_batch_decision_leaves_the_queue(self):
+        second = Document.objects.create(
+            title='second', uploader=self.owner, file=SimpleUploadedFile('second.txt', b'second'),
+        )
+        decide(self.admin, {self.document.pk: self.document.version}, 'approved')
+        self.assertIsNone(self.entry(self.document))
+        self.assertEqual(self.entry(second), ('pending', None))
+        self.assertMatchesRebuild()
+
+    def test_bulk_ingest_and_delete(self):
+        sources = [Source(f'{name}.txt', 4, lambda: BytesIO(b'text')) for name in ('a', 'b')]
+        ids = [report['id'] for report in ingest(self.owner, sources)]
+        self.assertEqual([self.entry(pk) for pk in ids], [('pending', None)] * 2)
+        self.assertMatchesRebuild()
+
+        delete_documents(Document.objects.filter(pk__in=ids))
+        self.assertEqual(list(ReviewQueueEntry.objects.values_list('document_id', flat=True)), [self.document.pk])
 
-# Create your tests here.
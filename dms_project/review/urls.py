@@ -9,6 +9,7 @@ urlpatterns = [
     path('', views.review_dashboard, name='dashboard'),
     
     # Review actions
+    path('batch/', views.batch_review, name='batch_review'),
     path('document/<int:doc_id>/review/', views.review_document, name='review_document'),
     path('document/<int:doc_id>/assign/', views.assign_reviewer, name='assign_reviewer'),
     path('document/<int:doc_id>/history/', views.review_history, name='history'),
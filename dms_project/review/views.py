@@ -2,11 +2,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Q
-from django.utils import timezone
+from django.views.decorators.http import require_POST
+from access.policy import get_permitted
 from documents.models import Document
-from .models import Review, ReviewAssignment
-from .forms import ReviewForm, AssignmentForm, ResubmissionForm
+from accounts.stats import GLOBAL, global_stats, today_count
+from .models import Review
+from .queue import assigned_to, next_for_reviewer, sync_document
+from .decisions import DecisionConflict, decide
+from .forms import BatchReviewForm, ReviewForm, AssignmentForm, ResubmissionForm
 
 # Helper function to check if user is staff/admin
 def is_staff_or_admin(user):
@@ -18,42 +21,29 @@ def is_staff_or_admin(user):
 def review_dashboard(request):
     """Dashboard for reviewers to see pending documents INCLUDING resubmitted ones"""
     
-    # Get ALL pending documents (including resubmitted ones)
-    # Status can be 'pending' OR 'resubmitted' (if you add that status)
-    pending_docs = Document.objects.filter(
-        Q(status='pending') | Q(status='resubmitted')
-    ).exclude(
-        uploader=request.user  # Exclude reviewer's own documents
-    ).order_by('-uploaded_at')
-    
-    # Documents assigned to current reviewer
-    my_assignments = ReviewAssignment.objects.filter(
-        assigned_to=request.user,
-        is_active=True,
-        document__status__in=['pending', 'resubmitted', 'under_review']
-    ).select_related('document')
+    # Waiting documents and my assignments come off the materialized queue
+    # (review/queue.py); counts come from the dashboard counters.
+    pending_docs = next_for_reviewer(request.user, limit=20)
+    my_assignments = assigned_to(request.user)
     
     # Recently reviewed (including resubmissions)
     recent_reviews = Review.objects.filter(
         reviewer=request.user
-    ).select_related('document')[:10]
+    ).with_dashboard_relations()[:10]
     
-    # Statistics - include resubmitted in pending count
+    # Statistics - include resubmitted in pending count; approved today
+    # is one row of the per-day counters (accounts/stats.py)
+    counts = global_stats()['documents']
     stats = {
-        'pending': Document.objects.filter(
-            Q(status='pending') | Q(status='resubmitted')
-        ).count(),
-        'under_review': Document.objects.filter(status='under_review').count(),
-        'approved_today': Review.objects.filter(
-            status='approved',
-            created_at__date=timezone.now().date()
-        ).count(),
-        'my_pending': my_assignments.count(),
-        'resubmitted': Document.objects.filter(status='resubmitted').count(),
+        'pending': counts['pending'] + counts['resubmitted'],
+        'under_review': counts['under_review'],
+        'approved_today': today_count(GLOBAL, 'reviews:approved'),
+        'my_pending': len(my_assignments),
+        'resubmitted': counts['resubmitted'],
     }
     
     context = {
-        'pending_documents': pending_docs[:20],
+        'pending_documents': pending_docs,
         'my_assignments': my_assignments,
         'recent_reviews': recent_reviews,
         'stats': stats,
@@ -65,10 +55,10 @@ def review_dashboard(request):
 @user_passes_test(is_staff_or_admin)
 def review_document(request, doc_id):
     """Submit review for a document"""
-    document = get_object_or_404(Document, id=doc_id)
+    document = get_object_or_404(Document.objects.with_review_history(), id=doc_id)
     
-    # Check if already reviewed
-    existing_review = Review.objects.filter(document=document).first()
+    # Check if already reviewed (reviews are prefetched newest first)
+    existing_review = next(iter(document.reviews.all()), None)
     if existing_review and existing_review.status in ['approved', 'rejected']:
         messages.warning(request, "This document has already been reviewed.")
         return redirect('review:dashboard')
@@ -76,29 +66,23 @@ def review_document(request, doc_id):
     if request.method == 'POST':
         form = ReviewForm(request.POST)
         if form.is_valid():
-            review = form.save(commit=False)
-            review.document = document
-            review.reviewer = request.user
-            
-            # Update document status (R-4.1)
-            document.status = review.status
-            document.save()
-            
-            review.save()
-            
-            # Deactivate assignment if exists
-            ReviewAssignment.objects.filter(
-                document=document, 
-                is_active=True
-            ).update(is_active=False)
+            status = form.cleaned_data['status']
+            # The version the form was rendered with; the one just read otherwise
+            version = form.cleaned_data['version']
+            try:
+                decide(request.user, {document.pk: document.version if version is None else version},
+                       status, form.cleaned_data['comments'])
+            except DecisionConflict:
+                messages.error(request, f'Document "{document.title}" was changed or reviewed by someone else meanwhile.')
+                return redirect('review:review_document', doc_id=document.pk)
             
             messages.success(
                 request, 
-                f'Document "{document.title}" has been {review.status}.'
+                f'Document "{document.title}" has been {status}.'
             )
             return redirect('review:dashboard')
     else:
-        form = ReviewForm()
+        form = ReviewForm(initial={'version': document.version})
     
     # Get review history (R-4.3)
     review_history = document.reviews.all()
@@ -110,6 +94,29 @@ def review_document(request, doc_id):
     }
     return render(request, 'review/review_document.html', context)
 
+# R-4.1: Approve or reject many documents at once from the dashboard
+@login_required(login_url='accounts:login')
+@user_passes_test(is_staff_or_admin)
+@require_POST
+def batch_review(request):
+    form = BatchReviewForm(request.POST)
+    if not form.is_valid():
+        messages.error(request, next(iter(form.errors.values()))[0])
+        return redirect('review:dashboard')
+    
+    status = form.cleaned_data['status']
+    try:
+        count = decide(request.user, form.cleaned_data['documents'], status, form.cleaned_data['comments'])
+    except DecisionConflict as exc:
+        messages.error(
+            request,
+            f"Nothing was changed: {len(exc.document_ids)} of the selected documents were changed "
+            f"or reviewed by someone else meanwhile. Please check the list and try again."
+        )
+        return redirect('review:dashboard')
+    messages.success(request, f'{count} document(s) {status}.')
+    return redirect('review:dashboard')
+
 # R-4.2: Resubmit rejected document
 # review/views.py - Updated resubmit_document function
 # review/views.py - Updated resubmit_document
@@ -133,19 +140,16 @@ def resubmit_document(request, doc_id):
             # Check if new file was uploaded
             new_file = form.cleaned_data.get('new_file')
             if new_file:
-                # Delete old file if it exists
-                if document.file:
-                    document.file.delete(save=False)
+                # Saving stores the new file in the blob store (setting its
+                # type and size) and keeps the old one as a version
+                # (documents/versions.py)
                 document.file = new_file
-                
-                # Auto-update file_type and file_size
-                ext = new_file.name.split('.')[-1].lower()
-                document.file_type = ext
-                document.file_size = new_file.size
             
             # IMPORTANT: Set status to 'resubmitted' instead of 'pending'
             document.status = 'resubmitted'  # ← CHANGED FROM 'pending'
             document.save()
+            form.save_m2m()
+            sync_document(document)
             
             # Create review record for resubmission
             Review.objects.create(
@@ -159,7 +163,7 @@ def resubmit_document(request, doc_id):
             return redirect('documents:detail', doc_id=document.id)
     else:
         form = ResubmissionForm(instance=document)
-        last_rejection = document.reviews.filter(status='rejected').first()
+        last_rejection = document.reviews.filter(status='rejected').with_reviewer().first()
     
     context = {
         'document': document,
@@ -172,18 +176,20 @@ def resubmit_document(request, doc_id):
 @login_required(login_url='accounts:login')
 def review_history(request, doc_id):
     """View complete review history"""
-    document = get_object_or_404(Document, id=doc_id)
-    
-    # Check permissions
-    if document.uploader != request.user and not request.user.is_staff:
+    # Whoever may view the document (access/policy.py)
+    document = get_permitted(request.user, doc_id, Document.objects.with_review_history())
+    if document is None:
         messages.error(request, "You don't have permission to view this history.")
         return redirect('documents:my_documents')
     
     reviews = document.reviews.all()
+    # Earlier files, for download and diffs (documents/versions.py)
+    versions = document.versions.all()
     
     context = {
         'document': document,
         'reviews': reviews,
+        'versions': versions,
     }
     return render(request, 'review/history.html', context)
 
@@ -205,6 +211,7 @@ def assign_reviewer(request, doc_id):
             # Update document status
             document.status = 'under_review'
             document.save()
+            sync_document(document)
             
             messages.success(
                 request, 
@@ -0,0 +1,262 @@
+# search/backends.py
+"""Pluggable full-text search backends for R-3.1.
+
+A backend narrows a Document queryset to the rows matching a free-text query
+and annotates each row with a `rank` (higher is better). Pick one with the
+SEARCH_BACKEND setting; when it is None the backend is chosen from the
+database vendor: MySQL gets its native FULLTEXT index, everything else
+(SQLite test runs included) gets the portable inverted index in SearchTerm.
+"""
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import BooleanField, FloatField, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from documents.models import Document
+from .models import DocumentContent, SearchTerm
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+# Field weights used when ranking: a hit in the title beats a hit in the body.
+FIELD_WEIGHTS = {
+    'title': 4,
+    'tags': 3,
+    'author': 2,
+    'description': 1,
+    'content': 1,
+}
+
+
+def tokenize(text):
+    """Split text into lowercase search terms"""
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall((text or '').lower())]
+
+
+def query_terms(query):
+    """Unique terms of a user query, in order, capped at MAX_QUERY_TERMS"""
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+def document_fields(document):
+    """Yield (field, text) pairs that get indexed for a document"""
+    yield 'title', document.title
+    yield 'description', document.description
+    yield 'author', document.author
+    # The denormalized copy: indexing runs on every save and should not query
+    yield 'tags', document.tag_names.replace(',', ' ')
+    # Text extracted from the file itself (search/extraction.py), if any yet
+    try:
+        yield 'content', document.content.text
+    except DocumentContent.DoesNotExist:
+        pass
+
+
+def prefix_range(term):
+    """Terms starting with `term`, as a range the term index can seek on.
+
+    `term__startswith` compiles to LIKE ... ESCAPE on SQLite and LIKE BINARY
+    on MySQL, and neither lets the planner use the index.
+    """
+    upper = term[:-1] + chr(ord(term[-1]) + 1)
+    return Q(term__gte=term, term__lt=upper)
+
+
+class BaseSearchBackend:
+    """Interface every search backend implements"""
+
+    def search(self, queryset, query):
+        """Filter queryset to documents matching query, annotated with `rank`"""
+        raise NotImplementedError
+
+    def index_document(self, document):
+        """(Re)index a single saved document"""
+
+    def index_documents(self, documents):
+        """(Re)index many saved documents (bulk writes, which send no signals)"""
+        for document in documents:
+            self.index_document(document)
+
+    def rebuild(self, batch_size=500, stdout=None):
+        """Rebuild the whole index, returning the number of documents indexed"""
+        raise NotImplementedError
+
+    def ensure_index(self, using=DEFAULT_DB_ALIAS):
+        """Create database objects the backend needs; True if any were created.
+
+        Runs after every `migrate` (search/signals.py).
+        """
+        return False
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """Portable backend storing one SearchTerm row per (term, document).
+
+    Every query term must prefix-match a term of the document; rank is the sum
+    of the weights of the matching terms. Index rows are rewritten on every
+    Document save and go away with the document through the FK cascade.
+    """
+
+    def document_terms(self, document):
+        weights = Counter()
+        for field, text in document_fields(document):
+            for term in tokenize(text):
+                weights[term] += FIELD_WEIGHTS[field]
+        return weights
+
+    def _build_rows(self, document):
+        return [
+            SearchTerm(term=term, document_id=document.pk, weight=weight)
+            for term, weight in self.document_terms(document).items()
+        ]
+
+    def index_document(self, document):
+        with transaction.atomic():
+            SearchTerm.objects.filter(document_id=document.pk).delete()
+            SearchTerm.objects.bulk_create(self._build_rows(document))
+
+    def index_documents(self, documents):
+        documents = list(documents)
+        rows = [row for document in documents for row in self._build_rows(document)]
+        with transaction.atomic():
+            SearchTerm.objects.filter(document_id__in=[document.pk for document in documents]).delete()
+            SearchTerm.objects.bulk_create(rows, batch_size=500)
+
+    def rebuild(self, batch_size=500, stdout=None):
+        SearchTerm.objects.all().delete()
+        indexed = 0
+        rows = []
+        documents = Document.objects.select_related('content').order_by()
+        for document in documents.iterator(chunk_size=batch_size):
+            rows.extend(self._build_rows(document))
+            indexed += 1
+            if len(rows) >= batch_size:
+                SearchTerm.objects.bulk_create(rows, batch_size=batch_size)
+                rows = []
+            if stdout and indexed % batch_size == 0:
+                stdout.write(f"  indexed {indexed} documents")
+        SearchTerm.objects.bulk_create(rows, batch_size=batch_size)
+        return indexed
+
+    def search(self, queryset, query):
+        terms = query_terms(query)
+        if not terms:
+            return queryset.none()
+
+        any_term = Q()
+        for term in terms:
+            # All terms are required; each one is an indexed prefix lookup.
+            queryset = queryset.filter(
+                pk__in=SearchTerm.objects.filter(prefix_range(term)).values('document_id')
+            )
+            any_term |= prefix_range(term)
+
+        rank = (
+            SearchTerm.objects.filter(any_term, document=OuterRef('pk'))
+            .order_by()
+            .values('document')
+            .annotate(total=Sum('weight'))
+            .values('total')
+        )
+        return queryset.annotate(rank=Subquery(rank, output_field=IntegerField()))
+
+
+class MySQLFullTextBackend(BaseSearchBackend):
+    """MySQL backend using a FULLTEXT index over the searchable columns.
+
+    The index is maintained by MySQL itself, so indexing a document is a
+    no-op. Django cannot express FULLTEXT in migrations, so `ensure_index`
+    creates the indexes after every `migrate`; `rebuild` also optimizes them.
+    Extracted file text has its own FULLTEXT index on DocumentContent; each
+    query term is matched against both and its relevances are added.
+    """
+    index_name = 'documents_document_fulltext'
+    columns = ('title', 'description', 'author', 'tag_names')
+    content_index_name = 'search_documentcontent_fulltext'
+
+    def _term_sql(self):
+        """Relevance of one boolean-mode term in the metadata plus the extracted text"""
+        qn = connection.ops.quote_name
+        table = qn(Document._meta.db_table)
+        cols = ', '.join(
+            f"{table}.{qn(Document._meta.get_field(name).column)}" for name in self.columns
+        )
+        content_table = qn(DocumentContent._meta.db_table)
+        content_match = (
+            f"(SELECT MATCH (c.{qn('text')}) AGAINST (%s IN BOOLEAN MODE) "
+            f"FROM {content_table} c WHERE c.{qn('document_id')} = {table}.{qn('id')})"
+        )
+        return f"(MATCH ({cols}) AGAINST (%s IN BOOLEAN MODE) + COALESCE({content_match}, 0))"
+
+    def _ensure_fulltext(self, cursor, model, index_name, columns):
+        qn = cursor.db.ops.quote_name
+        table = model._meta.db_table
+        cursor.execute(
+            "SELECT 1 FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+            [table, index_name],
+        )
+        if cursor.fetchone():
+            return False
+        cols = ', '.join(qn(model._meta.get_field(name).column) for name in columns)
+        cursor.execute(f"CREATE FULLTEXT INDEX {qn(index_name)} ON {qn(table)} ({cols})")
+        return True
+
+    def ensure_index(self, using=DEFAULT_DB_ALIAS):
+        if connections[using].vendor != 'mysql':
+            return False
+        with connections[using].cursor() as cursor:
+            created = self._ensure_fulltext(cursor, Document, self.index_name, self.columns)
+            created |= self._ensure_fulltext(cursor, DocumentContent, self.content_index_name, ('text',))
+        return created
+
+    def rebuild(self, batch_size=500, stdout=None):
+        if self.ensure_index():
+            if stdout:
+                stdout.write("  created FULLTEXT indexes")
+        else:
+            with connection.cursor() as cursor:
+                for model in (Document, DocumentContent):
+                    cursor.execute(f"OPTIMIZE TABLE {connection.ops.quote_name(model._meta.db_table)}")
+        return Document.objects.count()
+
+    def search(self, queryset, query):
+        terms = query_terms(query)
+        if not terms:
+            return queryset.none()
+        term_sql = self._term_sql()
+        for term in terms:
+            # Every term is required, as a prefix, but may match in any field or
+            # the file text: the same semantics as the portable backend.
+            queryset = queryset.filter(
+                RawSQL(f"{term_sql} > 0", [f'{term}*'] * 2, output_field=BooleanField())
+            )
+        rank = RawSQL(
+            ' + '.join([term_sql] * len(terms)),
+            [param for term in terms for param in [f'{term}*'] * 2],
+            output_field=FloatField(),
+        )
+        return queryset.annotate(rank=rank)
+
+
+def default_backend_path():
+    if connection.vendor == 'mysql':
+        return 'search.backends.MySQLFullTextBackend'
+    return 'search.backends.InvertedIndexBackend'
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_search_backend():
+    """Return the configured search backend instance"""
+    path = getattr(settings, 'SEARCH_BACKEND', None) or default_backend_path()
+    return _load_backend(path)
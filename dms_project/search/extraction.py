@@ -0,0 +1,103 @@
+# search/extraction.py
+"""Off-request content extraction, run as background jobs (jobs app).
+
+DocumentContent rows record the state of each document's extraction for the
+pages that show it; the work itself is a `search.extract_content` job keyed
+by document and file, so one file is extracted once however often the
+document is saved.
+"""
+import logging
+
+from django.conf import settings
+
+from documents.models import Document
+from jobs.queue import enqueue, enqueue_many
+from .backends import get_search_backend
+from .extractors import ExtractionUnavailable, extract_text
+from .models import DocumentContent
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CHUNK_SIZE': 64 * 1024,
+    'MAX_TEXT_CHARS': 1_000_000,
+}
+
+
+def extraction_setting(name):
+    return getattr(settings, 'CONTENT_EXTRACTION', {}).get(name, DEFAULTS[name])
+
+
+def queue_document(document, created=False, force=False):
+    """Queue extraction of the document's current file"""
+    file_name = document.file.name or ''
+    if created or not DocumentContent.objects.filter(document_id=document.pk).update(
+        file_name=file_name, status='queued', error=''
+    ):
+        DocumentContent.objects.create(document_id=document.pk, file_name=file_name)
+    # A resubmission back to an earlier file (A -> B -> A) finds that file's
+    # job already done: requeue it, or the row just reset would stay queued
+    enqueue('search.extract_content', document.pk, file_name,
+            key=f'extract:{document.pk}:{file_name}', force=force or not created)
+
+
+def queue_new_documents(documents):
+    """Queue extraction of freshly bulk-created documents: two inserts in all"""
+    contents = DocumentContent.objects.bulk_create(
+        [DocumentContent(document_id=document.pk, file_name=document.file.name) for document in documents],
+        batch_size=500,
+    )
+    for document, content in zip(documents, contents):
+        document.content = content  # so indexing them does not look it up
+    enqueue_many(
+        'search.extract_content',
+        [[document.pk, document.file.name] for document in documents],
+        keys=[f'extract:{document.pk}:{document.file.name}' for document in documents],
+    )
+
+
+def extract_document_content(document_id, file_name):
+    """Job: extract one document file's text and refresh its search index entry"""
+    # Only work on the file we were queued for: a resubmission may have replaced it.
+    claimed = DocumentContent.objects.filter(
+        document_id=document_id, file_name=file_name, status__in=['queued', 'processing', 'failed']
+    ).update(status='processing')
+    if not claimed:
+        return None
+    content = DocumentContent.objects.select_related('document').get(document_id=document_id)
+    document = content.document
+    text, truncated, status, error = '', False, 'done', ''
+    try:
+        with document.file.open('rb') as fileobj:
+            text, truncated = extract_text(
+                fileobj,
+                document.file_type,
+                max_chars=extraction_setting('MAX_TEXT_CHARS'),
+                chunk_size=extraction_setting('CHUNK_SIZE'),
+            )
+    except ExtractionUnavailable as exc:
+        status, error = 'skipped', str(exc)
+    except Exception as exc:
+        # Recorded for the page, then raised again so the job is retried
+        DocumentContent.objects.filter(pk=content.pk, file_name=file_name).update(status='failed', error=str(exc))
+        raise
+
+    finished = DocumentContent.objects.filter(
+        pk=content.pk, status='processing', file_name=file_name
+    ).update(text=text, truncated=truncated, status=status, error=error)
+    if finished and status == 'done':
+        content.text = text  # document.content is this (now stale) instance
+        get_search_backend().index_document(document)
+    return status
+
+
+def backfill(queue_all=False, batch_size=500):
+    """Queue extraction for documents never extracted (or, with queue_all, every document)"""
+    documents = Document.objects.order_by()
+    if not queue_all:
+        documents = documents.filter(content__isnull=True)
+    queued = 0
+    for document in documents.only('id', 'file').iterator(chunk_size=batch_size):
+        queue_document(document, force=True)
+        queued += 1
+    return queued
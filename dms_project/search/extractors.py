@@ -0,0 +1,98 @@
+# search/extractors.py
+"""Streaming text extractors, one per supported file format.
+
+Each extractor takes an open binary file and yields text pieces as it reads,
+page by page (PDF), element by element (DOCX/XLSX XML parts) or chunk by
+chunk (TXT), so the caller can stop as soon as its memory budget is spent.
+"""
+import codecs
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+class ExtractionUnavailable(Exception):
+    """No extractor can handle this file"""
+
+
+def extract_txt(fileobj, chunk_size):
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+
+def extract_pdf(fileobj, chunk_size):
+    # Optional dependency, imported when needed: without it PDFs are skipped
+    # (DocumentContent status 'skipped'), not failed and retried
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ExtractionUnavailable("pypdf is not installed") from None
+    reader = PdfReader(fileobj)
+    for page in reader.pages:
+        yield (page.extract_text() or '') + '\n'
+
+
+def _iter_xml_text(stream, text_tag, break_tag=None):
+    """Yield the text of every `text_tag` element, freeing elements as we go"""
+    for event, elem in iterparse(stream, events=('end',)):
+        if elem.tag == text_tag:
+            if elem.text:
+                yield elem.text
+        elif break_tag and elem.tag == break_tag:
+            yield '\n'
+            elem.clear()
+
+
+def extract_docx(fileobj, chunk_size):
+    with zipfile.ZipFile(fileobj) as archive:
+        with archive.open('word/document.xml') as part:
+            yield from _iter_xml_text(part, f'{WORD_NS}t', f'{WORD_NS}p')
+
+
+def extract_xlsx(fileobj, chunk_size):
+    with zipfile.ZipFile(fileobj) as archive:
+        names = archive.namelist()
+        # Cell text lives in the shared string table; inline strings are rare
+        # but are stored in the sheets themselves.
+        if 'xl/sharedStrings.xml' in names:
+            with archive.open('xl/sharedStrings.xml') as part:
+                yield from _iter_xml_text(part, f'{SHEET_NS}t', f'{SHEET_NS}si')
+        for name in sorted(n for n in names if n.startswith('xl/worksheets/') and n.endswith('.xml')):
+            with archive.open(name) as part:
+                yield from _iter_xml_text(part, f'{SHEET_NS}t', f'{SHEET_NS}row')
+
+
+EXTRACTORS = {
+    'txt': extract_txt,
+    'pdf': extract_pdf,
+    'docx': extract_docx,
+    'xlsx': extract_xlsx,
+}
+
+
+def extract_text(fileobj, file_type, max_chars, chunk_size=64 * 1024):
+    """Return (text, truncated) using at most max_chars of extracted text"""
+    extractor = EXTRACTORS.get(file_type)
+    if extractor is None:
+        raise ExtractionUnavailable(f"No extractor for {file_type!r} files")
+
+    pieces = []
+    size = 0
+    pieces_iter = extractor(fileobj, chunk_size)
+    try:
+        for piece in pieces_iter:
+            if size + len(piece) > max_chars:
+                pieces.append(piece[:max_chars - size])
+                return ''.join(pieces), True
+            pieces.append(piece)
+            size += len(piece)
+    finally:
+        pieces_iter.close()
+    return ''.join(pieces), False
@@ -0,0 +1,221 @@
+# search/facets.py
+"""Facet counts for the search page: file type, category, status, tag, month.
+
+Counts come from one of two places:
+
+* FacetCell, a per-user table of document counts by (file type, category,
+  status, upload month). Any combination of those filters is answered by
+  summing the user's cells, however many documents they have.
+* One grouped aggregation over the filtered queryset, when the filters
+  include something the cells cannot answer (a text query, a date range
+  or a tag), or when the user also sees documents of others
+  (access/policy.py), which their cells do not count.
+
+Tag counts come from UserTagCount for the user's own unfiltered set,
+otherwise from one grouped query over DocumentTag. Results are cached per user and
+filter set through dms_project/cache.py.
+"""
+import calendar
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Count, DateField, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from access.policy import only_own_documents
+from dms_project.cache import bump_generation, bump_shared_generation, cached
+from dms_project.dates import date_range
+
+from documents.models import Document, DocumentTag
+from documents.tags import user_tags
+from .models import FacetCell
+
+FACETS = ('file_type', 'category', 'status', 'tag', 'month')
+# Filters a FacetCell lookup can answer on its own
+CELL_FILTERS = {'file_type', 'category', 'status', 'month'}
+
+
+def month_start(value):
+    """First day of the (local) month of a datetime, as FacetCell.month stores it"""
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date().replace(day=1)
+
+
+def parse_month(value):
+    """'2024-03' -> date(2024, 3, 1), or None"""
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def month_range(month):
+    """Aware [start, end) datetimes covering a month, for an index range scan"""
+    days = calendar.monthrange(month.year, month.month)[1]
+    return date_range(month, month.replace(day=days))
+
+
+# --- FacetCell maintenance -------------------------------------------------
+
+def cell_key(document):
+    """(user_id, file_type, category, status, month) a document is counted under"""
+    return (
+        document.uploader_id,
+        document.file_type,
+        document.category or '',
+        document.status,
+        month_start(document.uploaded_at),
+    )
+
+
+def adjust_cell(key, delta):
+    """Move one cell by delta; users whose cells were never seeded are skipped"""
+    user_id, file_type, category, status, month = key
+    cells = FacetCell.objects.filter(
+        user_id=user_id, file_type=file_type, category=category, status=status, month=month
+    )
+    if delta < 0:
+        cells.filter(count__gte=-delta).update(count=F('count') + delta)
+        return
+    if cells.update(count=F('count') + delta):
+        return
+    if not FacetCell.objects.filter(user_id=user_id).exists():
+        return  # seeded from Document on the user's next search
+    FacetCell.objects.bulk_create(
+        [FacetCell(user_id=user_id, file_type=file_type, category=category, status=status, month=month)],
+        ignore_conflicts=True,
+    )
+    cells.update(count=F('count') + delta)
+
+
+def cell_counts(documents):
+    """Counter {cell key: documents} for a list of documents or a queryset.
+
+    A queryset is counted with one GROUP BY instead of being loaded.
+    """
+    if isinstance(documents, (list, tuple)):
+        return Counter(cell_key(document) for document in documents)
+    rows = (
+        documents.order_by()
+        .values_list('uploader_id', 'file_type', 'category', 'status',
+                     TruncMonth('uploaded_at', output_field=DateField()))
+        .annotate(count=Count('id'))
+    )
+    counts = Counter()
+    for user_id, file_type, category, status, month, count in rows:
+        counts[user_id, file_type, category or '', status, month] += count
+    return counts
+
+
+def adjust_cells(counts, sign=1):
+    """adjust_cell for every key of a cell_counts() Counter, scaled by sign"""
+    for key, count in counts.items():
+        adjust_cell(key, sign * count)
+
+
+def _grouped(queryset):
+    """[(file_type, category, status, month, count), ...] in one GROUP BY"""
+    return list(
+        queryset.order_by()
+        .values_list('file_type', 'category', 'status', TruncMonth('uploaded_at', output_field=DateField()))
+        .annotate(count=Count('id'))
+    )
+
+
+def seed_cells(user_id):
+    """Build a user's cells from Document; returns the rows written"""
+    rows = _grouped(Document.objects.filter(uploader_id=user_id))
+    FacetCell.objects.bulk_create(
+        [FacetCell(user_id=user_id, file_type=file_type, category=category or '', status=status,
+                   month=month, count=count)
+         for file_type, category, status, month, count in rows],
+        ignore_conflicts=True,
+    )
+    return rows
+
+
+def rebuild(user_ids=None):
+    """Recompute cells for the given users (default: everyone with documents)"""
+    if user_ids is None:
+        user_ids = Document.objects.order_by().values_list('uploader_id', flat=True).distinct()
+        FacetCell.objects.all().delete()
+    else:
+        FacetCell.objects.filter(user_id__in=user_ids).delete()
+    rebuilt = 0
+    for user_id in list(user_ids):
+        seed_cells(user_id)
+        bump_generation(user_id)
+        rebuilt += 1
+    bump_shared_generation()
+    return rebuilt
+
+
+# --- Reading -----------------------------------------------------------------
+
+def _cell_rows(user_id, filters):
+    rows = list(
+        FacetCell.objects.filter(user_id=user_id, count__gt=0)
+        .values_list('file_type', 'category', 'status', 'month', 'count')
+    )
+    if not rows:
+        rows = [row for row in seed_cells(user_id) if row[-1]]
+    month = parse_month(filters.get('month'))
+    wanted = {
+        0: filters.get('file_type'),
+        1: filters.get('category'),
+        2: filters.get('status'),
+        3: month,
+    }
+    return [row for row in rows if all(row[i] == value for i, value in wanted.items() if value)]
+
+
+def _tag_counts(user_id, filters, queryset, own):
+    if own and not filters:
+        return user_tags(user_id)
+    rows = (
+        DocumentTag.objects.filter(document__in=queryset.order_by().values('pk'))
+        .values_list('tag__name')
+        .annotate(count=Count('id'))
+        .order_by('tag__name')
+    )
+    return list(rows)
+
+
+def compute_facets(user_id, filters, queryset, own=True):
+    """{facet: [(value, count), ...]} for the filtered set; see the module docstring.
+
+    `own` says the queryset holds only the user's own documents.
+    """
+    if own and set(filters) <= CELL_FILTERS:
+        rows = _cell_rows(user_id, filters)
+    else:
+        rows = _grouped(queryset)
+
+    counters = {name: Counter() for name in ('file_type', 'category', 'status', 'month')}
+    for file_type, category, status, month, count in rows:
+        counters['file_type'][file_type] += count
+        if category:
+            counters['category'][category] += count
+        counters['status'][status] += count
+        counters['month'][month] += count
+
+    facets = {name: sorted(counter.items()) for name, counter in counters.items()}
+    facets['month'].reverse()  # newest first
+    facets['tag'] = _tag_counts(user_id, filters, queryset, own)
+    return facets
+
+
+def get_facets(user, filters, queryset):
+    """Facet counts for `queryset` (the documents the user may see, after `filters`), cached.
+
+    `filters` maps filter names to the non-empty values the request used.
+    """
+    own = only_own_documents(user)
+    return cached(
+        user.pk, 'search:facets', sorted(filters.items()),
+        lambda: compute_facets(user.pk, filters, queryset, own),
+        timeout=settings.SEARCH_FACET_CACHE_TIMEOUT, shared=not own,
+    )
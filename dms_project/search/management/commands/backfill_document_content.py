@@ -0,0 +1,23 @@
+# search/management/commands/backfill_document_content.py
+from django.core.management.base import BaseCommand
+
+from jobs.worker import run_workers
+from search.extraction import backfill
+
+
+class Command(BaseCommand):
+    help = "Queue text extraction for documents already in MEDIA_ROOT"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Re-extract every document, not only those never extracted")
+        parser.add_argument('--run', action='store_true',
+                            help="Run the job queue right away instead of leaving it to run_workers")
+        parser.add_argument('--workers', type=int, default=None)
+
+    def handle(self, *args, **options):
+        queued = backfill(queue_all=options['all'])
+        self.stdout.write(f"Queued {queued} documents for extraction.")
+        if options['run']:
+            processed = run_workers(workers=options['workers'], once=True, stdout=self.stdout)
+            self.stdout.write(self.style.SUCCESS(f"Ran {processed} jobs."))
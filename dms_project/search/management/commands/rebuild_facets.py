@@ -0,0 +1,16 @@
+# search/management/commands/rebuild_facets.py
+from django.core.management.base import BaseCommand
+
+from search.facets import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-user facet count table used by the search page"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="Only rebuild this user id (repeatable)")
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild(options['users'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt facet counts for {rebuilt} users."))
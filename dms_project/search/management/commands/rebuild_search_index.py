@@ -0,0 +1,17 @@
+# search/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+
+from search.backends import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for all documents"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        self.stdout.write(f"Rebuilding search index with {backend.__class__.__name__}...")
+        indexed = backend.rebuild(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} documents."))
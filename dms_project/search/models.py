@@ -1,3 +1,80 @@
+# search/models.py
+from django.contrib.auth.models import User
 from django.db import models
+from documents.models import Document
 
-# Create your models here.
+
+class SearchTerm(models.Model):
+    """Inverted index row: one normalized term of one document.
+
+    Used by the portable search backend (SQLite, or any database without a
+    native full-text index). `weight` is the summed field weight of every
+    occurrence of the term in the document and is what results are ranked by.
+    """
+    term = models.CharField(max_length=64)
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'document'], name='search_term_document_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} → {self.document_id} ({self.weight})"
+
+
+class DocumentContent(models.Model):
+    """Text extracted from a document's file, read by the search index.
+
+    New uploads and resubmissions with a new file reset the row to `queued`
+    and queue a `search.extract_content` job (search/extraction.py).
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    ]
+
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='content')
+    file_name = models.CharField(max_length=255, blank=True, help_text="File the text was extracted from")
+    text = models.TextField(blank=True)
+    truncated = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='search_content_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.document_id} - {self.status}"
+
+
+class FacetCell(models.Model):
+    """Precomputed facet counts: documents per user and (type, category, status, month).
+
+    Summing cells answers the facet counts for any combination of those
+    filters without touching Document. Kept current by search/signals.py and
+    rebuilt with `manage.py rebuild_facets`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    file_type = models.CharField(max_length=10)
+    category = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=20)
+    month = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'file_type', 'category', 'status', 'month'], name='facet_cell_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.file_type}/{self.category}/{self.status}/{self.month:%Y-%m} = {self.count}"
@@ -0,0 +1,162 @@
+# search/pagination.py
+"""Keyset (seek) pagination for search results.
+
+Instead of OFFSET, each page is fetched with a WHERE on the last row's sort
+key and id, so page 500 costs the same as page 1 given an index on
+(uploader, <sort key>, id). Cursors are opaque, URL-safe tokens that carry
+the sort they were issued for; a cursor from another sort is ignored.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.db.models import Q
+
+# sort parameter -> (field, descending). `rank` only exists on full-text queries.
+SORT_KEYS = {
+    'relevance': ('rank', True),
+    '-uploaded_at': ('uploaded_at', True),
+    'uploaded_at': ('uploaded_at', False),
+    'title': ('title', False),
+    '-title': ('title', True),
+    '-file_size': ('file_size', True),
+    'file_size': ('file_size', False),
+}
+
+
+def encode_cursor(sort, value, pk):
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """Return (value, pk) for a cursor issued for `sort`, or None"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, value, pk = json.loads(raw)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if cursor_sort != sort or not isinstance(pk, int):
+        return None
+    if SORT_KEYS[sort][0] == 'uploaded_at':
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return None
+    return value, pk
+
+
+class KeysetPage:
+    def __init__(self, object_list, sort, has_next, has_previous):
+        self.object_list = object_list
+        self.sort = sort
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def _cursor(self, obj):
+        field = SORT_KEYS[self.sort][0]
+        return encode_cursor(self.sort, getattr(obj, field), obj.pk)
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return self._cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return self._cursor(self.object_list[0])
+        return None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Paginate `queryset` by `sort` (a key of SORT_KEYS) using cursors"""
+
+    def __init__(self, queryset, sort, per_page):
+        self.queryset = queryset
+        self.sort = sort
+        self.per_page = per_page
+        self.field, self.descending = SORT_KEYS[sort]
+
+    def _ordering(self, reverse=False):
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        return [f'{prefix}{self.field}', f'{prefix}pk']
+
+    def _seek(self, value, pk, forward):
+        # Rows strictly after (value, pk) in the direction we are walking.
+        lookup = 'lt' if self.descending == forward else 'gt'
+        return Q(**{f'{self.field}__{lookup}': value}) | Q(**{self.field: value, f'pk__{lookup}': pk})
+
+    def _decode(self, after, before):
+        return (
+            decode_cursor(after, self.sort) if after else None,
+            decode_cursor(before, self.sort) if before else None,
+        )
+
+    def _rows_before(self, before):
+        queryset = self.queryset.filter(self._seek(*before, forward=False))
+        return queryset.order_by(*self._ordering(reverse=True))[:self.per_page + 1]
+
+    def _rows_after(self, after):
+        queryset = self.queryset
+        if after:
+            queryset = queryset.filter(self._seek(*after, forward=True))
+        return queryset.order_by(*self._ordering())[:self.per_page + 1]
+
+    def _previous_page(self, rows):
+        has_previous = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page][::-1], self.sort, has_next=True, has_previous=has_previous)
+
+    def _next_page(self, rows, after):
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], self.sort, has_next=has_next, has_previous=bool(after))
+
+    def get_page(self, after=None, before=None):
+        after, before = self._decode(after, before)
+        if before and not after:
+            rows = list(self._rows_before(before))
+            if rows:
+                return self._previous_page(rows)
+            # nothing before the cursor: show the first page
+        rows = list(self._rows_after(after))
+        return self._next_page(rows, after)
+
+    async def aget_page(self, after=None, before=None):
+        """get_page for async views"""
+        after, before = self._decode(after, before)
+        if before and not after:
+            rows = [row async for row in self._rows_before(before)]
+            if rows:
+                return self._previous_page(rows)
+        rows = [row async for row in self._rows_after(after)]
+        return self._next_page(rows, after)
+
+
+def approximate_count(queryset, cap):
+    """Count matching rows, stopping at `cap`; returns (count, exact)"""
+    count = queryset.order_by().values('pk')[:cap + 1].count()
+    if count > cap:
+        return cap, False
+    return count, True
+
+
+async def aapproximate_count(queryset, cap):
+    """approximate_count for async views"""
+    count = await queryset.order_by().values('pk')[:cap + 1].acount()
+    if count > cap:
+        return cap, False
+    return count, True
@@ -0,0 +1,102 @@
+# search/signals.py
+from collections import Counter
+
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from documents.models import Document
+from documents.signals import (
+    bulk_deleting, document_file_changed, documents_bulk_created, documents_bulk_deleting, documents_bulk_updating,
+)
+from .backends import get_search_backend
+from .extraction import queue_document, queue_new_documents
+from .facets import adjust_cell, adjust_cells, cell_counts, cell_key
+
+
+# Indexes migrations cannot express (MySQL FULLTEXT) are created after every
+# migrate, so a fresh database can search at once. Connected in apps.py.
+def create_search_indexes(sender, using, **kwargs):
+    get_search_backend().ensure_index(using)
+
+
+# Keep the search index in step with Document writes. Deletes need no handler:
+# SearchTerm rows cascade with their document, and MySQL maintains FULLTEXT.
+@receiver(post_save, sender=Document)
+def index_document(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    get_search_backend().index_document(instance)
+
+
+# New uploads and resubmissions with a new file are queued for extraction.
+@receiver(document_file_changed)
+def queue_content_extraction(sender, document, created, **kwargs):
+    queue_document(document, created=created)
+
+
+# Facet cells (search/facets.py): remember which cell a loaded document is
+# counted under so a save can move it. Instances loaded with one of the
+# fields deferred are not tracked; `manage.py rebuild_facets` fixes drift.
+FACET_FIELDS = ('uploader_id', 'file_type', 'category', 'status', 'uploaded_at')
+
+
+@receiver(post_init, sender=Document)
+def remember_facet_cell(sender, instance, **kwargs):
+    tracked = (
+        instance.pk is not None
+        and all(field in instance.__dict__ for field in FACET_FIELDS)
+        and instance.uploaded_at is not None  # a bare Document(pk=...) built for bulk_update
+    )
+    instance._facet_cell = cell_key(instance) if tracked else None
+
+
+@receiver(post_save, sender=Document)
+def count_facet_cell(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else instance._facet_cell
+    new = cell_key(instance)
+    if created or (old is not None and old != new):
+        if old is not None:
+            adjust_cell(old, -1)
+        adjust_cell(new, 1)
+    instance._facet_cell = new
+
+
+@receiver(post_delete, sender=Document)
+def uncount_facet_cell(sender, instance, **kwargs):
+    if instance._facet_cell is not None and not bulk_deleting.get():
+        adjust_cell(instance._facet_cell, -1)
+
+
+# Bulk writes (documents/bulk.py): the same bookkeeping, set-based.
+@receiver(documents_bulk_created)
+def process_created_documents(sender, documents, **kwargs):
+    adjust_cells(cell_counts(documents))
+    queue_new_documents(documents)
+    get_search_backend().index_documents(documents)
+
+
+@receiver(documents_bulk_deleting)
+def uncount_deleted_documents(sender, queryset, **kwargs):
+    adjust_cells(cell_counts(queryset), -1)
+
+
+# Position of each cell key field changed by an update (see facets.cell_key)
+CELL_KEY_FIELDS = {'file_type': 1, 'category': 2, 'status': 3}
+
+
+@receiver(documents_bulk_updating)
+def move_updated_documents(sender, queryset, changes, **kwargs):
+    moved = {CELL_KEY_FIELDS[field]: value for field, value in changes.items() if field in CELL_KEY_FIELDS}
+    if not moved:
+        return
+    old = cell_counts(queryset)
+    adjust_cells(old, -1)
+    new = Counter()
+    for key, count in old.items():
+        key = list(key)
+        for position, value in moved.items():
+            key[position] = value or ''
+        new[tuple(key)] += count
+    adjust_cells(new)
@@ -0,0 +1,9 @@
+# search/tasks.py
+from jobs.registry import task
+
+from .extraction import extract_document_content
+
+
+@task('search.extract_content')
+def extract_content(document_id, file_name):
+    extract_document_content(document_id, file_name)
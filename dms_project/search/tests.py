@@ -1,3 +1,445 @@
-from django.test import TestCase
+# search/tests.py
+import importlib.util
+import io
+import random
+import shutil
+import sys
+import tempfile
+import zipfile
+from collections import Counter
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import path
+from django.db.models import Count
+from django.utils import timezone
+
+from access.models import DocumentGrant
+from access.policy import only_own_documents, visible_documents
+from benchmark.data import WORDS, make_pdf
+from dms_project import urls as project_urls
+from dms_project.testing import QueryPlanTestCase
+from documents.bulk import delete_documents, update_documents
+from documents.models import Document, DocumentPreview, DocumentTag
+from documents.tags import set_document_tags
+from jobs.models import Job
+from jobs.queue import claim
+from jobs.worker import execute
+from search import views
+from search.backends import InvertedIndexBackend, MySQLFullTextBackend
+from search.extractors import ExtractionUnavailable, extract_text
+from search.facets import compute_facets, month_start, seed_cells
+from search.pagination import KeysetPaginator, approximate_count, decode_cursor, encode_cursor
+from search.models import DocumentContent
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+# search_documents_async in place of the sync view, as in the ASGI profile
+urlpatterns = [path('search/', views.search_documents_async)] + project_urls.urlpatterns
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SearchViewQueryTests(QueryPlanTestCase):
+    """Query budgets and plans for the search views"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='pw-12345!')
+        self.add_documents(3)
+        # Facet cells are seeded on a user's first search; measure the steady state
+        seed_cells(self.user.pk)
+        self.client.login(username='owner', password='pw-12345!')
+
+    def add_documents(self, count=3):
+        start = Document.objects.count()
+        for i in range(start, start + count):
+            Document.objects.create(
+                title=f'quarterly report {i}',
+                author='finance',
+                category='report',
+                uploader=self.user,
+                file=SimpleUploadedFile(f'report{i}.txt', f'report body {i}'.encode()),
+            )
+
+    # Budgets include reading the user's grants (access/policy.py), which
+    # is cached with the rest of the user's values and so measured cold
+    def test_browse(self):
+        self.assertEfficientView('/search/', 7, grow=self.add_documents)
+
+    def test_query(self):
+        self.assertEfficientView('/search/', 7, data={'q': 'quarterly rep'}, grow=self.add_documents)
+
+    def test_filters_and_sorts(self):
+        for sort in ('relevance', 'title', '-file_size', 'uploaded_at'):
+            self.assertEfficientView('/search/', 7, data={
+                'q': 'report', 'file_type': 'txt', 'category': 'report', 'sort': sort,
+            })
+
+    def test_date_range(self):
+        # Calendar days become a half-open uploaded_at range on the uploader index
+        today = timezone.localdate().isoformat()
+        response = self.assertEfficientView('/search/', 7, data={'date_from': today, 'date_to': today},
+                                            grow=self.add_documents)
+        self.assertEqual(response.context['total_results'], 3)
+        response = self.client.get('/search/', {'date_to': '2000-01-01'})
+        self.assertEqual(response.context['total_results'], 0)
+
+    def test_next_page(self):
+        self.add_documents(12)
+        response = self.assertEfficientView('/search/', 7)
+        cursor = response.context['page'].next_cursor
+        self.assertEfficientView('/search/', 7, data={'after': cursor}, grow=self.add_documents)
+
+    def test_recent(self):
+        self.assertEfficientView('/search/recent/', 3, grow=self.add_documents)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncSearchViewQueryTests(SearchViewQueryTests):
+    """The same budgets and plans for search_documents_async"""
+
+    def test_same_page(self):
+        response = self.client.get('/search/', {'q': 'quarterly'})
+        with override_settings(ROOT_URLCONF='dms_project.urls'):
+            expected = self.client.get('/search/', {'q': 'quarterly', 'count': 'exact'})
+        self.assertEqual(
+            [document.pk for document in response.context['page']],
+            [document.pk for document in expected.context['page']],
+        )
+        self.assertEqual(response.context['total_results'], expected.context['total_results'])
+
+
+def run_jobs():
+    while (ids := claim(10)):
+        for job_id in ids:
+            execute(job_id)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ResubmissionJobTests(TestCase):
+
+    def test_back_to_an_earlier_file(self):
+        document = Document.objects.create(
+            title='notes', uploader=User.objects.create_user('owner'),
+            file=SimpleUploadedFile('a.txt', b'quarterly figures'),
+        )
+        # A -> B -> A: the last file's jobs already ran once, for the first save
+        for name, content in [('b.txt', b'annual figures'), ('a.txt', b'quarterly figures'), (None, None)]:
+            run_jobs()
+            self.assertEqual(DocumentContent.objects.get(document=document).status, 'done')
+            self.assertEqual(DocumentPreview.objects.get(document=document).status, 'done')
+            if name:
+                document.file = SimpleUploadedFile(name, content)
+                document.save()
+        self.assertEqual(DocumentContent.objects.get(document=document).text, 'quarterly figures')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class InvertedIndexTests(TestCase):
+    """Matching and ranking of the portable SearchTerm backend"""
+
+    def setUp(self):
+        user = User.objects.create_user('owner')
+        self.backend = InvertedIndexBackend()
+        self.in_title = self.add(user, title='Quarterly budget', description='numbers')
+        self.in_description = self.add(user, title='Numbers', description='quarterly budget review')
+        self.unrelated = self.add(user, title='Holiday plan', description='summer')
+
+    def add(self, user, **fields):
+        return Document.objects.create(uploader=user, file=SimpleUploadedFile('a.txt', b'x'), **fields)
+
+    def search(self, query):
+        return list(self.backend.search(Document.objects.all(), query).order_by('-rank', 'pk'))
+
+    def test_title_hits_rank_first(self):
+        results = self.search('quarterly budget')
+        self.assertEqual(results, [self.in_title, self.in_description])
+        self.assertGreater(results[0].rank, results[1].rank)
+
+    def test_terms_match_as_prefixes(self):
+        self.assertEqual(self.search('quart budg'), [self.in_title, self.in_description])
+        self.assertEqual(self.search('QUARTERLY'), [self.in_title, self.in_description])
+        self.assertEqual(self.search('uarterly'), [])
+
+    def test_every_term_is_required(self):
+        self.assertEqual(self.search('budget review'), [self.in_description])
+        self.assertEqual(self.search('budget summer'), [])
+        self.assertFalse(self.backend.search(Document.objects.all(), '  ').exists())
+
+    def test_edits_are_reindexed(self):
+        self.unrelated.title = 'Quarterly budget draft'
+        self.unrelated.save()
+        self.assertIn(self.unrelated, self.search('draft'))
+        self.assertEqual(self.search('holiday'), [])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class FacetCountTests(TestCase):
+    """Facet counts agree with a plain GROUP BY over the same documents"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        other = User.objects.create_user('other')
+        self.grantee = User.objects.create_user('grantee')
+        for user, name, category, status, tags in [
+            (self.owner, 'a.txt', 'report', 'pending', ['tax']),
+            (self.owner, 'b.txt', 'report', 'approved', ['tax', 'final']),
+            (self.owner, 'c.csv', '', 'pending', []),
+            (self.owner, 'd.csv', 'invoice', 'rejected', ['final']),
+            (other, 'e.txt', 'report', 'pending', ['tax']),
+            (other, 'f.csv', 'invoice', 'approved', []),
+        ]:
+            document = Document.objects.create(
+                title=name, uploader=user, category=category, file=SimpleUploadedFile(name, b'x'),
+            )
+            if status != 'pending':
+                document.status = status
+                document.save()
+            set_document_tags(document, tags)
+        # The grantee sees one document of each of the others
+        for document in Document.objects.filter(title__in=['a.txt', 'f.csv']):
+            DocumentGrant.objects.create(user=self.grantee, document=document)
+
+    def group_by(self, queryset):
+        facets = {
+            name: sorted(queryset.exclude(**{name: ''}).order_by().values_list(name).annotate(Count('id')))
+            for name in ('file_type', 'category', 'status')
+        }
+        months = Counter(month_start(uploaded_at) for uploaded_at in queryset.values_list('uploaded_at', flat=True))
+        facets['month'] = sorted(months.items(), reverse=True)
+        facets['tag'] = list(
+            DocumentTag.objects.filter(document__in=queryset).values_list('tag__name')
+            .annotate(Count('id')).order_by('tag__name')
+        )
+        return facets
+
+    def assertFacetsMatch(self, user, **filters):
+        documents = visible_documents(user).filter(**filters)
+        facets = compute_facets(user.pk, filters, documents, only_own_documents(user))
+        self.assertEqual(facets, self.group_by(documents))
+
+    def test_own_documents(self):
+        self.assertFacetsMatch(self.owner)
+        self.assertFacetsMatch(self.owner, status='pending')
+        self.assertFacetsMatch(self.owner, file_type='other', category='invoice')
+
+    def test_after_edits(self):
+        self.assertFacetsMatch(self.owner)  # seeds the owner's cells
+        document = Document.objects.get(title='c.csv')
+        document.status = 'approved'
+        document.save()
+        Document.objects.get(title='a.txt').delete()
+        update_documents(Document.objects.filter(title='d.csv'), category='report')
+        delete_documents(Document.objects.filter(title='b.txt'))
+        self.assertFacetsMatch(self.owner)
+        self.assertFacetsMatch(self.owner, status='approved')
+
+    def test_grantee(self):
+        self.assertFalse(only_own_documents(self.grantee))
+        self.assertEqual(visible_documents(self.grantee).count(), 2)
+        self.assertFacetsMatch(self.grantee)
+        self.assertFacetsMatch(self.grantee, status='approved')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user('owner')
+        # Three titles for seven documents: most rows tie on the sort key
+        for title in ['b', 'a', 'b', 'c', 'b', 'a', 'b']:
+            Document.objects.create(title=title, uploader=user, file=SimpleUploadedFile('a.txt', b'x'))
+
+    def walk(self, sort, per_page=3):
+        """Every page from the first, following next_cursor"""
+        paginator = KeysetPaginator(Document.objects.all(), sort, per_page)
+        pages = [paginator.get_page()]
+        while pages[-1].next_cursor:
+            pages.append(paginator.get_page(after=pages[-1].next_cursor))
+        return paginator, pages
+
+    def ids(self, page):
+        return [document.pk for document in page]
+
+    def test_cursor_round_trip(self):
+        uploaded_at = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor('-uploaded_at', uploaded_at, 7), '-uploaded_at'), (uploaded_at, 7))
+        self.assertEqual(decode_cursor(encode_cursor('title', 'a/b=', 3), 'title'), ('a/b=', 3))
+
+    def test_ties_are_paged_without_gaps_or_repeats(self):
+        for sort in ['title', '-title']:
+            with self.subTest(sort=sort):
+                _, pages = self.walk(sort)
+                # Ties are broken by id, in the direction of the sort
+                ordering = [sort, 'pk' if sort == 'title' else '-pk']
+                expected = list(Document.objects.order_by(*ordering).values_list('pk', flat=True))
+                self.assertEqual([pk for page in pages for pk in self.ids(page)], expected)
+                self.assertEqual([len(page) for page in pages], [3, 3, 1])
+
+    def test_previous_pages_match(self):
+        paginator, pages = self.walk('title')
+        previous = paginator.get_page(before=pages[2].previous_cursor)
+        self.assertEqual(self.ids(previous), self.ids(pages[1]))
+        first = paginator.get_page(before=previous.previous_cursor)
+        self.assertEqual(self.ids(first), self.ids(pages[0]))
+        self.assertFalse(first.has_previous)
+
+    def test_tampered_cursor_is_rejected(self):
+        valid = encode_cursor('title', 'b', 1)
+        for cursor, sort in [
+            (valid[:-2] + '!!', 'title'),
+            ('not-a-cursor', 'title'),
+            (encode_cursor('title', 'b', '1'), 'title'),
+            (encode_cursor('-uploaded_at', 'yesterday', 1), '-uploaded_at'),
+            (valid, '-title'),  # issued for another sort
+        ]:
+            with self.subTest(cursor=cursor, sort=sort):
+                self.assertIsNone(decode_cursor(cursor, sort))
+        # A rejected cursor shows the first page
+        paginator, pages = self.walk('title')
+        self.assertEqual(self.ids(paginator.get_page(after='garbage')), self.ids(pages[0]))
+
+    def test_approximate_count(self):
+        documents = Document.objects.all()
+        self.assertEqual(approximate_count(documents, 3), (3, False))
+        self.assertEqual(approximate_count(documents, 7), (7, True))
+        self.assertEqual(approximate_count(documents, 100), (7, True))
+        self.assertEqual(approximate_count(documents.none(), 3), (0, True))
+
+
+def zipped(name, xml):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr(name, xml)
+    return buffer.getvalue()
+
+
+DOCX = zipped('word/document.xml', (
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+    '<w:p><w:r><w:t>Quarterly </w:t></w:r><w:r><w:t>ledger</w:t></w:r></w:p>'
+    '<w:p><w:r><w:t>Second paragraph</w:t></w:r></w:p></w:body></w:document>'
+))
+XLSX = zipped('xl/worksheets/sheet1.xml', (
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+    '<row r="1"><c r="A1" t="inlineStr"><is><t>invoice total</t></is></c><c r="B1"><v>12</v></c></row>'
+    '</sheetData></worksheet>'
+))
+
+
+class ExtractorTests(TestCase):
+
+    def extract(self, content, file_type, max_chars=1000):
+        return extract_text(io.BytesIO(content), file_type, max_chars=max_chars, chunk_size=4)
+
+    def test_txt(self):
+        # Chunks of 4 bytes split the two-byte 'é': the decoder joins it again
+        self.assertEqual(self.extract('café menu'.encode(), 'txt'), ('café menu', False))
+
+    def test_docx(self):
+        self.assertEqual(self.extract(DOCX, 'docx'), ('Quarterly ledger\nSecond paragraph\n', False))
+
+    def test_xlsx(self):
+        self.assertEqual(self.extract(XLSX, 'xlsx'), ('invoice total\n', False))
+
+    @skipUnless(importlib.util.find_spec('pypdf'), "pypdf is not installed")
+    def test_pdf(self):
+        text, truncated = self.extract(make_pdf(random.Random(0), 500), 'pdf', max_chars=10_000)
+        self.assertFalse(truncated)
+        self.assertTrue(set(text.lower().split()) & set(WORDS))
+
+    def test_truncated_at_max_chars(self):
+        self.assertEqual(self.extract(b'a' * 50, 'txt', max_chars=10), ('a' * 10, True))
+
+    def test_unsupported_type(self):
+        with self.assertRaises(ExtractionUnavailable):
+            self.extract(b'\xff\xd8', 'jpg')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ExtractionJobTests(TestCase):
+
+    def add_document(self, name, content):
+        return Document.objects.create(
+            title=name, uploader=User.objects.create_user(name), file=SimpleUploadedFile(name, content),
+        )
+
+    def test_docx_is_indexed(self):
+        document = self.add_document('report.docx', DOCX)
+        run_jobs()
+        content = DocumentContent.objects.get(document=document)
+        self.assertEqual(content.status, 'done')
+        self.assertIn('Second paragraph', content.text)
+        found = InvertedIndexBackend().search(Document.objects.all(), 'paragraph')
+        self.assertEqual(list(found), [document])
+
+    def test_corrupt_file_fails_and_is_retried(self):
+        document = self.add_document('broken.docx', b'PK\x03\x04 not a zip archive')
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            run_jobs()
+        content = DocumentContent.objects.get(document=document)
+        self.assertEqual(content.status, 'failed')
+        self.assertTrue(content.error)
+        job = Job.objects.get(name='search.extract_content')
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_after, timezone.now())
+
+    def test_pdf_without_pypdf_is_skipped(self):
+        document = self.add_document('scan.pdf', b'%PDF-1.4 not parsed')
+        with mock.patch.dict(sys.modules, {'pypdf': None}):
+            run_jobs()
+        content = DocumentContent.objects.get(document=document)
+        self.assertEqual((content.status, content.error), ('skipped', 'pypdf is not installed'))
+        # Finished on the first attempt: nothing left to retry
+        job = Job.objects.get(name='search.extract_content')
+        self.assertEqual((job.status, job.attempts), ('done', 1))
+
+
+# A TransactionTestCase: InnoDB FULLTEXT indexes only see committed rows
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BackendParityTests(TransactionTestCase):
+    """Every backend finds the same documents for the same query"""
+
+    def setUp(self):
+        user = User.objects.create_user('owner')
+        self.documents = {}
+        for key, title, text in [
+            ('split', 'quarterly summary', b'general ledger totals'),
+            ('metadata', 'quarterly ledger', b'nothing else'),
+            ('one term', 'quarterly plan', b'budget lines'),
+        ]:
+            self.documents[key] = Document.objects.create(
+                title=title, uploader=user, file=SimpleUploadedFile(f'{key}.txt', text),
+            ).pk
+        run_jobs()
+
+    def backends(self):
+        yield InvertedIndexBackend()
+        if connection.vendor == 'mysql':
+            yield MySQLFullTextBackend()
+
+    def test_terms_split_between_metadata_and_content(self):
+        for query, keys in [
+            ('quarter ledg', {'split', 'metadata'}),
+            ('ledger', {'split', 'metadata'}),
+            ('general quarterly', {'split'}),
+        ]:
+            expected = {self.documents[key] for key in keys}
+            for backend in self.backends():
+                with self.subTest(query=query, backend=type(backend).__name__):
+                    found = backend.search(Document.objects.all(), query).values_list('pk', flat=True)
+                    self.assertEqual(set(found), expected)
+
+
+@skipUnless(connection.vendor == 'mysql', "FULLTEXT indexes are MySQL only")
+class FullTextIndexTests(TestCase):
+
+    def test_created_by_migrate(self):
+        # The test database was just migrated: nothing is left to create
+        self.assertFalse(MySQLFullTextBackend().ensure_index())
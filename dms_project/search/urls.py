@@ -1,10 +1,14 @@
 # search/urls.py
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# The ASGI profile swaps in the async view (see documents/urls.py)
+ASYNC_VIEWS = getattr(settings, 'ASYNC_VIEWS', False)
+
 app_name = 'search'
 
 urlpatterns = [
-    path('', views.search_documents, name='search'),
+    path('', views.search_documents_async if ASYNC_VIEWS else views.search_documents, name='search'),
     path('recent/', views.recent_documents, name='recent'),
 ]
\ No newline at end of file
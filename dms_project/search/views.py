@@ -1,81 +1,175 @@
 # search/views.py
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from access.policy import sees_others_documents, visible_documents
+from dms_project.asyncviews import alogin_required, arender
+from dms_project.cache import cache_page_per_user
+from dms_project.dates import date_range_filter, parse_date
 from documents.models import Document
-import datetime
-from django.core.paginator import Paginator
+from .backends import get_search_backend
+from .facets import get_facets, month_range, parse_month
+from .pagination import SORT_KEYS, KeysetPaginator, aapproximate_count, approximate_count
 
-@login_required(login_url='accounts:login')
-def search_documents(request):
-    """R-3.1: Search documents by title, author, date, or category"""
+RESULTS_PER_PAGE = 10
+# Beyond this many matches the result count is shown as "N+" unless the
+# user asks for an exact count (?count=exact).
+APPROXIMATE_COUNT_CAP = 1000
+
+def _search(request):
+    """The filtered, sorted query for a search request, built without querying.
+
+    Returns a dict with the queryset ('documents'), the facet filters, the
+    sort and the values to show back in the form.
+    """
     query = request.GET.get('q', '')
     date_from = request.GET.get('date_from', '')
     date_to = request.GET.get('date_to', '')
     file_type = request.GET.get('file_type', '')
     category = request.GET.get('category', '')
-    sort_by = request.GET.get('sort', '-uploaded_at')  # Default: newest first
+    status = request.GET.get('status', '')
+    month = request.GET.get('month', '')
+    tag = request.GET.get('tag', '')
+    # Default: best match when searching, newest first otherwise
+    sort_by = request.GET.get('sort', 'relevance' if query else '-uploaded_at')
     
-    # Base queryset - only show user's own documents
-    documents = Document.objects.filter(uploader=request.user)
+    # Base queryset: the documents the access policy lets the user see, as
+    # one filter (access/policy.py); without grants, just their own
+    documents = visible_documents(request.user)
     
-    # Apply search filters
+    # Apply search filters (full-text index, see search/backends.py)
     if query:
-        documents = documents.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(author__icontains=query) |
-            Q(tags__icontains=query)
-        )
-    
-    if date_from:
-        try:
-            date_from = datetime.datetime.strptime(date_from, '%Y-%m-%d').date()
-            documents = documents.filter(uploaded_at__date__gte=date_from)
-        except ValueError:
-            pass
+        documents = get_search_backend().search(documents, query)
     
-    if date_to:
-        try:
-            date_to = datetime.datetime.strptime(date_to, '%Y-%m-%d').date()
-            documents = documents.filter(uploaded_at__date__lte=date_to)
-        except ValueError:
-            pass
+    # Days in the user's timezone as a half-open uploaded_at range
+    # (dms_project/dates.py), so doc_uploader_uploaded_idx is range-scanned
+    date_from = parse_date(date_from) or ''
+    date_to = parse_date(date_to) or ''
+    if date_from or date_to:
+        documents = documents.filter(**date_range_filter('uploaded_at', date_from, date_to))
     
     if file_type:
         documents = documents.filter(file_type=file_type)
     
     if category:
-        documents = documents.filter(category__icontains=category)
+        # Exact match: the dropdown offers stored values, and the facet counts agree
+        documents = documents.filter(category=category)
     
-    # Apply sorting (R-3.4)
-    if sort_by in ['title', '-title', 'uploaded_at', '-uploaded_at', 'file_size', '-file_size']:
-        documents = documents.order_by(sort_by)
+    if status:
+        documents = documents.filter(status=status)
     
-    # Get unique file types and categories for filter dropdowns
-    file_types = Document.objects.filter(uploader=request.user).values_list('file_type', flat=True).distinct()
-    categories = Document.objects.filter(uploader=request.user).values_list('category', flat=True).distinct()
+    if parse_month(month):
+        # Half-open range rather than __month/__year, so the index is used
+        start, end = month_range(parse_month(month))
+        documents = documents.filter(uploaded_at__gte=start, uploaded_at__lt=end)
+    else:
+        month = ''
     
-    # Paginate results
-    paginator = Paginator(documents, 10)  # Show 10 documents per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if tag:
+        # Exact tag match through the DocumentTag index
+        tag = tag.strip().lower()
+        documents = documents.filter(tags__name=tag)
     
-    context = {
+    # Apply sorting (R-3.4); relevance needs a full-text query to rank by
+    if sort_by not in SORT_KEYS or (sort_by == 'relevance' and not query):
+        sort_by = '-uploaded_at'
+    
+    filters = {
+        name: value for name, value in (
+            ('q', query), ('date_from', str(date_from)), ('date_to', str(date_to)),
+            ('file_type', file_type), ('category', category), ('status', status),
+            ('month', month), ('tag', tag),
+        ) if value
+    }
+    return {
         'documents': documents,
+        'filters': filters,
         'query': query,
         'date_from': date_from,
         'date_to': date_to,
-        'selected_file_type': file_type,
-        'selected_category': category,
+        'file_type': file_type,
+        'category': category,
+        'status': status,
+        'month': month,
+        'tag': tag,
         'sort_by': sort_by,
-        'file_types': file_types,
-        'categories': [c for c in categories if c],  # Remove empty categories
-        'total_results': documents.count(),
     }
+
+def _search_context(request, search, facets, page, total_results, total_exact):
+    # Current filters, carried over by the pagination links
+    filter_params = request.GET.copy()
+    for key in ('after', 'before'):
+        filter_params.pop(key, None)
+    status_labels = dict(Document.STATUS_CHOICES)
+    
+    return {
+        'documents': page,
+        'page': page,
+        'filter_query': filter_params.urlencode(),
+        'query': search['query'],
+        'date_from': search['date_from'],
+        'date_to': search['date_to'],
+        'selected_file_type': search['file_type'],
+        'selected_category': search['category'],
+        'selected_status': search['status'],
+        'selected_month': search['month'],
+        'selected_tag': search['tag'],
+        'sort_by': search['sort_by'],
+        'file_types': facets['file_type'],
+        'categories': facets['category'],
+        'statuses': [(value, status_labels.get(value, value), count) for value, count in facets['status']],
+        'months': facets['month'],
+        'tags': facets['tag'],
+        'total_results': total_results,
+        'total_exact': total_exact,
+    }
+
+@login_required(login_url='accounts:login')
+@cache_page_per_user('search:page', shared=sees_others_documents)
+def search_documents(request):
+    """R-3.1: Search documents by title, author, date, or category"""
+    search = _search(request)
+    documents = search['documents']
+    
+    # Counts per file type, category, status, month and tag for the filter
+    # dropdowns, over the filtered set (search/facets.py, cached per user)
+    facets = get_facets(request.user, search['filters'], documents)
+    
+    # Paginate results with keyset cursors: only the current page is fetched
+    paginator = KeysetPaginator(documents, search['sort_by'], RESULTS_PER_PAGE)
+    page = paginator.get_page(after=request.GET.get('after'), before=request.GET.get('before'))
+    
+    if request.GET.get('count') == 'exact':
+        total_results, total_exact = documents.count(), True
+    else:
+        total_results, total_exact = approximate_count(documents, APPROXIMATE_COUNT_CAP)
+    
+    context = _search_context(request, search, facets, page, total_results, total_exact)
     return render(request, 'search/search.html', context)
 
+@alogin_required(login_url='accounts:login')
+@cache_page_per_user('search:page', shared=sees_others_documents)
+async def search_documents_async(request):
+    """search_documents for the ASGI profile, on the async ORM"""
+    # Building the query reads the user's grants (access/policy.py)
+    search = await sync_to_async(_search)(request)
+    documents = search['documents']
+    # Usually a cache hit; a miss runs the GROUP BY queries of search/facets.py
+    facets = await sync_to_async(get_facets)(request.user, search['filters'], documents)
+
+    paginator = KeysetPaginator(documents, search['sort_by'], RESULTS_PER_PAGE)
+    page = await paginator.aget_page(after=request.GET.get('after'), before=request.GET.get('before'))
+
+    if request.GET.get('count') == 'exact':
+        total_results, total_exact = await documents.acount(), True
+    else:
+        total_results, total_exact = await aapproximate_count(documents, APPROXIMATE_COUNT_CAP)
+
+    context = _search_context(request, search, facets, page, total_results, total_exact)
+    return await arender(request, 'search/search.html', context)
+
 @login_required(login_url='accounts:login')
+@cache_page_per_user('search:recent')
 def recent_documents(request):
     """Show recent documents for dashboard"""
     recent = Document.objects.filter(uploader=request.user).order_by('-uploaded_at')[:5]